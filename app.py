@@ -1,26 +1,148 @@
 import gradio as gr
 import os
+import sys
 import argparse
+from typing import List, Optional, Tuple
 
 from modules.whisper_Inference import WhisperInference
 from modules.faster_whisper_inference import FasterWhisperInference
-from modules.nllb_inference import NLLBInference
+from modules.nllb_inference import NLLBInference, NLLB_MODELS, NLLB_BACKENDS, NLLB_AVAILABLE_LANGS, \
+    DEFAULT_MODEL_SIZE as DEFAULT_NLLB_MODEL_SIZE, DEFAULT_BATCH_SIZE, TRANSFORMERS_BACKEND, CTRANSLATE2_BACKEND, \
+    DEFAULT_CT2_COMPUTE_TYPE, get_available_compute_types
 from ui.htmls import *
 from modules.youtube_manager import get_ytmetas
-from modules.deepl_api import DeepLAPI
+from modules.deepl_api import DeepLAPI, DEEPL_AVAILABLE_SOURCE_LANGS, DEEPL_AVAILABLE_TARGET_LANGS
+from modules.worker_pool import TranscriptionWorkerPool, get_worker_ct2_settings
+from modules.translation_memory import TranslationMemory
+from modules.vad import DEFAULT_VAD_THRESHOLD, DEFAULT_MIN_SILENCE_DURATION_MS
+from modules.metrics import REGISTRY, start_metrics_server
+from modules.subtitle_manager import OutputConfig, COLAB_MAX_FILENAME_LENGTH
+from modules.lazy import LazyEngine
+from modules.ct2_tuning import autotune
 
 class App:
     def __init__(self, args):
         self.args = args
         self.app = gr.Blocks(css=CSS, theme=self.args.theme)
-        self.whisper_inf = WhisperInference() if self.args.disable_faster_whisper else FasterWhisperInference()
-        if isinstance(self.whisper_inf, FasterWhisperInference):
+        self.worker_pool = None
+        self.output_config = OutputConfig(max_filename_length=COLAB_MAX_FILENAME_LENGTH if self.args.colab else None)
+        # The whisper engine and its libraries are loaded by the first page load, or right away to tune or preload
+        if self.args.disable_faster_whisper:
+            self.whisper_inf = LazyEngine(WhisperInference, lambda: self.print_device(WhisperInference(
+                model_memory_budget_gb=self.args.model_memory_budget,
+                transcription_cache_size_mb=self.args.transcription_cache_size,
+                audio_cache_size_mb=self.args.audio_cache_size,
+                output_config=self.output_config)))
+        else:
+            if self.args.worker_processes > 0:
+                print(f"Starting {self.args.worker_processes} transcription worker processes")
+                self.worker_pool = TranscriptionWorkerPool(num_workers=self.args.worker_processes,
+                                                           model_memory_budget_gb=self.args.model_memory_budget,
+                                                           preload_models=self.args.preload_models,
+                                                           cpu_threads=self.args.cpu_threads,
+                                                           ct2_num_workers=self.args.num_workers)
+            self.whisper_inf = LazyEngine(FasterWhisperInference, lambda: self.print_device(FasterWhisperInference(
+                model_memory_budget_gb=self.args.model_memory_budget,
+                transcription_cache_size_mb=self.args.transcription_cache_size,
+                audio_cache_size_mb=self.args.audio_cache_size,
+                worker_pool=self.worker_pool,
+                parallel_chunk_length=self.args.parallel_chunk_length,
+                output_config=self.output_config,
+                cpu_threads=self.args.cpu_threads,
+                num_workers=self.args.num_workers)))
+        if self.whisper_inf.engine_class is FasterWhisperInference:
             print("Use Faster Whisper implementation")
         else:
             print("Use Open AI Whisper implementation")
-        print(f"Device \"{self.whisper_inf.device}\" is detected")
-        self.nllb_inf = NLLBInference()
-        self.deepl_api = DeepLAPI()
+        if self.args.autotune_threads and self.whisper_inf.engine_class is FasterWhisperInference:
+            model_size, compute_type = self.args.autotune_threads[0]
+            autotune(self.whisper_inf.get(), model_size=model_size, compute_type=compute_type)
+        if self.args.preload_models:
+            self.preload_models()
+        self.translation_memory = None if self.args.disable_translation_memory else TranslationMemory()
+        # The translation engines and their libraries are loaded on the first use of their tab
+        self.nllb_inf = LazyEngine(NLLBInference, lambda: NLLBInference(translation_memory=self.translation_memory,
+                                                                        output_config=self.output_config))
+        self.deepl_api = LazyEngine(DeepLAPI, lambda: DeepLAPI(translation_memory=self.translation_memory,
+                                                               output_config=self.output_config))
+        # Each worker owns its own model, so as many requests as there are workers can run at once
+        self.concurrency_limit = self.worker_pool.num_workers if self.worker_pool is not None else 1
+        self.metrics = None
+        if self.args.metrics_port:
+            self.metrics = REGISTRY
+            self.metrics.register_stats("transcription_cache", lambda: self.whisper_engine_attr("transcription_cache"))
+            self.metrics.register_stats("audio_cache", lambda: self.whisper_engine_attr("audio_cache"))
+            self.metrics.register_stats("model_pool", lambda: self.whisper_engine_attr("model_pool"))
+            self.metrics.register_stats("worker_pool", lambda: self.worker_pool)
+            self.metrics.register_stats("translation_memory", lambda: self.translation_memory)
+            start_metrics_server(port=self.args.metrics_port, host=self.args.metrics_host)
+
+    def preload_models(self):
+        """
+        Load and warm up the models of --preload_models and block until all of them are warm, so the app
+        only comes up once the first requests are fast. With a worker pool the models are only loaded
+        by the workers, which run the transcriptions.
+        """
+        if self.worker_pool is None:
+            for model_size, compute_type in self.args.preload_models:
+                try:
+                    preload_time = self.whisper_inf.get().preload_model(model_size=model_size,
+                                                                        compute_type=compute_type)
+                    print(f"Preloaded {model_size} in {preload_time:.1f}s")
+                except Exception as e:
+                    print(f"Failed to preload {model_size}: {e}")
+        else:
+            print("Waiting for the transcription workers to warm up")
+            if not self.worker_pool.wait_until_ready(timeout=self.args.preload_timeout):
+                not_ready_workers = self.worker_pool.not_ready_workers()
+                if len(not_ready_workers) == self.worker_pool.num_workers:
+                    print(f"No transcription worker is ready after {self.args.preload_timeout:.0f}s")
+                    sys.exit(1)
+                print(f"Transcription workers {not_ready_workers} are not ready after "
+                      f"{self.args.preload_timeout:.0f}s, starting without them")
+                return
+        print("Models are warmed up")
+
+    @staticmethod
+    def print_device(whisper_inf):
+        print(f"Device \"{whisper_inf.device}\" is detected")
+        return whisper_inf
+
+    def whisper_engine_attr(self, name: str):
+        """Returns an attribute of the whisper engine for the metrics, or None while it isn't loaded yet"""
+        return getattr(self.whisper_inf.get(), name) if self.whisper_inf.loaded else None
+
+    def format_ct2_settings(self) -> str:
+        """Returns the CTranslate2 threads the transcriptions run with, for the read-only field of the UI"""
+        if not hasattr(self.whisper_inf.engine_class, "set_ct2_threads"):
+            return ""
+        if self.worker_pool is not None:
+            cpu_threads, num_workers = get_worker_ct2_settings(len(self.worker_pool.worker_cores[0]),
+                                                               self.worker_pool.ct2_settings)
+            return (f"每个工作进程: cpu_threads={cpu_threads}, num_workers={num_workers} "
+                    f"({self.worker_pool.num_workers}个工作进程)")
+        whisper_inf = self.whisper_inf.get()
+        cpu_threads = whisper_inf.cpu_threads or "自动"
+        return f"cpu_threads={cpu_threads}, num_workers={whisper_inf.num_workers}"
+
+    def load_whisper_choices(self) -> list:
+        """
+        Constructs the whisper engine on page load and returns the choices of its model, language and
+        compute type dropdowns, and its CTranslate2 threads, for every transcription tab
+        """
+        whisper_inf = self.whisper_inf.get()
+        updates = [gr.Dropdown(choices=whisper_inf.available_models),
+                   gr.Dropdown(choices=["自动检测"] + whisper_inf.available_langs),
+                   gr.Dropdown(choices=whisper_inf.available_compute_types, value=whisper_inf.current_compute_type),
+                   self.format_ct2_settings()]
+        return updates * 3
+
+    @staticmethod
+    def on_change_nllb_backend(backend: str):
+        """Loads the compute types of the ctranslate2 backend once it is selected"""
+        if backend != CTRANSLATE2_BACKEND:
+            return gr.Dropdown()
+        return gr.Dropdown(choices=get_available_compute_types())
 
     @staticmethod
     def open_folder(folder_path: str):
@@ -37,20 +159,32 @@ class App:
         else:
             return gr.Checkbox(visible=True, value=False, label="Translate to English?", interactive=True)
 
+    def instrument(self, handler: str, fn, concurrency_limit: Optional[int] = None) -> dict:
+        """
+        Returns the fn of an event listener, wrapped to record its metrics if they are enabled.
+        The wrapper then limits the concurrency itself to measure the queue wait, instead of Gradio.
+        `concurrency_limit` defaults to `self.concurrency_limit`.
+        """
+        concurrency_limit = concurrency_limit or self.concurrency_limit
+        if self.metrics is None:
+            return {"fn": fn, "concurrency_limit": concurrency_limit}
+        return {"fn": self.metrics.track(handler, fn, concurrency_limit=concurrency_limit),
+                "concurrency_limit": None}
+
     def launch(self):
         with self.app:
             with gr.Row():
                 with gr.Column():
                     gr.Markdown(MARKDOWN, elem_id="md_project")
+            # Filled by `load_whisper_choices` on page load, so the engine isn't loaded to build the UI
+            whisper_choices = []
             with gr.Tabs():
                 with gr.TabItem("文件"):  # tab1
                     with gr.Row():
                         input_file = gr.Files(type="filepath", label="在这里上传文件")
                     with gr.Row():
-                        dd_model = gr.Dropdown(choices=self.whisper_inf.available_models, value="large-v3",
-                                               label="模型")
-                        dd_lang = gr.Dropdown(choices=["自动检测"] + self.whisper_inf.available_langs,
-                                              value="自动检测", label="语言")
+                        dd_model = gr.Dropdown(choices=["large-v3"], value="large-v3", label="模型")
+                        dd_lang = gr.Dropdown(choices=["自动检测"], value="自动检测", label="语言")
                         dd_file_format = gr.Dropdown(["SRT", "WebVTT", "txt"], value="SRT", label="文件格式")
                     with gr.Row():
                         cb_translate = gr.Checkbox(value=False, label="翻译成英语？", interactive=True)
@@ -60,21 +194,38 @@ class App:
                         nb_beam_size = gr.Number(label="Beam大小", value=1, precision=0, interactive=True)
                         nb_log_prob_threshold = gr.Number(label="对数概率阈值", value=-1.0, interactive=True)
                         nb_no_speech_threshold = gr.Number(label="无语音阈值", value=0.6, interactive=True)
-                        dd_compute_type = gr.Dropdown(label="计算类型", choices=self.whisper_inf.available_compute_types, value=self.whisper_inf.current_compute_type, interactive=True)
+                        dd_compute_type = gr.Dropdown(label="计算类型", choices=[], value=None, interactive=True)
+                        cb_vad_filter = gr.Checkbox(label="启用VAD过滤静音", value=False, interactive=True)
+                        nb_vad_threshold = gr.Number(label="VAD语音阈值", value=DEFAULT_VAD_THRESHOLD, interactive=True)
+                        nb_vad_min_silence_duration_ms = gr.Number(label="最短静音时长(毫秒)", value=DEFAULT_MIN_SILENCE_DURATION_MS, precision=0, interactive=True)
+                        cb_word_timestamps = gr.Checkbox(label="提取单词级时间戳", value=False, interactive=True)
+                        tb_ct2_threads = gr.Textbox(label="CTranslate2线程(启动时用--cpu_threads和--num_workers设置)", interactive=False, visible=hasattr(self.whisper_inf.engine_class, "set_ct2_threads"))
                     with gr.Row():
                         btn_run = gr.Button("生成字幕文件", variant="primary")
+                        btn_run_stream = gr.Button("流式生成字幕文件", variant="secondary",
+                                                   visible=hasattr(self.whisper_inf.engine_class, "transcribe_file_stream"))
                     with gr.Row():
                         tb_indicator = gr.Textbox(label="输出", scale=4)
                         files_subtitles = gr.Files(label="下载输出文件", scale=4, interactive=False)
                         btn_openfolder = gr.Button('📂', scale=1)
 
                     params = [input_file, dd_model, dd_lang, dd_file_format, cb_translate, cb_timestamp]
-                    advanced_params = [nb_beam_size, nb_log_prob_threshold, nb_no_speech_threshold, dd_compute_type]
-                    btn_run.click(fn=self.whisper_inf.transcribe_file,
+                    advanced_params = [nb_beam_size, nb_log_prob_threshold, nb_no_speech_threshold, dd_compute_type,
+                                       cb_vad_filter, nb_vad_threshold, nb_vad_min_silence_duration_ms,
+                                       cb_word_timestamps]
+                    btn_run.click(**self.instrument("transcribe_file", self.whisper_inf.method("transcribe_file")),
                                   inputs=params + advanced_params,
                                   outputs=[tb_indicator, files_subtitles])
-                    btn_openfolder.click(fn=lambda: self.open_folder("outputs"), inputs=None, outputs=None)
+                    if hasattr(self.whisper_inf.engine_class, "transcribe_file_stream"):
+                        # Streams decode on the model of this process, one at a time, instead of the worker pool
+                        btn_run_stream.click(**self.instrument("transcribe_file_stream",
+                                                              self.whisper_inf.method("transcribe_file_stream"),
+                                                              concurrency_limit=1),
+                                             inputs=params + advanced_params,
+                                             outputs=[tb_indicator, files_subtitles])
+                    btn_openfolder.click(fn=lambda: self.open_folder(self.output_config.output_dir), inputs=None, outputs=None)
                     dd_model.change(fn=self.on_change_models, inputs=[dd_model], outputs=[cb_translate])
+                    whisper_choices += [dd_model, dd_lang, dd_compute_type, tb_ct2_threads]
 
                 with gr.TabItem("Youtube"):  # tab2
                     with gr.Row():
@@ -86,10 +237,8 @@ class App:
                             tb_title = gr.Label(label="Youtube标题")
                             tb_description = gr.Textbox(label="Youtube描述", max_lines=15)
                     with gr.Row():
-                        dd_model = gr.Dropdown(choices=self.whisper_inf.available_models, value="large-v3",
-                                               label="模型")
-                        dd_lang = gr.Dropdown(choices=["自动检测"] + self.whisper_inf.available_langs,
-                                              value="自动检测", label="语言")
+                        dd_model = gr.Dropdown(choices=["large-v3"], value="large-v3", label="模型")
+                        dd_lang = gr.Dropdown(choices=["自动检测"], value="自动检测", label="语言")
                         dd_file_format = gr.Dropdown(choices=["SRT", "WebVTT", "txt"], value="SRT", label="文件格式")
                     with gr.Row():
                         cb_translate = gr.Checkbox(value=False, label="翻译成英语？", interactive=True)
@@ -100,7 +249,12 @@ class App:
                         nb_beam_size = gr.Number(label="Beam大小", value=1, precision=0, interactive=True)
                         nb_log_prob_threshold = gr.Number(label="对数概率阈值", value=-1.0, interactive=True)
                         nb_no_speech_threshold = gr.Number(label="无语音阈值", value=0.6, interactive=True)
-                        dd_compute_type = gr.Dropdown(label="计算类型", choices=self.whisper_inf.available_compute_types, value=self.whisper_inf.current_compute_type, interactive=True)
+                        dd_compute_type = gr.Dropdown(label="计算类型", choices=[], value=None, interactive=True)
+                        cb_vad_filter = gr.Checkbox(label="启用VAD过滤静音", value=False, interactive=True)
+                        nb_vad_threshold = gr.Number(label="VAD语音阈值", value=DEFAULT_VAD_THRESHOLD, interactive=True)
+                        nb_vad_min_silence_duration_ms = gr.Number(label="最短静音时长(毫秒)", value=DEFAULT_MIN_SILENCE_DURATION_MS, precision=0, interactive=True)
+                        cb_word_timestamps = gr.Checkbox(label="提取单词级时间戳", value=False, interactive=True)
+                        tb_ct2_threads = gr.Textbox(label="CTranslate2线程(启动时用--cpu_threads和--num_workers设置)", interactive=False, visible=hasattr(self.whisper_inf.engine_class, "set_ct2_threads"))
                     with gr.Row():
                         btn_run = gr.Button("生成字幕文件", variant="primary")
                     with gr.Row():
@@ -109,23 +263,24 @@ class App:
                         btn_openfolder = gr.Button('📂', scale=1)
 
                     params = [tb_youtubelink, dd_model, dd_lang, dd_file_format, cb_translate, cb_timestamp]
-                    advanced_params = [nb_beam_size, nb_log_prob_threshold, nb_no_speech_threshold, dd_compute_type]
-                    btn_run.click(fn=self.whisper_inf.transcribe_youtube,
+                    advanced_params = [nb_beam_size, nb_log_prob_threshold, nb_no_speech_threshold, dd_compute_type,
+                                       cb_vad_filter, nb_vad_threshold, nb_vad_min_silence_duration_ms,
+                                       cb_word_timestamps]
+                    btn_run.click(**self.instrument("transcribe_youtube", self.whisper_inf.method("transcribe_youtube")),
                                   inputs=params + advanced_params,
                                   outputs=[tb_indicator, files_subtitles])
                     tb_youtubelink.change(get_ytmetas, inputs=[tb_youtubelink],
                                           outputs=[img_thumbnail, tb_title, tb_description])
-                    btn_openfolder.click(fn=lambda: self.open_folder("outputs"), inputs=None, outputs=None)
+                    btn_openfolder.click(fn=lambda: self.open_folder(self.output_config.output_dir), inputs=None, outputs=None)
                     dd_model.change(fn=self.on_change_models, inputs=[dd_model], outputs=[cb_translate])
+                    whisper_choices += [dd_model, dd_lang, dd_compute_type, tb_ct2_threads]
 
                 with gr.TabItem("麦克风"):  # tab3
                     with gr.Row():
                         mic_input = gr.Microphone(label="用麦克风录音", type="filepath", interactive=True)
                     with gr.Row():
-                        dd_model = gr.Dropdown(choices=self.whisper_inf.available_models, value="large-v3",
-                                               label="模型")
-                        dd_lang = gr.Dropdown(choices=["自动检测"] + self.whisper_inf.available_langs,
-                                              value="自动检测", label="语言")
+                        dd_model = gr.Dropdown(choices=["large-v3"], value="large-v3", label="模型")
+                        dd_lang = gr.Dropdown(choices=["自动检测"], value="自动检测", label="语言")
                         dd_file_format = gr.Dropdown(["SRT", "WebVTT", "txt"], value="SRT", label="文件格式")
                     with gr.Row():
                         cb_translate = gr.Checkbox(value=False, label="翻译成英语？", interactive=True)
@@ -133,7 +288,12 @@ class App:
                         nb_beam_size = gr.Number(label="Beam大小", value=1, precision=0, interactive=True)
                         nb_log_prob_threshold = gr.Number(label="对数概率阈值", value=-1.0, interactive=True)
                         nb_no_speech_threshold = gr.Number(label="无语音阈值", value=0.6, interactive=True)
-                        dd_compute_type = gr.Dropdown(label="计算类型", choices=self.whisper_inf.available_compute_types, value=self.whisper_inf.current_compute_type, interactive=True)
+                        dd_compute_type = gr.Dropdown(label="计算类型", choices=[], value=None, interactive=True)
+                        cb_vad_filter = gr.Checkbox(label="启用VAD过滤静音", value=False, interactive=True)
+                        nb_vad_threshold = gr.Number(label="VAD语音阈值", value=DEFAULT_VAD_THRESHOLD, interactive=True)
+                        nb_vad_min_silence_duration_ms = gr.Number(label="最短静音时长(毫秒)", value=DEFAULT_MIN_SILENCE_DURATION_MS, precision=0, interactive=True)
+                        cb_word_timestamps = gr.Checkbox(label="提取单词级时间戳", value=False, interactive=True)
+                        tb_ct2_threads = gr.Textbox(label="CTranslate2线程(启动时用--cpu_threads和--num_workers设置)", interactive=False, visible=hasattr(self.whisper_inf.engine_class, "set_ct2_threads"))
                     with gr.Row():
                         btn_run = gr.Button("生成字幕文件", variant="primary")
                     with gr.Row():
@@ -142,12 +302,15 @@ class App:
                         btn_openfolder = gr.Button('📂', scale=1)
 
                     params = [mic_input, dd_model, dd_lang, dd_file_format, cb_translate]
-                    advanced_params = [nb_beam_size, nb_log_prob_threshold, nb_no_speech_threshold, dd_compute_type]
-                    btn_run.click(fn=self.whisper_inf.transcribe_mic,
+                    advanced_params = [nb_beam_size, nb_log_prob_threshold, nb_no_speech_threshold, dd_compute_type,
+                                       cb_vad_filter, nb_vad_threshold, nb_vad_min_silence_duration_ms,
+                                       cb_word_timestamps]
+                    btn_run.click(**self.instrument("transcribe_mic", self.whisper_inf.method("transcribe_mic")),
                                   inputs=params + advanced_params,
                                   outputs=[tb_indicator, files_subtitles])
-                    btn_openfolder.click(fn=lambda: self.open_folder("outputs"), inputs=None, outputs=None)
+                    btn_openfolder.click(fn=lambda: self.open_folder(self.output_config.output_dir), inputs=None, outputs=None)
                     dd_model.change(fn=self.on_change_models, inputs=[dd_model], outputs=[cb_translate])
+                    whisper_choices += [dd_model, dd_lang, dd_compute_type, tb_ct2_threads]
 
                 with gr.TabItem("文本翻译"):  # tab 4
                     with gr.Row():
@@ -161,10 +324,10 @@ class App:
                         with gr.Row():
                             dd_deepl_sourcelang = gr.Dropdown(label="源语言", value="Automatic Detection",
                                                               choices=list(
-                                                                  self.deepl_api.available_source_langs.keys()))
+                                                                  DEEPL_AVAILABLE_SOURCE_LANGS.keys()))
                             dd_deepl_targetlang = gr.Dropdown(label="目标语言", value="English",
                                                               choices=list(
-                                                                  self.deepl_api.available_target_langs.keys()))
+                                                                  DEEPL_AVAILABLE_TARGET_LANGS.keys()))
                         with gr.Row():
                             cb_deepl_ispro = gr.Checkbox(label="专业版用户?", value=False)
                         with gr.Row():
@@ -174,26 +337,35 @@ class App:
                             files_subtitles = gr.Files(label="下载输出文件", scale=4)
                             btn_openfolder = gr.Button('📂', scale=1)
 
-                    btn_run.click(fn=self.deepl_api.translate_deepl,
+                    btn_run.click(**self.instrument("translate_deepl", self.deepl_api.method("translate_deepl")),
                                   inputs=[tb_authkey, file_subs, dd_deepl_sourcelang, dd_deepl_targetlang,
                                           cb_deepl_ispro],
                                   outputs=[tb_indicator, files_subtitles])
 
-                    btn_openfolder.click(fn=lambda: self.open_folder(os.path.join("outputs", "translations")),
+                    btn_openfolder.click(fn=lambda: self.open_folder(self.output_config.translations_dir),
                                          inputs=None,
                                          outputs=None)
 
                     with gr.TabItem("NLLB"):  # sub tab2
                         with gr.Row():
-                            dd_nllb_model = gr.Dropdown(label="模型", value=self.nllb_inf.default_model_size,
-                                                        choices=self.nllb_inf.available_models)
+                            dd_nllb_model = gr.Dropdown(label="模型", value=DEFAULT_NLLB_MODEL_SIZE,
+                                                        choices=NLLB_MODELS)
                             dd_nllb_sourcelang = gr.Dropdown(label="源语言",
-                                                             choices=self.nllb_inf.available_source_langs)
+                                                             choices=list(NLLB_AVAILABLE_LANGS.keys()))
                             dd_nllb_targetlang = gr.Dropdown(label="目标语言",
-                                                             choices=self.nllb_inf.available_target_langs)
+                                                             choices=list(NLLB_AVAILABLE_LANGS.keys()))
                         with gr.Row():
                             cb_timestamp = gr.Checkbox(value=True, label="在文件名末尾添加时间戳",
                                                        interactive=True)
+                        with gr.Accordion("高级参数", open=False):
+                            nb_nllb_batch_size = gr.Number(label="批大小", value=DEFAULT_BATCH_SIZE,
+                                                           precision=0, interactive=True)
+                            dd_nllb_backend = gr.Dropdown(label="推理后端", value=TRANSFORMERS_BACKEND,
+                                                          choices=NLLB_BACKENDS, interactive=True)
+                            dd_nllb_compute_type = gr.Dropdown(label="计算类型 (仅ctranslate2)",
+                                                               value=DEFAULT_CT2_COMPUTE_TYPE,
+                                                               choices=[DEFAULT_CT2_COMPUTE_TYPE],
+                                                               interactive=True)
                         with gr.Row():
                             btn_run = gr.Button("翻译字幕文件", variant="primary")
                         with gr.Row():
@@ -203,14 +375,19 @@ class App:
                         with gr.Column():
                             md_vram_table = gr.HTML(NLLB_VRAM_TABLE, elem_id="md_nllb_vram_table")
 
-                    btn_run.click(fn=self.nllb_inf.translate_file,
-                                  inputs=[file_subs, dd_nllb_model, dd_nllb_sourcelang, dd_nllb_targetlang, cb_timestamp],
+                    dd_nllb_backend.change(fn=self.on_change_nllb_backend, inputs=[dd_nllb_backend],
+                                           outputs=[dd_nllb_compute_type])
+                    btn_run.click(**self.instrument("translate_file", self.nllb_inf.method("translate_file")),
+                                  inputs=[file_subs, dd_nllb_model, dd_nllb_sourcelang, dd_nllb_targetlang, cb_timestamp,
+                                          nb_nllb_batch_size, dd_nllb_backend, dd_nllb_compute_type],
                                   outputs=[tb_indicator, files_subtitles])
 
-                    btn_openfolder.click(fn=lambda: self.open_folder(os.path.join("outputs", "translations")),
+                    btn_openfolder.click(fn=lambda: self.open_folder(self.output_config.translations_dir),
                                          inputs=None,
                                          outputs=None)
 
+            self.app.load(fn=self.load_whisper_choices, inputs=None, outputs=whisper_choices)
+
         # Launch the app with optional gradio settings
         launch_args = {}
         if self.args.share:
@@ -221,7 +398,17 @@ class App:
             launch_args['server_port'] = self.args.server_port
         if self.args.username and self.args.password:
             launch_args['auth'] = (self.args.username, self.args.password)
-        self.app.queue(api_open=False).launch(**launch_args)
+        self.app.queue(api_open=False, default_concurrency_limit=self.concurrency_limit).launch(**launch_args)
+
+
+def parse_model_specs(value: str) -> List[Tuple[str, Optional[str]]]:
+    """Parses "large-v3:float16,small" into [("large-v3", "float16"), ("small", None)]"""
+    model_specs = []
+    for spec in value.split(","):
+        model_size, _, compute_type = spec.strip().partition(":")
+        if model_size:
+            model_specs.append((model_size, compute_type or None))
+    return model_specs
 
 
 # Create the parser for command-line arguments
@@ -233,9 +420,21 @@ parser.add_argument('--server_port', type=int, default=None, help='Gradio服务
 parser.add_argument('--username', type=str, default=None, help='Gradio认证用户名')
 parser.add_argument('--password', type=str, default=None, help='Gradio认证密码')
 parser.add_argument('--theme', type=str, default=None, help='Gradio Blocks主题')
+parser.add_argument('--model_memory_budget', type=float, default=8.0, help='已加载Whisper模型的内存预算(GB)，超出时按最近最少使用淘汰模型')
+parser.add_argument('--worker_processes', type=int, default=0, help='faster_whisper转录工作进程数，每个进程加载自己的模型并平分CPU核心。0表示在主进程中转录')
+parser.add_argument('--transcription_cache_size', type=float, default=512, help='转录结果缓存(outputs/cache)的大小上限(MB)，相同音频和参数直接复用结果。0表示禁用')
+parser.add_argument('--audio_cache_size', type=float, default=2048, help='解码音频缓存(outputs/cache/audio)的大小上限(MB)。每个输入文件只用ffmpeg解码一次为16kHz PCM并以内存映射复用。0表示禁用')
+parser.add_argument('--parallel_chunk_length', type=float, default=0, help='faster_whisper长音频并行转录的分块长度(秒)。超过该长度的音频在静音处切分，各块由工作进程或线程并行转录后拼接。0表示禁用')
+parser.add_argument('--preload_models', type=parse_model_specs, default=[], help='启动时预加载并预热的Whisper模型(使用转录工作进程时只在工作进程中加载)，格式为"模型[:计算类型],..."，例如"large-v3:float16,small"。省略计算类型时使用设备的默认值。预热完成后才启动WebUI，避免首个请求等待模型加载')
+parser.add_argument('--cpu_threads', type=int, default=0, help='faster_whisper每个模型副本的CPU线程数(CTranslate2 intra_threads)。0表示使用为本机调优的值，未调优时由CTranslate2决定')
+parser.add_argument('--num_workers', type=int, default=0, help='faster_whisper模型副本数(CTranslate2 inter_threads)，也是同时转录的文件数。0表示使用为本机调优的值，未调优时为1')
+parser.add_argument('--autotune_threads', type=parse_model_specs, default=[], help='启动时用该模型(格式"模型[:计算类型]"，例如"small")转录一段短音频，测试多种cpu_threads和num_workers组合，并把最快的组合保存到models/ct2_tuning.json供以后启动使用')
+parser.add_argument('--preload_timeout', type=float, default=1800, help='等待转录工作进程预热的最长时间(秒)。超时后列出未就绪的工作进程，若有工作进程就绪则继续启动，否则以错误退出')
+parser.add_argument('--disable_translation_memory', type=bool, default=False, nargs='?', const=True, help='禁用翻译记忆库(outputs/translations/translation_memory.db)，每次都重新翻译所有字幕行')
+parser.add_argument('--metrics_port', type=int, default=None, help='在该端口的/metrics提供Prometheus格式的指标(请求排队时间、各阶段耗时、处理的音频秒数、缓存命中、内存)。不设置则禁用')
+parser.add_argument('--metrics_host', type=str, default="127.0.0.1", help='指标服务器监听的主机')
 parser.add_argument('--colab', type=bool, default=False, nargs='?', const=True, help='是否为colab用户')
-_args = parser.parse_args()
 
 if __name__ == "__main__":
-    app = App(args=_args)
+    app = App(args=parser.parse_args())
     app.launch()
@@ -0,0 +1,61 @@
+"""
+Benchmark of transcribing several files at once in modules/faster_whisper_inference.py.
+Transcribes the same files one after another (num_workers=1 with every core) and with 2, 4 and 8 model replicas
+that split the cores between them, and prints the throughput and the speedup over the sequential run.
+
+Usage: python benchmarks/batch_transcription.py [model, default tiny] [number of files, default 8]
+                                                [seconds per file, default 30] [audio file, default quiet noise]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.faster_whisper_inference import FasterWhisperInference
+from modules.base_interface import make_warmup_audio, WARMUP_DECODE_PARAMS
+from modules.vad import SAMPLING_RATE
+
+NUM_WORKERS = [1, 2, 4, 8]
+
+
+def no_progress(*args, **kwargs):
+    pass
+
+
+def load_benchmark_audio(audio_path, length: float):
+    if audio_path is None:
+        return make_warmup_audio(length)
+    import faster_whisper
+    return faster_whisper.decode_audio(audio_path, sampling_rate=SAMPLING_RATE)[:int(length * SAMPLING_RATE)]
+
+
+if __name__ == "__main__":
+    model_size = sys.argv[1] if len(sys.argv) > 1 else "tiny"
+    file_count = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    file_length = float(sys.argv[3]) if len(sys.argv) > 3 else 30.0
+    audio_path = sys.argv[4] if len(sys.argv) > 4 else None
+    audio = load_benchmark_audio(audio_path, file_length)
+    audio_length = len(audio) / SAMPLING_RATE
+    cpu_count = os.cpu_count() or 1
+
+    sequential_time = None
+    for num_workers in NUM_WORKERS:
+        if num_workers > cpu_count or num_workers > file_count:
+            break
+        cpu_threads = cpu_count // num_workers
+        # Caches are off, so every file is decoded and transcribed
+        engine = FasterWhisperInference(transcription_cache_size_mb=0, audio_cache_size_mb=0,
+                                        cpu_threads=cpu_threads, num_workers=num_workers)
+        engine.preload_model(model_size=model_size)
+        start_time = time.perf_counter()
+        engine.transcribe_batch(audios=[audio] * file_count, model_size=model_size,
+                                compute_type=engine.current_compute_type, progress=no_progress,
+                                **WARMUP_DECODE_PARAMS)
+        elapsed_time = time.perf_counter() - start_time
+        sequential_time = sequential_time or elapsed_time
+        print(f"num_workers={num_workers:<3}cpu_threads={cpu_threads:<4}{file_count} files in {elapsed_time:7.2f}s, "
+              f"{file_count * audio_length / elapsed_time:7.1f} audio seconds per second, "
+              f"speedup {sequential_time / elapsed_time:.2f}x")
+        engine.model_pool.clear()
+        engine.model = None
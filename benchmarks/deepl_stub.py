@@ -0,0 +1,116 @@
+"""
+Check of the retries and the rate limiting of modules/deepl_api.py against a local stub of the DeepL API.
+The stub answers the first request with 429 and a Retry-After header, which DeepLAPI has to wait for before it
+retries, and every other request with 200. Then many single-text batches are translated at once, and their
+requests have to be paced by the token bucket. Fails if either isn't the case.
+
+Usage: python benchmarks/deepl_stub.py [number of requests to pace, default 20] [requests per second, default 10]
+"""
+import os
+import sys
+import json
+import time
+import threading
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.deepl_api import DeepLAPI, TokenBucket
+
+RETRY_AFTER_S = 1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Times the requests arrived at, and the number of 429 responses still to send
+    request_times = []
+    rate_limited_responses = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        texts = parse_qs(body).get("text", [])
+        with self.lock:
+            self.request_times.append(time.monotonic())
+            rate_limited = StubHandler.rate_limited_responses > 0
+            if rate_limited:
+                StubHandler.rate_limited_responses -= 1
+
+        if rate_limited:
+            self.send_response(429)
+            self.send_header("Retry-After", str(RETRY_AFTER_S))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        response = json.dumps({"translations": [{"detected_source_language": "EN", "text": text.upper()}
+                                                for text in texts]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops some of the concurrent connections, which then connect a second later
+    request_queue_size = 64
+
+
+def reset_stub(rate_limited_responses: int):
+    with StubHandler.lock:
+        StubHandler.request_times.clear()
+        StubHandler.rate_limited_responses = rate_limited_responses
+
+
+def no_progress(*args, **kwargs):
+    pass
+
+
+def check_retry_after(deepl_api: DeepLAPI) -> bool:
+    reset_stub(rate_limited_responses=1)
+    translations = deepl_api.request_deepl_translate("stub-key", ["hello"], "English", "German", False)
+    request_times = list(StubHandler.request_times)
+    wait_time = request_times[1] - request_times[0] if len(request_times) == 2 else 0.0
+    print(f"429 then 200: {len(request_times)} requests, retried after {wait_time:.2f}s "
+          f"(Retry-After: {RETRY_AFTER_S}s), translation: {translations[0]['text']}")
+    return len(request_times) == 2 and wait_time >= RETRY_AFTER_S and translations[0]["text"] == "HELLO"
+
+
+def check_pacing(deepl_api: DeepLAPI,
+                 request_count: int,
+                 requests_per_second: float) -> bool:
+    reset_stub(rate_limited_responses=0)
+    deepl_api.max_text_batch_size = 1
+    deepl_api.max_concurrent_requests = 8
+    deepl_api.rate_limiter = TokenBucket(rate=requests_per_second, capacity=deepl_api.max_concurrent_requests)
+    texts = [f"line {i}" for i in range(request_count)]
+
+    start_time = time.monotonic()
+    translated_texts = deepl_api.translate_texts("stub-key", texts, "English", "German", False, progress=no_progress)
+    elapsed_time = time.monotonic() - start_time
+
+    # The bucket starts full, so the first `capacity` requests go out at once and the rest at `rate`
+    min_time = max(0, request_count - deepl_api.rate_limiter.capacity) / requests_per_second
+    print(f"{request_count} requests in {elapsed_time:.2f}s, at least {min_time:.2f}s at {requests_per_second:g} "
+          f"requests per second with bursts of {deepl_api.rate_limiter.capacity}")
+    return (len(StubHandler.request_times) == request_count and elapsed_time >= min_time * 0.95
+            and translated_texts == [text.upper() for text in texts])
+
+
+if __name__ == "__main__":
+    request_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    requests_per_second = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    deepl_api = DeepLAPI(api_url=f"http://127.0.0.1:{server.server_address[1]}/v2/translate")
+
+    passed = check_retry_after(deepl_api)
+    passed = check_pacing(deepl_api, request_count, requests_per_second) and passed
+    server.shutdown()
+    if not passed:
+        print("DeepL API client failed the stub checks")
+        sys.exit(1)
@@ -0,0 +1,64 @@
+"""
+Benchmark of the cold start of the WebUI.
+Imports app.py and constructs App in a fresh interpreter with `python -X importtime`, prints the slowest imports
+and the heavy libraries that were loaded, and fails if the startup takes longer than the budget.
+
+Usage: python benchmarks/import_time.py [budget in seconds, default 8] [number of imports to show, default 15]
+"""
+import os
+import sys
+import json
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGET_S = 8.0
+# Libraries that only some tabs need. They should only show up here if another import pulls them in.
+HEAVY_MODULES = ["torch", "whisper", "faster_whisper", "ctranslate2", "transformers", "huggingface_hub",
+                 "pytube", "requests"]
+
+STARTUP_SCRIPT = """
+import sys, json, time
+start_time = time.perf_counter()
+import app
+import_time = time.perf_counter() - start_time
+app.App(args=app.parser.parse_args([]))
+print(json.dumps({"import": import_time, "construct": time.perf_counter() - start_time - import_time,
+                  "modules": sorted(sys.modules)}))
+"""
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Returns {module: cumulative import time in seconds} from the -X importtime output"""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+if __name__ == "__main__":
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BUDGET_S
+    top = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT],
+                             cwd=ROOT_DIR, capture_output=True, text=True)
+    if process.returncode != 0:
+        print(process.stderr[-2000:])
+        sys.exit(process.returncode)
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    import_times = parse_importtime(process.stderr)
+
+    print(f"{'module':<40}{'cumulative':>12}")
+    for name, seconds in sorted(import_times.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"{name:<40}{seconds:>11.2f}s")
+    loaded = [name for name in HEAVY_MODULES if name in result["modules"]]
+    print(f"\nHeavy libraries loaded at startup: {', '.join(loaded) or 'none'}")
+
+    startup_time = result["import"] + result["construct"]
+    print(f"import app: {result['import']:.2f}s, App(): {result['construct']:.2f}s, "
+          f"total: {startup_time:.2f}s, budget: {budget:.2f}s")
+    if startup_time > budget:
+        print("Startup is over budget")
+        sys.exit(1)
@@ -0,0 +1,38 @@
+"""
+Benchmark of the NLLB translation backends in modules/nllb_inference.py.
+Translates the same synthetic subtitle lines with transformers and with CTranslate2 at several compute types.
+
+Usage: python benchmarks/nllb_backends.py [model, default facebook/nllb-200-distilled-600M] [number of lines]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.nllb_inference import NLLBInference, TRANSFORMERS_BACKEND, CTRANSLATE2_BACKEND
+
+CT2_COMPUTE_TYPES = ["int8", "int8_float32", "float32"]
+
+
+def no_progress(*args, **kwargs):
+    pass
+
+
+if __name__ == "__main__":
+    model_size = sys.argv[1] if len(sys.argv) > 1 else "facebook/nllb-200-distilled-600M"
+    line_count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    texts = [f"This is subtitle line number {i}, and it says something about the weather today." for i in range(line_count)]
+
+    nllb_inf = NLLBInference()
+    configs = [(TRANSFORMERS_BACKEND, None)] + [(CTRANSLATE2_BACKEND, compute_type)
+                                                 for compute_type in CT2_COMPUTE_TYPES
+                                                 if compute_type in nllb_inf.available_compute_types]
+    for backend, compute_type in configs:
+        nllb_inf.update_model_if_needed(model_size=model_size, backend=backend,
+                                        compute_type=compute_type or "float32", progress=no_progress)
+        nllb_inf.pipeline = nllb_inf.get_pipeline(src_lang="eng_Latn", tgt_lang="fra_Latn")
+        start_time = time.perf_counter()
+        nllb_inf.translate_texts(texts, batch_size=16, progress=no_progress)
+        elapsed_time = time.perf_counter() - start_time
+        print(f"{backend:<14}{compute_type or '':<14}{line_count / elapsed_time:8.1f} cues/s")
@@ -0,0 +1,63 @@
+"""
+Benchmark of the cost of writing output files outside of the UI.
+Measures in a fresh interpreter the first and the following calls of safe_filename(), and whether they imported
+app.py or gradio, then the time until a pool of transcription worker processes is ready.
+Run it on two commits to compare them.
+
+Usage: python benchmarks/output_layer.py [number of workers, default 2, 0 to skip the worker pool]
+"""
+import os
+import sys
+import json
+import time
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+SAFE_FILENAME_SCRIPT = """
+import sys, json, time, timeit
+start_time = time.perf_counter()
+from modules.subtitle_manager import safe_filename
+import_time = time.perf_counter() - start_time
+start_time = time.perf_counter()
+safe_filename("first: call?.srt")
+first_call_time = time.perf_counter() - start_time
+number = 100000
+per_call_time = timeit.timeit(lambda: safe_filename("a <subtitle> file: name?.srt"), number=number) / number
+print(json.dumps({"import": import_time, "first_call": first_call_time, "per_call": per_call_time,
+                  "imported_app": "app" in sys.modules, "imported_gradio": "gradio" in sys.modules}))
+"""
+
+
+def measure_safe_filename() -> dict:
+    process = subprocess.run([sys.executable, "-c", SAFE_FILENAME_SCRIPT],
+                             cwd=ROOT_DIR, capture_output=True, text=True)
+    if process.returncode != 0:
+        print(process.stderr[-2000:])
+        sys.exit(process.returncode)
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def measure_worker_spawn(num_workers: int) -> float:
+    from modules.worker_pool import TranscriptionWorkerPool
+
+    start_time = time.perf_counter()
+    worker_pool = TranscriptionWorkerPool(num_workers=num_workers)
+    worker_pool.wait_until_ready()
+    spawn_time = time.perf_counter() - start_time
+    worker_pool.shutdown()
+    return spawn_time
+
+
+if __name__ == "__main__":
+    num_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+
+    result = measure_safe_filename()
+    print(f"import subtitle_manager: {result['import'] * 1000:.1f} ms")
+    print(f"safe_filename first call: {result['first_call'] * 1000:.2f} ms, "
+          f"following calls: {result['per_call'] * 1e6:.2f} us")
+    print(f"imported app.py: {result['imported_app']}, imported gradio: {result['imported_gradio']}")
+
+    if num_workers > 0:
+        print(f"{num_workers} workers ready in {measure_worker_spawn(num_workers):.2f}s")
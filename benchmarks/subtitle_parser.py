@@ -0,0 +1,75 @@
+"""
+Parse throughput benchmark of the streaming subtitle parser in modules/subtitle_manager.py.
+Generates an SRT corpus of the given size, then times the previous split-based parser,
+`iter_cues`, `build_cue_index` and random access with `read_cue`.
+
+Usage: python benchmarks/subtitle_parser.py [corpus size in MB, default 100]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.subtitle_manager import iter_cues, build_cue_index, read_cue, iter_srt
+
+
+def split_parse_srt(file_path):
+    with open(file_path, 'r', encoding='utf-8') as file:
+        srt_data = file.read()
+
+    data = []
+    for block in srt_data.split('\n\n'):
+        if block.strip() != '':
+            lines = block.strip().split('\n')
+            data.append({"index": lines[0], "timestamp": lines[1], "sentence": ' '.join(lines[2:])})
+    return data
+
+
+def make_corpus(file_path, size_mb):
+    target_size = size_mb * 1024 * 1024
+    cue_count = 0
+    with open(file_path, 'w', encoding='utf-8') as f:
+        while f.tell() < target_size:
+            segments = [{"start": (cue_count + i) * 2.5, "end": (cue_count + i) * 2.5 + 2.0,
+                         "text": f"Subtitle line {cue_count + i} with a little more text to look realistic."}
+                        for i in range(10000)]
+            f.writelines(iter_srt(segments))
+            cue_count += len(segments)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_path = os.path.join(tmp_dir, "corpus.srt")
+        make_corpus(corpus_path, size_mb)
+        file_size_mb = os.path.getsize(corpus_path) / 1024 / 1024
+
+        dicts, split_time = timed(lambda: split_parse_srt(corpus_path))
+        print(f"split parser:    {len(dicts)} cues, {file_size_mb / split_time:.1f} MB/s")
+        del dicts
+
+        def count_cues():
+            with open(corpus_path, 'rb') as f:
+                return sum(1 for _ in iter_cues(f))
+        cue_count, stream_time = timed(count_cues)
+        print(f"iter_cues:       {cue_count} cues, {file_size_mb / stream_time:.1f} MB/s")
+
+        cue_index, index_time = timed(lambda: build_cue_index(corpus_path))
+        print(f"build_cue_index: {len(cue_index)} offsets in {index_time:.2f} s "
+              f"({cue_index.itemsize * len(cue_index) / 1024 / 1024:.1f} MB)")
+
+        def random_reads():
+            with open(corpus_path, 'rb') as f:
+                for n in random.sample(range(len(cue_index)), 1000):
+                    read_cue(f, cue_index, n)
+        _, read_time = timed(random_reads)
+        print(f"read_cue:        {read_time / 1000 * 1e6:.1f} us per random cue")
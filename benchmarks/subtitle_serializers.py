@@ -0,0 +1,76 @@
+"""
+Micro-benchmark of the subtitle serializers in modules/subtitle_manager.py against the previous
+implementation, which built the output with `output += ...`.
+
+Usage: python benchmarks/subtitle_serializers.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.subtitle_manager import get_srt, get_vtt
+
+CUE_COUNTS = [1000, 10000, 100000]
+
+
+def timeformat_srt(time):
+    hours = time // 3600
+    minutes = (time - hours * 3600) // 60
+    seconds = time - hours * 3600 - minutes * 60
+    milliseconds = (time - int(time)) * 1000
+    return f"{int(hours):02d}:{int(minutes):02d}:{int(seconds):02d},{int(milliseconds):03d}"
+
+
+def timeformat_vtt(time):
+    hours = time // 3600
+    minutes = (time - hours * 3600) // 60
+    seconds = time - hours * 3600 - minutes * 60
+    milliseconds = (time - int(time)) * 1000
+    return f"{int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}.{int(milliseconds):03d}"
+
+
+def concat_srt(segments):
+    output = ""
+    for i, segment in enumerate(segments):
+        output += f"{i + 1}\n"
+        output += f"{timeformat_srt(segment['start'])} --> {timeformat_srt(segment['end'])}\n"
+        text = segment['text'][1:] if segment['text'].startswith(' ') else segment['text']
+        output += f"{text}\n\n"
+    return output
+
+
+def concat_vtt(segments):
+    output = "WebVTT\n\n"
+    for i, segment in enumerate(segments):
+        output += f"{i + 1}\n"
+        output += f"{timeformat_vtt(segment['start'])} --> {timeformat_vtt(segment['end'])}\n"
+        text = segment['text'][1:] if segment['text'].startswith(' ') else segment['text']
+        output += f"{text}\n\n"
+    return output
+
+
+def make_segments(count):
+    return [{"start": i * 2.5, "end": i * 2.5 + 2.0, "text": f" This is subtitle line number {i}."}
+            for i in range(count)]
+
+
+def best_of(fn, segments, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(segments)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    print(f"{'format':<8}{'cues':>8}{'concat (ms)':>14}{'join (ms)':>12}{'speedup':>10}")
+    for old_fn, new_fn, name in [(concat_srt, get_srt, "SRT"), (concat_vtt, get_vtt, "WebVTT")]:
+        for count in CUE_COUNTS:
+            segments = make_segments(count)
+            assert old_fn(segments) == new_fn(segments)
+            old_time = best_of(old_fn, segments)
+            new_time = best_of(new_fn, segments)
+            print(f"{name:<8}{count:>8}{old_time * 1000:>14.1f}{new_time * 1000:>12.1f}{old_time / new_time:>9.2f}x")
@@ -0,0 +1,323 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+from datetime import datetime
+from collections import Counter
+from typing import Callable, Dict, List, NamedTuple, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from modules.job_ledger import JobLedger, DEFAULT_LEDGER_PATH
+from modules.progress import no_progress
+from modules.subtitle_manager import OutputConfig
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".flac", ".ogg", ".opus", ".aac", ".wma",
+                    ".webm", ".mp4", ".mkv", ".mov", ".avi")
+SUBTITLE_FILE_EXTENSIONS = (".srt", ".vtt")
+
+# Parameters that change the output of a job, and so are part of its ledger key
+JOB_PARAMS = {
+    "transcribe": ["engine", "model_size", "lang", "file_format", "translate", "add_timestamp", "beam_size",
+                   "log_prob_threshold", "no_speech_threshold", "compute_type", "vad_filter", "vad_threshold",
+                   "vad_min_silence_duration_ms", "word_timestamps"],
+    "translate_nllb": ["model_size", "src_lang", "tgt_lang", "add_timestamp", "batch_size", "backend", "compute_type"],
+    "translate_deepl": ["src_lang", "tgt_lang", "is_pro"],
+}
+
+
+class InputFile(NamedTuple):
+    """Input of the handlers, which read the path from `name` like they do for the files of gr.Files()"""
+    name: str
+
+
+def collect_inputs(inputs: List[str],
+                   manifest: Optional[str],
+                   extensions: tuple) -> List[str]:
+    """
+    Returns the files to process: the given files, the files with one of `extensions` under the given
+    directories, and the paths listed in the manifest, one per line. Relative paths in the manifest are
+    relative to the manifest, and lines starting with # are ignored.
+    """
+    paths = list(inputs)
+    if manifest:
+        manifest_dir = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    paths.append(os.path.join(manifest_dir, line))
+
+    file_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                file_paths += [os.path.join(root, file) for file in sorted(files)
+                               if file.lower().endswith(extensions)]
+        elif os.path.isfile(path):
+            file_paths.append(path)
+        else:
+            raise FileNotFoundError(f"Input {path} does not exist")
+    # The same file may be listed twice, e.g. in the manifest and in a directory
+    return list(dict.fromkeys(os.path.abspath(file_path) for file_path in file_paths))
+
+
+def get_output_names(file_paths: List[str]) -> Dict[str, str]:
+    """
+    Returns the name the outputs of every input are written under: its file name without the extension,
+    followed by a short hash of its path if another input has the same name, so e.g. a/x.wav and
+    b/x.wav don't write the same outputs/x.srt.
+    """
+    def get_stem(file_path: str) -> str:
+        return os.path.splitext(os.path.basename(file_path))[0]
+
+    # Case-insensitive, like the file systems of Windows and macOS
+    stem_counts = Counter(get_stem(file_path).lower() for file_path in file_paths)
+    output_names = {}
+    for file_path in file_paths:
+        stem = get_stem(file_path)
+        if stem_counts[stem.lower()] > 1:
+            path_hash = hashlib.sha1(file_path.encode("utf-8")).hexdigest()[:8]
+            stem = f"{stem}-{path_hash}"
+        output_names[file_path] = stem
+    return output_names
+
+
+def link_input(file_path: str,
+               link_path: str) -> str:
+    """
+    Makes the input available as `link_path`, whose name the handlers name the outputs after.
+    The handlers remove their inputs, which are temporary uploads in the UI, so they never get the original.
+    """
+    try:
+        os.symlink(file_path, link_path)
+    except OSError:
+        # Symbolic links need a privilege on Windows
+        try:
+            os.link(file_path, link_path)
+        except OSError:
+            shutil.copyfile(file_path, link_path)
+    return link_path
+
+
+def run_jobs(file_paths: List[str],
+             process_fn: Callable[[str], List[str]],
+             job_params: dict,
+             ledger: JobLedger,
+             concurrency: int) -> List[dict]:
+    """
+    Runs `process_fn` on every file that isn't done in the ledger yet, `concurrency` files at a time.
+    `process_fn` gets a link to the file named after `get_output_names`, returns the paths of the files
+    it wrote and raises if it fails.
+    """
+    output_names = get_output_names(file_paths)
+    results = {}
+    pending = []
+    for file_path in file_paths:
+        key = ledger.make_key(file_path, **job_params)
+        entry = ledger.get_done(key)
+        if entry is not None:
+            print(f"Skipping {file_path}, it was done at {entry['finished_at']}")
+            results[file_path] = {**entry, "status": "skipped"}
+        else:
+            pending.append((file_path, key))
+
+    def process(file_path: str, key: str) -> dict:
+        start_time = time.time()
+        entry = {"key": key, "input": file_path, "outputs": [], "error": None}
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                link_path = os.path.join(tmp_dir, output_names[file_path] + os.path.splitext(file_path)[1])
+                entry["outputs"] = process_fn(link_input(file_path, link_path))
+            entry["status"] = "done"
+        except Exception as e:
+            entry["status"] = "failed"
+            entry["error"] = f"{type(e).__name__}: {e}"
+        entry["elapsed_time"] = time.time() - start_time
+        entry["finished_at"] = datetime.now().isoformat(timespec="seconds")
+        ledger.record(entry)
+        return entry
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [executor.submit(process, file_path, key) for file_path, key in pending]
+        for done, future in enumerate(as_completed(futures), start=1):
+            entry = future.result()
+            results[entry["input"]] = entry
+            status = entry["status"] if entry["error"] is None else f"{entry['status']} ({entry['error']})"
+            print(f"[{done}/{len(pending)}] {entry['input']}: {status} in {entry['elapsed_time']:.1f}s")
+    return [results[file_path] for file_path in file_paths]
+
+
+def build_transcribe_fn(args) -> Callable[[str], List[str]]:
+    if args.engine == "whisper":
+        from modules.whisper_Inference import WhisperInference
+        whisper_inf = WhisperInference(model_memory_budget_gb=args.model_memory_budget,
+                                       transcription_cache_size_mb=args.transcription_cache_size,
+                                       audio_cache_size_mb=args.audio_cache_size,
+                                       output_config=OutputConfig(output_dir=args.output_dir))
+    else:
+        from modules.faster_whisper_inference import FasterWhisperInference
+        worker_pool = None
+        if args.worker_processes > 0:
+            from modules.worker_pool import TranscriptionWorkerPool
+            print(f"Starting {args.worker_processes} transcription worker processes")
+            worker_pool = TranscriptionWorkerPool(num_workers=args.worker_processes,
+                                                  model_memory_budget_gb=args.model_memory_budget,
+                                                  cpu_threads=args.cpu_threads,
+                                                  ct2_num_workers=args.num_workers)
+        whisper_inf = FasterWhisperInference(model_memory_budget_gb=args.model_memory_budget,
+                                             transcription_cache_size_mb=args.transcription_cache_size,
+                                             audio_cache_size_mb=args.audio_cache_size,
+                                             worker_pool=worker_pool,
+                                             parallel_chunk_length=args.parallel_chunk_length,
+                                             output_config=OutputConfig(output_dir=args.output_dir),
+                                             cpu_threads=args.cpu_threads,
+                                             num_workers=args.num_workers)
+    if args.compute_type is None:
+        args.compute_type = whisper_inf.current_compute_type
+
+    def transcribe(file_path: str) -> List[str]:
+        result = whisper_inf.transcribe_file([InputFile(file_path)], args.model_size, args.lang, args.file_format,
+                                             args.translate, args.add_timestamp, args.beam_size,
+                                             args.log_prob_threshold, args.no_speech_threshold, args.compute_type,
+                                             args.vad_filter, args.vad_threshold, args.vad_min_silence_duration_ms,
+                                             args.word_timestamps, progress=no_progress)
+        return result[1]
+    return transcribe
+
+
+def build_translate_nllb_fn(args, translation_memory) -> Callable[[str], List[str]]:
+    from modules.nllb_inference import NLLBInference
+    nllb_inf = NLLBInference(translation_memory=translation_memory, output_config=OutputConfig(output_dir=args.output_dir))
+
+    def translate(file_path: str) -> List[str]:
+        result = nllb_inf.translate_file([InputFile(file_path)], args.model_size, args.src_lang, args.tgt_lang,
+                                         args.add_timestamp, args.batch_size, args.backend, args.compute_type,
+                                         progress=no_progress)
+        return [result[1]]
+    return translate
+
+
+def build_translate_deepl_fn(args, translation_memory) -> Callable[[str], List[str]]:
+    from modules.deepl_api import DeepLAPI
+    deepl_api = DeepLAPI(translation_memory=translation_memory, output_config=OutputConfig(output_dir=args.output_dir))
+
+    def translate(file_path: str) -> List[str]:
+        result = deepl_api.translate_deepl(args.auth_key, [InputFile(file_path)], args.src_lang, args.tgt_lang,
+                                           args.is_pro, progress=no_progress)
+        return [result[1]]
+    return translate
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "transcribe":
+            file_paths = collect_inputs(args.inputs, args.manifest, AUDIO_EXTENSIONS)
+        else:
+            file_paths = collect_inputs(args.inputs, args.manifest, SUBTITLE_FILE_EXTENSIONS)
+    except (FileNotFoundError, OSError) as e:
+        parser.error(str(e))
+    if not file_paths:
+        parser.error("No input files were found")
+    if args.command == "translate_deepl" and not args.auth_key:
+        parser.error("--auth_key or the DEEPL_AUTH_KEY environment variable is required")
+
+    started_at = datetime.now()
+    start_time = time.time()
+    translation_memory = None
+    if args.command == "transcribe":
+        process_fn = build_transcribe_fn(args)
+    else:
+        if not args.disable_translation_memory:
+            from modules.translation_memory import TranslationMemory
+            translation_memory = TranslationMemory()
+        if args.command == "translate_nllb":
+            process_fn = build_translate_nllb_fn(args, translation_memory)
+        else:
+            process_fn = build_translate_deepl_fn(args, translation_memory)
+
+    job_params = {"command": args.command, **{name: getattr(args, name) for name in JOB_PARAMS[args.command]}}
+    ledger = JobLedger(args.ledger)
+    files = run_jobs(file_paths, process_fn, job_params, ledger, args.concurrency)
+
+    counts = {status: sum(file["status"] == status for file in files) for status in ("done", "skipped", "failed")}
+    summary = {
+        "command": args.command,
+        "params": job_params,
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "wall_time": time.time() - start_time,
+        "counts": counts,
+        "files": files,
+    }
+    if translation_memory is not None:
+        summary["translation_memory"] = translation_memory.stats()
+    summary_json = json.dumps(summary, ensure_ascii=False, indent=2)
+    if args.summary:
+        os.makedirs(os.path.dirname(os.path.abspath(args.summary)), exist_ok=True)
+        with open(args.summary, "w", encoding="utf-8") as f:
+            f.write(summary_json)
+        print(f"Summary is written to {args.summary}")
+    else:
+        print(summary_json)
+    print(f"Done: {counts['done']}, skipped: {counts['skipped']}, failed: {counts['failed']}")
+    return 1 if counts["failed"] else 0
+
+
+# Create the parser for command-line arguments
+parser = argparse.ArgumentParser(description='不启动Gradio界面，批量转录或翻译目录或清单中的文件。')
+common_parser = argparse.ArgumentParser(add_help=False)
+common_parser.add_argument('inputs', nargs='*', help='要处理的文件或目录，目录中的文件按扩展名递归收集')
+common_parser.add_argument('--manifest', type=str, default=None, help='每行一个文件路径的清单文件，相对路径相对于清单所在目录，#开头的行被忽略')
+common_parser.add_argument('--output_dir', type=str, default='outputs', help='输出目录，翻译结果写入其中的translations子目录')
+common_parser.add_argument('--concurrency', type=int, default=1, help='同时处理的文件数')
+common_parser.add_argument('--ledger', type=str, default=DEFAULT_LEDGER_PATH, help='任务记录文件(JSON Lines)。已完成且输出文件仍存在的文件在重新运行时跳过')
+common_parser.add_argument('--summary', type=str, default=None, help='将JSON汇总写入该文件，不设置则输出到标准输出')
+subparsers = parser.add_subparsers(dest='command', required=True)
+
+transcribe_parser = subparsers.add_parser('transcribe', parents=[common_parser], help='转录音频或视频文件为字幕文件')
+transcribe_parser.add_argument('--engine', type=str, default='faster-whisper', choices=['faster-whisper', 'whisper'], help='Whisper实现')
+transcribe_parser.add_argument('--model_size', type=str, default='large-v3', help='模型')
+transcribe_parser.add_argument('--lang', type=str, default='Automatic Detection', help='语言，例如english。默认自动检测')
+transcribe_parser.add_argument('--file_format', type=str, default='SRT', choices=['SRT', 'WebVTT', 'txt'], help='文件格式')
+transcribe_parser.add_argument('--translate', type=bool, default=False, nargs='?', const=True, help='翻译成英语')
+transcribe_parser.add_argument('--add_timestamp', type=bool, default=False, nargs='?', const=True, help='在文件名末尾添加时间戳')
+transcribe_parser.add_argument('--beam_size', type=int, default=1, help='Beam大小')
+transcribe_parser.add_argument('--log_prob_threshold', type=float, default=-1.0, help='对数概率阈值')
+transcribe_parser.add_argument('--no_speech_threshold', type=float, default=0.6, help='无语音阈值')
+transcribe_parser.add_argument('--compute_type', type=str, default=None, help='计算类型，默认按设备选择')
+transcribe_parser.add_argument('--vad_filter', type=bool, default=False, nargs='?', const=True, help='启用VAD过滤静音')
+transcribe_parser.add_argument('--vad_threshold', type=float, default=0.5, help='VAD语音阈值')
+transcribe_parser.add_argument('--vad_min_silence_duration_ms', type=int, default=2000, help='最短静音时长(毫秒)')
+transcribe_parser.add_argument('--word_timestamps', type=bool, default=False, nargs='?', const=True, help='提取单词级时间戳')
+transcribe_parser.add_argument('--model_memory_budget', type=float, default=8.0, help='已加载Whisper模型的内存预算(GB)')
+transcribe_parser.add_argument('--worker_processes', type=int, default=0, help='faster_whisper转录工作进程数。0表示在主进程中转录')
+transcribe_parser.add_argument('--transcription_cache_size', type=float, default=512, help='转录结果缓存的大小上限(MB)。0表示禁用')
+transcribe_parser.add_argument('--audio_cache_size', type=float, default=2048, help='解码音频缓存的大小上限(MB)。0表示禁用')
+transcribe_parser.add_argument('--cpu_threads', type=int, default=0, help='faster_whisper每个模型副本的CPU线程数(CTranslate2 intra_threads)。0表示使用为本机调优的值')
+transcribe_parser.add_argument('--num_workers', type=int, default=0, help='faster_whisper模型副本数(CTranslate2 inter_threads)。0表示使用为本机调优的值')
+transcribe_parser.add_argument('--parallel_chunk_length', type=float, default=0, help='faster_whisper长音频并行转录的分块长度(秒)。0表示禁用')
+
+nllb_parser = subparsers.add_parser('translate_nllb', parents=[common_parser], help='用NLLB翻译字幕文件')
+nllb_parser.add_argument('--model_size', type=str, default='facebook/nllb-200-1.3B', help='模型')
+nllb_parser.add_argument('--src_lang', type=str, required=True, help='源语言，例如English')
+nllb_parser.add_argument('--tgt_lang', type=str, required=True, help='目标语言')
+nllb_parser.add_argument('--add_timestamp', type=bool, default=False, nargs='?', const=True, help='在文件名末尾添加时间戳')
+nllb_parser.add_argument('--batch_size', type=int, default=16, help='批大小')
+nllb_parser.add_argument('--backend', type=str, default='transformers', choices=['transformers', 'ctranslate2'], help='推理后端')
+nllb_parser.add_argument('--compute_type', type=str, default='int8', help='计算类型 (仅ctranslate2)')
+nllb_parser.add_argument('--disable_translation_memory', type=bool, default=False, nargs='?', const=True, help='禁用翻译记忆库')
+
+deepl_parser = subparsers.add_parser('translate_deepl', parents=[common_parser], help='用DeepL API翻译字幕文件')
+deepl_parser.add_argument('--auth_key', type=str, default=os.environ.get('DEEPL_AUTH_KEY'), help='DeepL Auth Key，默认读取DEEPL_AUTH_KEY环境变量')
+deepl_parser.add_argument('--src_lang', type=str, default='Automatic Detection', help='源语言')
+deepl_parser.add_argument('--tgt_lang', type=str, default='English', help='目标语言')
+deepl_parser.add_argument('--is_pro', type=bool, default=False, nargs='?', const=True, help='专业版用户')
+deepl_parser.add_argument('--disable_translation_memory', type=bool, default=False, nargs='?', const=True, help='禁用翻译记忆库')
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+import os
+import time
+import threading
+import subprocess
+import numpy as np
+from typing import NamedTuple, Optional
+
+from modules.transcription_cache import hash_file
+from modules.vad import SAMPLING_RATE
+
+DEFAULT_AUDIO_CACHE_DIR = os.path.join("outputs", "cache", "audio")
+DEFAULT_MAX_AUDIO_CACHE_SIZE_MB = 2048
+BYTES_PER_SAMPLE = np.dtype(np.float32).itemsize
+
+
+def decode_audio_to_file(file_path: str, output_path: str, sampling_rate: int = SAMPLING_RATE):
+    """Decodes any format ffmpeg reads into raw mono float32 PCM, written straight to `output_path` by ffmpeg"""
+    cmd = [
+        "ffmpeg", "-nostdin", "-y",
+        "-threads", "0",
+        "-loglevel", "error",
+        "-i", file_path,
+        "-f", "f32le",
+        "-ac", "1",
+        "-ar", str(sampling_rate),
+        output_path
+    ]
+    try:
+        subprocess.run(cmd, capture_output=True, check=True)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to load audio: {e.stderr.decode()}") from e
+
+
+def open_pcm(path: str, start: int = 0, length: Optional[int] = None) -> np.ndarray:
+    """
+    Maps raw float32 PCM into memory. Pages are only read from disk when they are accessed, and
+    the copy-on-write mode lets libraries that write into their input do so without touching the file.
+    """
+    if length is None:
+        length = os.path.getsize(path) // BYTES_PER_SAMPLE - start
+    if length <= 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.memmap(path, dtype=np.float32, mode='c', offset=start * BYTES_PER_SAMPLE, shape=(length,))
+
+
+class PCMRef(NamedTuple):
+    """
+    Reference to a range of samples in the audio cache.
+    Worker processes receive this instead of the samples and map them from the same file.
+    """
+    path: str
+    start: int
+    length: int
+
+    def load(self) -> np.ndarray:
+        return open_pcm(self.path, self.start, self.length)
+
+
+def get_rss_mb() -> Optional[float]:
+    """Returns the current resident memory of this process in MB, or None where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def get_peak_rss_mb() -> Optional[float]:
+    """
+    Returns the peak resident memory of this process in MB since it started, not of a single job,
+    or None where `resource` is not available
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class AudioCache:
+    """
+    On-disk cache of decoded audio, keyed by the content hash of the input file.
+    Every input is decoded once with ffmpeg into 16kHz mono float32 PCM, which both Whisper implementations
+    consume through a memory map instead of decoding the file again. The least recently used
+    entries are removed when the cache exceeds `max_size_mb`, except the pinned ones, whose file a worker
+    process is yet to map from a PCMRef.
+    """
+    def __init__(self,
+                 cache_dir: str = DEFAULT_AUDIO_CACHE_DIR,
+                 max_size_mb: float = DEFAULT_MAX_AUDIO_CACHE_SIZE_MB):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.decode_time = 0.0
+        # Cache file -> number of users that need it to stay on disk
+        self._pins = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def load(self,
+             file_path: str,
+             pin: bool = False) -> np.ndarray:
+        """
+        Returns the samples of an audio file, decoding it only if it isn't in the cache yet.
+        With `pin`, the cache file isn't evicted until `unpin(samples.filename)` is called.
+        Empty audios aren't mapped from the file, so they aren't pinned.
+        """
+        path = self.get_path(file_path)
+        # The file is pinned under the same lock as `evict` takes, so it can't be removed before it is mapped
+        with self._lock:
+            hit = os.path.exists(path)
+            if hit:
+                self.hits += 1
+                self._pins[path] = self._pins.get(path, 0) + 1
+        if hit:
+            os.utime(path)
+            return self._open_pinned(path, pin)
+
+        start_time = time.time()
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        decode_audio_to_file(file_path, tmp_path)
+        with self._lock:
+            os.replace(tmp_path, path)
+            self.misses += 1
+            self.decode_time += time.time() - start_time
+            self._pins[path] = self._pins.get(path, 0) + 1
+        self.evict()
+        return self._open_pinned(path, pin)
+
+    def _open_pinned(self,
+                     path: str,
+                     pin: bool) -> np.ndarray:
+        """Maps the cache file `path`, which `load` pinned, and keeps it pinned only if `pin` and it is mapped"""
+        try:
+            samples = open_pcm(path)
+        except BaseException:
+            self.unpin(path)
+            raise
+        if not pin or not isinstance(samples, np.memmap):
+            self.unpin(path)
+        return samples
+
+    def unpin(self, path: str):
+        """Lets the cache file of `path` be evicted again once every user that pinned it has unpinned it"""
+        with self._lock:
+            count = self._pins.get(path, 0) - 1
+            if count > 0:
+                self._pins[path] = count
+            else:
+                self._pins.pop(path, None)
+
+    def get_path(self, file_path: str) -> str:
+        return os.path.join(self.cache_dir, f"{hash_file(file_path)}.f32")
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(".f32"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total_size = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total_size <= self.max_size_bytes:
+                    break
+                if path in self._pins:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    # Already removed, or still mapped on Windows
+                    continue
+                total_size -= size
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "decode_time": self.decode_time,
+        }
+
+    def format_stats(self) -> str:
+        stats = self.stats()
+        return (f"Audio cache hits: {stats['hits']}, misses: {stats['misses']}, "
+                f"total decode time: {stats['decode_time']:.1f}s")
@@ -0,0 +1,78 @@
+import numpy as np
+from typing import List, Tuple
+
+from modules.vad import SAMPLING_RATE
+from modules.lazy import lazy_import
+
+faster_whisper = lazy_import("faster_whisper")
+
+# Silences this long are candidate cut points between chunks
+SPLIT_MIN_SILENCE_DURATION_MS = 500
+
+
+def plan_chunks(num_samples: int,
+                speech_chunks: List[dict],
+                chunk_samples: int) -> List[Tuple[int, int]]:
+    """
+    Plans the (start, end) sample ranges of the chunks of an audio.
+    Audio is only cut in the middle of the silences between `speech_chunks`, and every cut is placed
+    as late as possible while keeping the chunk under `chunk_samples`. A chunk may be longer than that
+    if there is no silence to cut at.
+    """
+    cuts = [(previous["end"] + current["start"]) // 2 for previous, current in zip(speech_chunks, speech_chunks[1:])]
+    cuts.append(num_samples)
+
+    ranges = []
+    start = 0
+    last_cut = None
+    for cut in cuts:
+        if cut - start > chunk_samples and last_cut is not None and last_cut > start:
+            ranges.append((start, last_cut))
+            start = last_cut
+        last_cut = cut
+    ranges.append((start, num_samples))
+    return ranges
+
+
+def split_audio(audio: np.ndarray,
+                chunk_length: float,
+                vad_threshold: float) -> List[Tuple[float, np.ndarray]]:
+    """
+    Splits a 16kHz audio into chunks of about `chunk_length` seconds at the silences found by the VAD.
+
+    Returns
+    ----------
+    A list of (offset, chunk), where offset is the start of the chunk in seconds
+    """
+    chunk_samples = int(chunk_length * SAMPLING_RATE)
+    if len(audio) <= chunk_samples:
+        return [(0.0, audio)]
+
+    vad_options = faster_whisper.vad.VadOptions(threshold=vad_threshold,
+                                                min_silence_duration_ms=SPLIT_MIN_SILENCE_DURATION_MS,
+                                                max_speech_duration_s=chunk_length)
+    speech_chunks = faster_whisper.vad.get_speech_timestamps(audio, vad_options)
+    return [(start / SAMPLING_RATE, audio[start:end])
+            for start, end in plan_chunks(len(audio), speech_chunks, chunk_samples)]
+
+
+def stitch_segments(chunk_segments: List[Tuple[float, List[dict]]]) -> List[dict]:
+    """
+    Joins the segments of consecutive chunks into one list on the timeline of the whole audio.
+    A segment that overlaps the previous one at a seam is dropped if it repeats its text,
+    otherwise it is moved to start where the previous one ends.
+    """
+    stitched = []
+    for offset, segments in chunk_segments:
+        for segment in segments:
+            segment = dict(segment, start=segment["start"] + offset, end=segment["end"] + offset)
+            if "words" in segment:
+                segment["words"] = segment["words"].shift(offset)
+            if stitched and segment["start"] < stitched[-1]["end"]:
+                previous = stitched[-1]
+                if segment["text"].strip() == previous["text"].strip():
+                    continue
+                segment["start"] = previous["end"]
+                segment["end"] = max(segment["end"], segment["start"])
+            stitched.append(segment)
+    return stitched
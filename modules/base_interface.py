@@ -1,11 +1,99 @@
 import os
-import torch
-from typing import List
+import time
+import numpy as np
+from typing import List, Optional
+
+from modules.transcription_cache import hash_audio
+from modules.vad import format_vad_stats, SAMPLING_RATE, DEFAULT_VAD_THRESHOLD, DEFAULT_MIN_SILENCE_DURATION_MS
+from modules.job_timings import JobTimings, format_timings, format_memory_stats
+from modules.metrics import REGISTRY
+from modules.progress import no_progress
+from modules.lazy import lazy_import
+from modules.subtitle_manager import OutputConfig
+
+torch = lazy_import("torch")
+
+# Length in seconds of the clip decoded to warm up a preloaded model
+WARMUP_AUDIO_LENGTH = 1.0
+# The language is given so the warm-up doesn't depend on what is detected in noise
+WARMUP_DECODE_PARAMS = dict(
+    lang="english",
+    istranslate=False,
+    beam_size=1,
+    log_prob_threshold=None,
+    no_speech_threshold=None,
+    vad_filter=False,
+    vad_threshold=DEFAULT_VAD_THRESHOLD,
+    vad_min_silence_duration_ms=DEFAULT_MIN_SILENCE_DURATION_MS,
+    word_timestamps=False,
+)
+
+
+def make_warmup_audio(length: float = WARMUP_AUDIO_LENGTH) -> np.ndarray:
+    """Returns `length` seconds of quiet noise. Unlike silence, it makes the decoder run as it does on speech."""
+    rng = np.random.default_rng(0)
+    return (rng.standard_normal(int(length * SAMPLING_RATE)) * 0.01).astype(np.float32)
 
 
 class BaseInterface:
-    def __init__(self):
-        pass
+    def __init__(self, output_config: Optional[OutputConfig] = None):
+        self.transcription_cache = None
+        self.audio_cache = None
+        self.output_config = output_config or OutputConfig()
+
+    def get_cache_key(self, audio, **decode_params) -> Optional[str]:
+        """Returns the transcription cache key of the audio, or None if the result can't be cached"""
+        if self.transcription_cache is None:
+            return None
+        audio_hash = hash_audio(audio)
+        if audio_hash is None:
+            return None
+        return self.transcription_cache.make_key(audio_hash, engine=type(self).__name__, **decode_params)
+
+    def load_audio(self,
+                   audio,
+                   transcription_info: Optional[dict] = None,
+                   pin: bool = False):
+        """
+        Returns the samples of an audio path from `self.audio_cache`, decoding the file only on its first use.
+        Audios that aren't paths, and every audio if there is no audio cache, are returned as they are.
+        The time it took is stored as "decode_time" of `transcription_info`.
+        With `pin`, the cache file stays on disk until `self.audio_cache.unpin(samples.filename)`.
+        """
+        if self.audio_cache is None or not isinstance(audio, str):
+            return audio
+        start_time = time.time()
+        samples = self.audio_cache.load(audio, pin=pin)
+        if transcription_info is not None:
+            transcription_info["decode_time"] = time.time() - start_time
+        return samples
+
+    def format_job_stats(self,
+                         transcription_infos: List[dict],
+                         timings: Optional[JobTimings] = None) -> str:
+        """
+        Prints and returns the stats of a job for gr.Textbox(), one line each: the stage timings,
+        real-time factor and tokens/s, the VAD stats, the audio ingest stats and the memory of the process.
+        The timings are also written as a JSON sidecar to `self.output_config.timings_dir` and recorded in the metrics.
+        """
+        job_stats = []
+        summary = None
+        if timings is not None:
+            summary = timings.summarize(transcription_infos)
+            job_stats.append(format_timings(summary))
+            REGISTRY.observe_job(summary)
+            print(f"Timings are written to {timings.write_sidecar(summary, timings_dir=self.output_config.timings_dir)}")
+        job_stats.append(format_vad_stats(transcription_infos))
+        decode_time = sum(info.get("decode_time", 0.0) for info in transcription_infos if info)
+        if self.audio_cache is not None:
+            job_stats.append(f"Audio decoded in {decode_time:.1f}s.")
+            print(self.audio_cache.format_stats())
+        job_stats.append(format_memory_stats(summary))
+
+        job_stats = "".join(f"{line}\n" for line in job_stats if line)
+        if job_stats:
+            print(job_stats, end="")
+        return job_stats
 
     @staticmethod
     def release_cuda_memory():
@@ -13,6 +101,9 @@ class BaseInterface:
             torch.cuda.empty_cache()
             torch.cuda.reset_max_memory_allocated()
 
+    # Progress callback for work that reports its progress elsewhere
+    no_progress = staticmethod(no_progress)
+
     @staticmethod
     def remove_input_files(file_paths: List[str]):
         if not file_paths:
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional, TYPE_CHECKING
+
+import numpy as np
+
+from modules.base_interface import make_warmup_audio, WARMUP_DECODE_PARAMS
+from modules.progress import no_progress
+from modules.vad import SAMPLING_RATE
+
+if TYPE_CHECKING:
+    from modules.faster_whisper_inference import FasterWhisperInference
+
+DEFAULT_TUNING_PATH = os.path.join("models", "ct2_tuning.json")
+# Length in seconds of the clip every thread configuration transcribes
+DEFAULT_TUNING_AUDIO_LENGTH = 10.0
+
+
+class CT2Settings(NamedTuple):
+    """Threads of a CTranslate2 model: `cpu_threads` per model replica (intra_threads) and `num_workers` replicas (inter_threads)"""
+    cpu_threads: int
+    num_workers: int
+
+
+def get_host_key(device: str) -> str:
+    """Tuned settings are only reused on the same device with the same number of cores"""
+    return f"{device}-{os.cpu_count() or 1}cores"
+
+
+def get_candidates(cpu_count: Optional[int] = None) -> List[CT2Settings]:
+    """Returns the thread configurations worth trying: 1, 2, 4 and 8 replicas, with all or half of the cores split between them"""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    candidates = []
+    for num_workers in (1, 2, 4, 8):
+        if num_workers > cpu_count:
+            break
+        for cpu_threads in sorted({cpu_count // num_workers, max(1, cpu_count // (2 * num_workers))}, reverse=True):
+            candidates.append(CT2Settings(cpu_threads=cpu_threads, num_workers=num_workers))
+    return candidates
+
+
+def load_tuned_settings(device: str,
+                        path: str = DEFAULT_TUNING_PATH) -> Optional[CT2Settings]:
+    """Returns the settings `autotune` found for this host, or None if it wasn't tuned"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            tuning = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error reading the CTranslate2 tuning {path}: {e}")
+        return None
+    entry = tuning.get(get_host_key(device))
+    if entry is None:
+        return None
+    return CT2Settings(cpu_threads=entry["cpu_threads"], num_workers=entry["num_workers"])
+
+
+def autotune(engine: "FasterWhisperInference",
+             model_size: str,
+             compute_type: Optional[str] = None,
+             audio: Optional[np.ndarray] = None,
+             candidates: Optional[List[CT2Settings]] = None,
+             path: str = DEFAULT_TUNING_PATH) -> CT2Settings:
+    """
+    Benchmark the transcription of a short clip with every thread configuration, set the fastest one on
+    `engine` and write it to `path`, where FasterWhisperInference reads it from on this host.
+
+    Parameters
+    ----------
+    engine: FasterWhisperInference
+        Engine that loads the models. The models loaded for the benchmark are removed from its model pool.
+    model_size: str
+        Whisper model to benchmark with. The fastest threads hardly depend on it, so a small one saves time.
+    compute_type: Optional[str]
+        Compute type of the model. Defaults to the one of the device.
+    audio: Optional[np.ndarray]
+        16kHz clip to transcribe. Defaults to DEFAULT_TUNING_AUDIO_LENGTH seconds of quiet noise.
+    candidates: Optional[List[CT2Settings]]
+        Thread configurations to try. Defaults to `get_candidates()`.
+    path: str
+        JSON file the result is written to, next to the results of other hosts.
+
+    Returns
+    ----------
+    settings: CT2Settings
+        The configuration with the highest throughput
+    """
+    compute_type = compute_type or engine.current_compute_type
+    audio = make_warmup_audio(DEFAULT_TUNING_AUDIO_LENGTH) if audio is None else audio
+    audio_length = len(audio) / SAMPLING_RATE
+    if candidates is None:
+        candidates = get_candidates()
+        if engine.device == "cuda":
+            # Every replica holds its own copy of the model in GPU memory
+            candidates = [settings for settings in candidates if settings.num_workers == 1]
+
+    def transcribe(_):
+        return engine.transcribe(audio=audio, progress=no_progress, **WARMUP_DECODE_PARAMS)
+
+    results = []
+    for settings in candidates:
+        engine.set_ct2_threads(cpu_threads=settings.cpu_threads, num_workers=settings.num_workers)
+        engine.preload_model(model_size=model_size, compute_type=compute_type)
+        # Every replica transcribes a clip at once, so the throughput counts the files transcribed in parallel
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=settings.num_workers) as executor:
+            list(executor.map(transcribe, range(settings.num_workers)))
+        elapsed_time = time.time() - start_time
+        throughput = settings.num_workers * audio_length / elapsed_time
+        results.append({**settings._asdict(), "elapsed_time": elapsed_time, "throughput": throughput})
+        print(f"cpu_threads={settings.cpu_threads}, num_workers={settings.num_workers}: "
+              f"{throughput:.1f} audio seconds per second")
+        # The engine keeps a reference to the last model too, which would keep it in memory next to the next one
+        engine.model_pool.clear()
+        engine.model = None
+        engine.current_model_size = None
+
+    best = max(results, key=lambda result: result["throughput"])
+    settings = CT2Settings(cpu_threads=best["cpu_threads"], num_workers=best["num_workers"])
+    engine.set_ct2_threads(cpu_threads=settings.cpu_threads, num_workers=settings.num_workers)
+
+    tuning = {}
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                tuning = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            tuning = {}
+    tuning[get_host_key(engine.device)] = {
+        **settings._asdict(),
+        "model_size": model_size,
+        "compute_type": compute_type,
+        "audio_length": audio_length,
+        "tuned_at": datetime.now().isoformat(timespec="seconds"),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(tuning, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    print(f"Fastest CTranslate2 threads: cpu_threads={settings.cpu_threads}, num_workers={settings.num_workers}, "
+          f"written to {path}")
+    return settings
@@ -1,10 +1,19 @@
-import requests
 import time
 import os
+import re
+import random
+import threading
+from urllib.parse import quote_plus
 from datetime import datetime
-import gradio as gr
+from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from modules.subtitle_manager import *
+from modules.translation_memory import TranslationMemory
+from modules.progress import ProgressCallback, default_progress
+from modules.lazy import lazy_import
+
+requests = lazy_import("requests")
 
 """
 This is written with reference to the DeepL API documentation.
@@ -81,12 +90,117 @@ DEEPL_AVAILABLE_SOURCE_LANGS = {
 }
 
 
+DEEPL_FREE_API_URL = 'https://api-free.deepl.com/v2/translate'
+DEEPL_PRO_API_URL = 'https://api.deepl.com/v2/translate'
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# DeepL rejects requests larger than 128 KiB, keep a margin for the other form fields and headers
+DEFAULT_MAX_BATCH_BYTES = 120 * 1024
+
+
+def get_request_size(text: str) -> int:
+    """Returns the number of bytes `text` adds to the url-encoded form body of a request"""
+    return len(quote_plus(text)) + len("text=&")
+
+
+def split_text(text: str, max_bytes: int) -> List[str]:
+    """
+    Splits text that doesn't fit in one request at whitespace, or anywhere if a single word is too long,
+    e.g. in Chinese, Japanese or Thai that aren't written with spaces. Every piece keeps the whitespace it was
+    split at, so that "".join(pieces) == text.
+    """
+    pieces = []
+    current = ''
+    for word in re.findall(r'\S+\s*', text) or [text]:
+        if get_request_size(current + word) <= max_bytes:
+            current += word
+            continue
+        if current:
+            pieces.append(current)
+            current = ''
+        while get_request_size(word) > max_bytes:
+            cut = len(word)
+            while cut > 1 and get_request_size(word[:cut]) > max_bytes:
+                cut //= 2
+            pieces.append(word[:cut])
+            word = word[cut:]
+        current = word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def plan_batches(texts: List[str],
+                 max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+                 max_batch_size: int = 50) -> List[List[Tuple[int, str]]]:
+    """
+    Pack texts into as few requests as possible, keeping their order.
+    A batch is a list of (text index, text), holding at most `max_batch_size` texts and `max_batch_bytes`
+    of request body. Texts larger than `max_batch_bytes` are split into several consecutive pieces
+    with the same index, whose translations are joined back together.
+    """
+    batches = []
+    batch = []
+    batch_bytes = 0
+    for index, text in enumerate(texts):
+        pieces = [text] if get_request_size(text) <= max_batch_bytes else split_text(text, max_batch_bytes)
+        for piece in pieces:
+            piece_bytes = get_request_size(piece)
+            if batch and (len(batch) >= max_batch_size or batch_bytes + piece_bytes > max_batch_bytes):
+                batches.append(batch)
+                batch = []
+                batch_bytes = 0
+            batch.append((index, piece))
+            batch_bytes += piece_bytes
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class TokenBucket:
+    """Rate limiter that allows `rate` requests per second on average, with bursts of up to `capacity`"""
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+
 class DeepLAPI:
-    def __init__(self):
-        self.api_interval = 1
+    def __init__(self,
+                 api_url: Optional[str] = None,
+                 translation_memory: Optional[TranslationMemory] = None,
+                 output_config: Optional[OutputConfig] = None):
         self.max_text_batch_size = 50
+        self.max_batch_bytes = DEFAULT_MAX_BATCH_BYTES
+        self.max_concurrent_requests = 4
+        self.requests_per_second = 5
+        self.max_retries = 5
+        self.retry_backoff = 1
+        self.request_timeout = 60
+        # Overrides the free/pro endpoint, e.g. to run against a local stub server
+        self.api_url = api_url
         self.available_target_langs = DEEPL_AVAILABLE_TARGET_LANGS
         self.available_source_langs = DEEPL_AVAILABLE_SOURCE_LANGS
+        self.translation_memory = translation_memory
+        self.output_config = output_config or OutputConfig()
+        self.rate_limiter = TokenBucket(rate=self.requests_per_second, capacity=self.max_concurrent_requests)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrent_requests)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
 
     def translate_deepl(self,
                         auth_key: str,
@@ -94,7 +208,7 @@ class DeepLAPI:
                         source_lang: str,
                         target_lang: str,
                         is_pro: bool,
-                        progress=gr.Progress()) -> list:
+                        progress=default_progress()) -> list:
         """
         Translate subtitle files using DeepL API
         Parameters
@@ -119,48 +233,33 @@ class DeepLAPI:
         """
 
         files_info = {}
+        memory_hits = 0
         for fileobj in fileobjs:
             file_path = fileobj.name
             file_name, file_ext = os.path.splitext(os.path.basename(fileobj.name))
 
             if file_ext == ".srt":
                 parsed_dicts = parse_srt(file_path=file_path)
-
-                batch_size = self.max_text_batch_size
-                for batch_start in range(0, len(parsed_dicts), batch_size):
-                    batch_end = min(batch_start + batch_size, len(parsed_dicts))
-                    sentences_to_translate = [dic["sentence"] for dic in parsed_dicts[batch_start:batch_end]]
-                    translated_texts = self.request_deepl_translate(auth_key, sentences_to_translate, source_lang,
-                                                                    target_lang, is_pro)
-                    for i, translated_text in enumerate(translated_texts):
-                        parsed_dicts[batch_start + i]["sentence"] = translated_text["text"]
-                    progress(batch_end / len(parsed_dicts), desc="Translating..")
+                memory_hits += self.translate_dicts(auth_key, parsed_dicts, source_lang, target_lang, is_pro,
+                                                    progress)
 
                 subtitle = get_serialized_srt(parsed_dicts)
                 timestamp = datetime.now().strftime("%m%d%H%M%S")
 
-                file_name = file_name[:-9]
-                output_path = os.path.join("outputs", "translations", f"{file_name}-{timestamp}.srt")
+                output_path = os.path.join(self.output_config.translations_dir,
+                                           self.output_config.safe_filename(f"{file_name}-{timestamp}.srt"))
                 write_file(subtitle, output_path)
 
             elif file_ext == ".vtt":
                 parsed_dicts = parse_vtt(file_path=file_path)
-
-                batch_size = self.max_text_batch_size
-                for batch_start in range(0, len(parsed_dicts), batch_size):
-                    batch_end = min(batch_start + batch_size, len(parsed_dicts))
-                    sentences_to_translate = [dic["sentence"] for dic in parsed_dicts[batch_start:batch_end]]
-                    translated_texts = self.request_deepl_translate(auth_key, sentences_to_translate, source_lang,
-                                                                    target_lang, is_pro)
-                    for i, translated_text in enumerate(translated_texts):
-                        parsed_dicts[batch_start + i]["sentence"] = translated_text["text"]
-                    progress(batch_end / len(parsed_dicts), desc="Translating..")
+                memory_hits += self.translate_dicts(auth_key, parsed_dicts, source_lang, target_lang, is_pro,
+                                                    progress)
 
                 subtitle = get_serialized_vtt(parsed_dicts)
                 timestamp = datetime.now().strftime("%m%d%H%M%S")
 
-                file_name = file_name[:-9]
-                output_path = os.path.join("outputs", "translations", f"{file_name}-{timestamp}.vtt")
+                output_path = os.path.join(self.output_config.translations_dir,
+                                           self.output_config.safe_filename(f"{file_name}-{timestamp}.vtt"))
 
                 write_file(subtitle, output_path)
 
@@ -172,17 +271,97 @@ class DeepLAPI:
             total_result += f'{subtitle}'
 
         gr_str = f"Done! Subtitle is in the outputs/translation folder.\n\n{total_result}"
+        if self.translation_memory is not None:
+            print(self.translation_memory.format_stats())
+            gr_str = f"{memory_hits} lines were found in the translation memory. {gr_str}"
         return [gr_str, output_path]
 
+    def translate_dicts(self,
+                        auth_key: str,
+                        parsed_dicts: List[dict],
+                        source_lang: str,
+                        target_lang: str,
+                        is_pro: bool,
+                        progress: ProgressCallback) -> int:
+        """
+        Translate the "sentence" of every parsed subtitle dict in place.
+        Sentences already in `self.translation_memory` are not sent to DeepL.
+        Returns the number of translation memory hits.
+        """
+        sentences = [dic["sentence"] for dic in parsed_dicts]
+
+        def translate_fn(texts):
+            return self.translate_texts(auth_key, texts, source_lang, target_lang, is_pro, progress)
+
+        if self.translation_memory is not None:
+            translated_texts, hits = self.translation_memory.translate(sentences,
+                                                                       translate_fn=translate_fn,
+                                                                       engine="deepl",
+                                                                       model="v2",
+                                                                       src_lang=source_lang,
+                                                                       tgt_lang=target_lang)
+        else:
+            translated_texts, hits = translate_fn(sentences), 0
+
+        for dic, translated_text in zip(parsed_dicts, translated_texts):
+            dic["sentence"] = translated_text
+        return hits
+
+    def translate_texts(self,
+                        auth_key: str,
+                        texts: List[str],
+                        source_lang: str,
+                        target_lang: str,
+                        is_pro: bool,
+                        progress: ProgressCallback) -> List[str]:
+        """
+        Translate texts and return the translations in the same order.
+        Texts are packed into requests by `plan_batches` with the `self.max_batch_bytes` and
+        `self.max_text_batch_size` limits. Batches are sent concurrently, with at most
+        `self.max_concurrent_requests` requests in flight.
+        """
+        batches = plan_batches(texts,
+                               max_batch_bytes=self.max_batch_bytes,
+                               max_batch_size=self.max_text_batch_size)
+        translated_pieces = [[] for _ in texts]
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_requests) as executor:
+            futures = {}
+            for batch_index, batch in enumerate(batches):
+                sentences_to_translate = [piece for _, piece in batch]
+                future = executor.submit(self.request_deepl_translate, auth_key, sentences_to_translate,
+                                         source_lang, target_lang, is_pro)
+                futures[future] = batch_index
+
+            batch_results = [None] * len(batches)
+            for done, future in enumerate(as_completed(futures), start=1):
+                batch_results[futures[future]] = future.result()
+                progress(done / len(futures), desc="Translating..")
+
+        # Pieces of a split text are in consecutive batches, so walk the batches in order to join them
+        for batch, translated_texts in zip(batches, batch_results):
+            for (index, piece), translated_text in zip(batch, translated_texts):
+                # Join with the whitespace the text was split at, which is none where it was cut inside a word
+                separator = piece[len(piece.rstrip()):]
+                translated = translated_text["text"]
+                if separator:
+                    translated = translated.rstrip() + separator
+                translated_pieces[index].append(translated)
+        return [''.join(pieces).strip() if len(pieces) > 1 else pieces[0] for pieces in translated_pieces]
+
     def request_deepl_translate(self,
                                 auth_key: str,
                                 text: list,
                                 source_lang: str,
                                 target_lang: str,
                                 is_pro: bool):
-        """Request API response to DeepL server"""
-
-        url = 'https://api.deepl.com/v2/translate' if is_pro else 'https://api-free.deepl.com/v2/translate'
+        """
+        Request API response to DeepL server.
+        Requests are rate limited by `self.rate_limiter` and retried with exponential backoff on 429 and 5xx.
+        """
+        if self.api_url:
+            url = self.api_url
+        else:
+            url = DEEPL_PRO_API_URL if is_pro else DEEPL_FREE_API_URL
         headers = {
             'Authorization': f'DeepL-Auth-Key {auth_key}'
         }
@@ -191,6 +370,19 @@ class DeepLAPI:
             'source_lang': DEEPL_AVAILABLE_SOURCE_LANGS[source_lang],
             'target_lang': DEEPL_AVAILABLE_TARGET_LANGS[target_lang]
         }
-        response = requests.post(url, headers=headers, data=data).json()
-        time.sleep(self.api_interval)
-        return response["translations"]
\ No newline at end of file
+
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            response = self.session.post(url, headers=headers, data=data, timeout=self.request_timeout)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                break
+            retry_after = response.headers.get('Retry-After')
+            if retry_after is not None and retry_after.isdigit():
+                wait_time = int(retry_after)
+            else:
+                wait_time = self.retry_backoff * 2 ** attempt + random.uniform(0, self.retry_backoff)
+            print(f"DeepL API returned {response.status_code}, retrying in {wait_time:.1f} seconds")
+            time.sleep(wait_time)
+
+        response.raise_for_status()
+        return response.json()["translations"]
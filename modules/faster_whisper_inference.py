@@ -2,24 +2,50 @@ import os
 
 import tqdm
 import time
+import threading
 import numpy as np
-from typing import BinaryIO, Union, Tuple, List
+from typing import BinaryIO, Union, Tuple, List, Optional, Iterator, Iterable, Callable, TYPE_CHECKING
 from datetime import datetime, timedelta
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-import faster_whisper
-import ctranslate2
-import whisper
-import torch
-import gradio as gr
-
-from .base_interface import BaseInterface
-from modules.subtitle_manager import get_srt, get_vtt, get_txt, write_file, safe_filename
+from .base_interface import BaseInterface, make_warmup_audio, WARMUP_DECODE_PARAMS
+from modules.model_pool import ModelPool, estimate_model_memory, DEFAULT_MEMORY_BUDGET_GB
+from modules.transcription_cache import TranscriptionCache, DEFAULT_MAX_CACHE_SIZE_MB
+from modules.audio_cache import AudioCache, PCMRef, DEFAULT_MAX_AUDIO_CACHE_SIZE_MB
+from modules.vad import SAMPLING_RATE, get_vad_options
+from modules.audio_chunking import split_audio, stitch_segments
+from modules.word_timestamps import WordTimestamps
+from modules.pipeline import prefetch, DEFAULT_PREFETCH_DEPTH
+from modules.job_timings import JobTimings
+from modules.ct2_tuning import load_tuned_settings
+from modules.progress import ProgressCallback, default_progress
+from modules.lazy import lazy_import
+from modules.subtitle_manager import get_srt, get_vtt, get_txt, write_file, OutputConfig, \
+    SubtitleStreamWriter, SUBTITLE_EXTENSIONS
 from modules.youtube_manager import get_ytdata, get_ytaudio
 
+if TYPE_CHECKING:
+    from modules.worker_pool import TranscriptionWorkerPool
+
+# Only needed once the engine is constructed or a model is loaded, so the app starts without them
+faster_whisper = lazy_import("faster_whisper")
+ctranslate2 = lazy_import("ctranslate2")
+whisper = lazy_import("whisper")
+torch = lazy_import("torch")
+
 
 class FasterWhisperInference(BaseInterface):
-    def __init__(self):
-        super().__init__()
+    def __init__(self,
+                 model_memory_budget_gb: float = DEFAULT_MEMORY_BUDGET_GB,
+                 transcription_cache_size_mb: float = DEFAULT_MAX_CACHE_SIZE_MB,
+                 audio_cache_size_mb: float = DEFAULT_MAX_AUDIO_CACHE_SIZE_MB,
+                 worker_pool: Optional["TranscriptionWorkerPool"] = None,
+                 parallel_chunk_length: float = 0,
+                 output_config: Optional[OutputConfig] = None,
+                 cpu_threads: int = 0,
+                 num_workers: int = 0):
+        super().__init__(output_config=output_config)
         self.current_model_size = None
         self.model = None
         self.available_models = whisper.available_models()
@@ -29,6 +55,29 @@ class FasterWhisperInference(BaseInterface):
         self.available_compute_types = ctranslate2.get_supported_compute_types("cuda") if self.device == "cuda" else ctranslate2.get_supported_compute_types("cpu")
         self.current_compute_type = "float16" if self.device == "cuda" else "float32"
         self.default_beam_size = 1
+        # Number of files transcribed at once. CTranslate2 keeps one model replica per worker, and 0 cpu_threads
+        # lets it pick the threads of each, which are faster-whisper's defaults. More workers only pay off on CPU
+        # where the cores are split between them, see benchmarks/batch_transcription.py and --autotune_threads.
+        self.num_workers = 1
+        self.cpu_threads = 0
+        # The threads tuned for this host replace the defaults, and the ones given replace both
+        tuned_settings = load_tuned_settings(self.device)
+        if tuned_settings is not None:
+            self.cpu_threads, self.num_workers = tuned_settings
+        self.set_ct2_threads(cpu_threads=cpu_threads, num_workers=num_workers)
+        self.model_pool = ModelPool(memory_budget_gb=model_memory_budget_gb)
+        # Held while `self.model` is switched and decoded with in this process
+        self.model_lock = threading.Lock()
+        # When set, transcriptions run in the worker processes of the pool instead of on `self.model`
+        self.worker_pool = worker_pool
+        # Audios longer than this many seconds are split at silences and their chunks decoded in parallel. 0 disables it
+        self.parallel_chunk_length = parallel_chunk_length
+        # Number of audios decoded ahead of the one being transcribed
+        self.prefetch_depth = DEFAULT_PREFETCH_DEPTH
+        if transcription_cache_size_mb > 0:
+            self.transcription_cache = TranscriptionCache(max_size_mb=transcription_cache_size_mb)
+        if audio_cache_size_mb > 0:
+            self.audio_cache = AudioCache(max_size_mb=audio_cache_size_mb)
 
     def transcribe_file(self,
                         fileobjs: list,
@@ -41,7 +90,11 @@ class FasterWhisperInference(BaseInterface):
                         log_prob_threshold: float,
                         no_speech_threshold: float,
                         compute_type: str,
-                        progress=gr.Progress()
+                        vad_filter: bool,
+                        vad_threshold: float,
+                        vad_min_silence_duration_ms: int,
+                        word_timestamps: bool,
+                        progress=default_progress()
                         ) -> list:
         """
         Write subtitle file from Files
@@ -73,6 +126,16 @@ class FasterWhisperInference(BaseInterface):
         compute_type: str
             compute type from gr.Dropdown().
             see more info : https://opennmt.net/CTranslate2/quantization.html
+        vad_filter: bool
+            Boolean value from gr.Checkbox() that determines whether to remove the non-speech regions
+            of the audio with the Silero VAD before decoding. Timestamps stay on the original timeline.
+        vad_threshold: float
+            float value from gr.Number(). Audio windows with a speech probability above this value are speech.
+        vad_min_silence_duration_ms: int
+            int value from gr.Number(). Silences shorter than this are kept as part of the speech.
+        word_timestamps: bool
+            Boolean value from gr.Checkbox() that determines whether to extract the timestamps of every word.
+            The words are kept in the "words" of the segments, and the cues are timed to their first and last word.
         progress: gr.Progress
             Indicator to show progress directly in gradio.
 
@@ -83,39 +146,62 @@ class FasterWhisperInference(BaseInterface):
         Files to return to gr.Files()
         """
         try:
-            self.update_model_if_needed(model_size=model_size, compute_type=compute_type, progress=progress)
+            start_time = time.time()
+            timings = JobTimings(engine=type(self).__name__, model_size=model_size, compute_type=compute_type)
+            # Subtitles are written in the background as soon as their file is transcribed
+            writer = ThreadPoolExecutor(max_workers=1)
+            write_futures = {}
 
-            files_info = {}
-            for fileobj in fileobjs:
-                transcribed_segments, time_for_task = self.transcribe(
-                    audio=fileobj.name,
-                    lang=lang,
-                    istranslate=istranslate,
-                    beam_size=beam_size,
-                    log_prob_threshold=log_prob_threshold,
-                    no_speech_threshold=no_speech_threshold,
-                    progress=progress
-                )
+            def write_file_timed(**kwargs):
+                with timings.stage("write"):
+                    return self.generate_and_write_file(**kwargs)
 
-                file_name, file_ext = os.path.splitext(os.path.basename(fileobj.name))
-                file_name = safe_filename(file_name)
-                subtitle, file_path = self.generate_and_write_file(
-                    file_name=file_name,
-                    transcribed_segments=transcribed_segments,
-                    add_timestamp=add_timestamp,
-                    file_format=file_format
-                )
+            def write_subtitle(index, result):
+                file_name, file_ext = os.path.splitext(os.path.basename(fileobjs[index].name))
+                file_name = self.output_config.safe_filename(file_name)
+                write_futures[index] = (file_name, writer.submit(write_file_timed,
+                                                                 file_name=file_name,
+                                                                 transcribed_segments=result[0],
+                                                                 add_timestamp=add_timestamp,
+                                                                 file_format=file_format))
+
+            batch_results = self.transcribe_batch(
+                audios=[fileobj.name for fileobj in fileobjs],
+                model_size=model_size,
+                compute_type=compute_type,
+                lang=lang,
+                istranslate=istranslate,
+                beam_size=beam_size,
+                log_prob_threshold=log_prob_threshold,
+                no_speech_threshold=no_speech_threshold,
+                vad_filter=vad_filter,
+                vad_threshold=vad_threshold,
+                vad_min_silence_duration_ms=vad_min_silence_duration_ms,
+                word_timestamps=word_timestamps,
+                progress=progress,
+                on_result=write_subtitle,
+                timings=timings
+            )
+            writer.shutdown(wait=True)
+
+            files_info = {}
+            for index, (transcribed_segments, time_for_task, _) in enumerate(batch_results):
+                file_name, write_future = write_futures[index]
+                subtitle, file_path = write_future.result()
                 files_info[file_name] = {"subtitle": subtitle, "time_for_task": time_for_task, "path":  file_path}
 
             total_result = ''
-            total_time = 0
             for file_name, info in files_info.items():
                 total_result += '------------------------------------\n'
                 total_result += f'{file_name}\n\n'
                 total_result += f'{info["subtitle"]}'
-                total_time += info["time_for_task"]
+            # Files overlap in time when they are batched, so report the wall time of the whole job
+            total_time = time.time() - start_time
+
+            job_stats = self.format_job_stats([transcription_info for _, _, transcription_info in batch_results],
+                                              timings=timings)
 
-            gr_str = f"Done in {self.format_time(total_time)}! Subtitle is in the outputs folder.\n\n{total_result}"
+            gr_str = f"Done in {self.format_time(total_time)}! {job_stats}Subtitle is in the outputs folder.\n\n{total_result}"
             gr_file_path = [info['path'] for info in files_info.values()]
 
             return [gr_str, gr_file_path]
@@ -127,6 +213,106 @@ class FasterWhisperInference(BaseInterface):
             if not fileobjs:
                 self.remove_input_files([fileobj.name for fileobj in fileobjs])
 
+    def transcribe_file_stream(self,
+                               fileobjs: list,
+                               model_size: str,
+                               lang: str,
+                               file_format: str,
+                               istranslate: bool,
+                               add_timestamp: bool,
+                               beam_size: int,
+                               log_prob_threshold: float,
+                               no_speech_threshold: float,
+                               compute_type: str,
+                               vad_filter: bool,
+                               vad_threshold: float,
+                               vad_min_silence_duration_ms: int,
+                               word_timestamps: bool,
+                               progress=default_progress()
+                               ) -> Iterator[list]:
+        """
+        Write subtitle file from Files, appending every cue to the file and to gr.Textbox() as soon as
+        its segment is decoded. The files are transcribed one after another on the model of this process,
+        even if a worker pool is set. `self.model_lock` is held from the model switch until the last file is decoded.
+
+        Parameters are the same as `transcribe_file`.
+
+        Yields
+        ----------
+        A List of
+        String to return to gr.Textbox()
+        Files to return to gr.Files()
+        """
+        try:
+            # The model of this process is shared with the other streams and, without a worker pool, every other
+            # transcription, so it can't be switched while one of them decodes
+            with self.model_lock:
+                start_time = time.time()
+                timings = JobTimings(engine=type(self).__name__, model_size=model_size, compute_type=compute_type)
+                with timings.stage("model_load"):
+                    self.update_model_if_needed(model_size=model_size, compute_type=compute_type, progress=progress)
+
+                total_result = ''
+                file_paths = []
+                transcription_infos = []
+                for fileobj in fileobjs:
+                    file_name, file_ext = os.path.splitext(os.path.basename(fileobj.name))
+                    file_name = self.output_config.safe_filename(file_name)
+                    output_path = self.get_output_path(file_name=file_name,
+                                                       add_timestamp=add_timestamp,
+                                                       file_format=file_format)
+                    file_paths.append(output_path)
+                    total_result += '------------------------------------\n'
+                    total_result += f'{file_name}\n\n'
+
+                    decode_params = dict(
+                        lang=lang,
+                        istranslate=istranslate,
+                        beam_size=beam_size,
+                        log_prob_threshold=log_prob_threshold,
+                        no_speech_threshold=no_speech_threshold,
+                        vad_filter=vad_filter,
+                        vad_threshold=vad_threshold,
+                        vad_min_silence_duration_ms=vad_min_silence_duration_ms,
+                        word_timestamps=word_timestamps,
+                    )
+                    cache_key = self.get_cache_key(fileobj.name, model_size=model_size, compute_type=compute_type,
+                                                   **decode_params)
+                    cached_segments = self.transcription_cache.get(cache_key) if cache_key is not None else None
+                    if cached_segments is not None:
+                        segments = iter(cached_segments)
+                    else:
+                        transcription_info = {}
+                        transcription_infos.append(transcription_info)
+                        audio = self.load_audio(fileobj.name, transcription_info)
+                        segments = self.transcribe_stream(audio=audio, progress=progress,
+                                                          transcription_info=transcription_info, **decode_params)
+
+                    cues = []
+                    transcribed_segments = []
+                    last_update = 0
+                    with SubtitleStreamWriter(output_path=output_path, file_format=file_format) as writer:
+                        for segment in segments:
+                            transcribed_segments.append(segment)
+                            with timings.stage("write"):
+                                cues.append(writer.write(segment))
+                            # Re-sending the whole text for every cue gets slow on long files, so update at most twice a second
+                            if time.time() - last_update > 0.5:
+                                last_update = time.time()
+                                yield [f"Transcribing {file_name}..\n\n{total_result}{''.join(cues)}", file_paths]
+                    total_result += ''.join(cues)
+                    if cache_key is not None and cached_segments is None:
+                        self.transcription_cache.put(cache_key, transcribed_segments)
+
+                job_stats = self.format_job_stats(transcription_infos, timings=timings)
+                gr_str = f"Done in {self.format_time(time.time() - start_time)}! {job_stats}Subtitle is in the outputs folder.\n\n{total_result}"
+                yield [gr_str, file_paths]
+
+        except Exception as e:
+            print(f"Error transcribing file on line {e}")
+        finally:
+            self.release_cuda_memory()
+
     def transcribe_youtube(self,
                            youtubelink: str,
                            model_size: str,
@@ -138,7 +324,11 @@ class FasterWhisperInference(BaseInterface):
                            log_prob_threshold: float,
                            no_speech_threshold: float,
                            compute_type: str,
-                           progress=gr.Progress()
+                           vad_filter: bool,
+                           vad_threshold: float,
+                           vad_min_silence_duration_ms: int,
+                           word_timestamps: bool,
+                           progress=default_progress()
                            ) -> list:
         """
         Write subtitle file from Youtube
@@ -170,6 +360,16 @@ class FasterWhisperInference(BaseInterface):
         compute_type: str
             compute type from gr.Dropdown().
             see more info : https://opennmt.net/CTranslate2/quantization.html
+        vad_filter: bool
+            Boolean value from gr.Checkbox() that determines whether to remove the non-speech regions
+            of the audio with the Silero VAD before decoding. Timestamps stay on the original timeline.
+        vad_threshold: float
+            float value from gr.Number(). Audio windows with a speech probability above this value are speech.
+        vad_min_silence_duration_ms: int
+            int value from gr.Number(). Silences shorter than this are kept as part of the speech.
+        word_timestamps: bool
+            Boolean value from gr.Checkbox() that determines whether to extract the timestamps of every word.
+            The words are kept in the "words" of the segments, and the cues are timed to their first and last word.
         progress: gr.Progress
             Indicator to show progress directly in gradio.
 
@@ -180,32 +380,40 @@ class FasterWhisperInference(BaseInterface):
         Files to return to gr.Files()
         """
         try:
-            self.update_model_if_needed(model_size=model_size, compute_type=compute_type, progress=progress)
-
+            timings = JobTimings(engine=type(self).__name__, model_size=model_size, compute_type=compute_type)
             progress(0, desc="Loading Audio from Youtube..")
             yt = get_ytdata(youtubelink)
             audio = get_ytaudio(yt)
 
-            transcribed_segments, time_for_task = self.transcribe(
-                audio=audio,
+            [(transcribed_segments, time_for_task, transcription_info)] = self.transcribe_batch(
+                audios=[audio],
+                model_size=model_size,
+                compute_type=compute_type,
                 lang=lang,
                 istranslate=istranslate,
                 beam_size=beam_size,
                 log_prob_threshold=log_prob_threshold,
                 no_speech_threshold=no_speech_threshold,
-                progress=progress
+                vad_filter=vad_filter,
+                vad_threshold=vad_threshold,
+                vad_min_silence_duration_ms=vad_min_silence_duration_ms,
+                word_timestamps=word_timestamps,
+                progress=progress,
+                timings=timings
             )
 
             progress(1, desc="Completed!")
 
-            file_name = safe_filename(yt.title)
-            subtitle, file_path = self.generate_and_write_file(
-                file_name=file_name,
-                transcribed_segments=transcribed_segments,
-                add_timestamp=add_timestamp,
-                file_format=file_format
-            )
-            gr_str = f"Done in {self.format_time(time_for_task)}! Subtitle file is in the outputs folder.\n\n{subtitle}"
+            file_name = self.output_config.safe_filename(yt.title)
+            with timings.stage("write"):
+                subtitle, file_path = self.generate_and_write_file(
+                    file_name=file_name,
+                    transcribed_segments=transcribed_segments,
+                    add_timestamp=add_timestamp,
+                    file_format=file_format
+                )
+            job_stats = self.format_job_stats([transcription_info], timings=timings)
+            gr_str = f"Done in {self.format_time(time_for_task)}! {job_stats}Subtitle file is in the outputs folder.\n\n{subtitle}"
 
             return [gr_str, file_path]
 
@@ -234,7 +442,11 @@ class FasterWhisperInference(BaseInterface):
                        log_prob_threshold: float,
                        no_speech_threshold: float,
                        compute_type: str,
-                       progress=gr.Progress()
+                       vad_filter: bool,
+                       vad_threshold: float,
+                       vad_min_silence_duration_ms: int,
+                       word_timestamps: bool,
+                       progress=default_progress()
                        ) -> list:
         """
         Write subtitle file from microphone
@@ -264,6 +476,16 @@ class FasterWhisperInference(BaseInterface):
             compute type from gr.Dropdown().
             see more info : https://opennmt.net/CTranslate2/quantization.html
             consider the segment as silent.
+        vad_filter: bool
+            Boolean value from gr.Checkbox() that determines whether to remove the non-speech regions
+            of the audio with the Silero VAD before decoding. Timestamps stay on the original timeline.
+        vad_threshold: float
+            float value from gr.Number(). Audio windows with a speech probability above this value are speech.
+        vad_min_silence_duration_ms: int
+            int value from gr.Number(). Silences shorter than this are kept as part of the speech.
+        word_timestamps: bool
+            Boolean value from gr.Checkbox() that determines whether to extract the timestamps of every word.
+            The words are kept in the "words" of the segments, and the cues are timed to their first and last word.
         progress: gr.Progress
             Indicator to show progress directly in gradio.
 
@@ -274,29 +496,37 @@ class FasterWhisperInference(BaseInterface):
         Files to return to gr.Files()
         """
         try:
-            self.update_model_if_needed(model_size=model_size, compute_type=compute_type, progress=progress)
-
+            timings = JobTimings(engine=type(self).__name__, model_size=model_size, compute_type=compute_type)
             progress(0, desc="Loading Audio..")
 
-            transcribed_segments, time_for_task = self.transcribe(
-                audio=micaudio,
+            [(transcribed_segments, time_for_task, transcription_info)] = self.transcribe_batch(
+                audios=[micaudio],
+                model_size=model_size,
+                compute_type=compute_type,
                 lang=lang,
                 istranslate=istranslate,
                 beam_size=beam_size,
                 log_prob_threshold=log_prob_threshold,
                 no_speech_threshold=no_speech_threshold,
-                progress=progress
+                vad_filter=vad_filter,
+                vad_threshold=vad_threshold,
+                vad_min_silence_duration_ms=vad_min_silence_duration_ms,
+                word_timestamps=word_timestamps,
+                progress=progress,
+                timings=timings
             )
             progress(1, desc="Completed!")
 
-            subtitle, file_path = self.generate_and_write_file(
-                file_name="Mic",
-                transcribed_segments=transcribed_segments,
-                add_timestamp=True,
-                file_format=file_format
-            )
+            with timings.stage("write"):
+                subtitle, file_path = self.generate_and_write_file(
+                    file_name="Mic",
+                    transcribed_segments=transcribed_segments,
+                    add_timestamp=True,
+                    file_format=file_format
+                )
 
-            gr_str = f"Done in {self.format_time(time_for_task)}! Subtitle file is in the outputs folder.\n\n{subtitle}"
+            job_stats = self.format_job_stats([transcription_info], timings=timings)
+            gr_str = f"Done in {self.format_time(time_for_task)}! {job_stats}Subtitle file is in the outputs folder.\n\n{subtitle}"
             return [gr_str, file_path]
         except Exception as e:
             print(f"Error transcribing file on line {e}")
@@ -311,8 +541,12 @@ class FasterWhisperInference(BaseInterface):
                    beam_size: int,
                    log_prob_threshold: float,
                    no_speech_threshold: float,
-                   progress: gr.Progress
-                   ) -> Tuple[List[dict], float]:
+                   vad_filter: bool,
+                   vad_threshold: float,
+                   vad_min_silence_duration_ms: int,
+                   word_timestamps: bool,
+                   progress: ProgressCallback
+                   ) -> Tuple[List[dict], float, dict]:
         """
         transcribe method for faster-whisper.
 
@@ -334,6 +568,16 @@ class FasterWhisperInference(BaseInterface):
             float value from gr.Number(). If the no_speech probability is higher than this value AND
             the average log probability over sampled tokens is below `log_prob_threshold`,
             consider the segment as silent.
+        vad_filter: bool
+            Boolean value from gr.Checkbox() that determines whether to remove the non-speech regions
+            of the audio with the Silero VAD before decoding. Timestamps stay on the original timeline.
+        vad_threshold: float
+            float value from gr.Number(). Audio windows with a speech probability above this value are speech.
+        vad_min_silence_duration_ms: int
+            int value from gr.Number(). Silences shorter than this are kept as part of the speech.
+        word_timestamps: bool
+            Boolean value from gr.Checkbox() that determines whether to extract the timestamps of every word.
+            The words are kept in the "words" of the segments, and the cues are timed to their first and last word.
         progress: gr.Progress
             Indicator to show progress directly in gradio.
 
@@ -343,14 +587,61 @@ class FasterWhisperInference(BaseInterface):
             list of dicts that includes start, end timestamps and transcribed text
         elapsed_time: float
             elapsed time for transcription
+        transcription_info: dict
+            vad_filter, duration and duration_after_vad of the audio, language, prepare_time and inference_time
+            in seconds, and the number of decoded tokens
         """
         start_time = time.time()
+        transcription_info = {}
+        segments_result = list(self.transcribe_stream(
+            audio=audio,
+            lang=lang,
+            istranslate=istranslate,
+            beam_size=beam_size,
+            log_prob_threshold=log_prob_threshold,
+            no_speech_threshold=no_speech_threshold,
+            vad_filter=vad_filter,
+            vad_threshold=vad_threshold,
+            vad_min_silence_duration_ms=vad_min_silence_duration_ms,
+            word_timestamps=word_timestamps,
+            progress=progress,
+            transcription_info=transcription_info
+        ))
+        elapsed_time = time.time() - start_time
+        return segments_result, elapsed_time, transcription_info
 
+    def transcribe_stream(self,
+                          audio: Union[str, BinaryIO, np.ndarray],
+                          lang: str,
+                          istranslate: bool,
+                          beam_size: int,
+                          log_prob_threshold: float,
+                          no_speech_threshold: float,
+                          vad_filter: bool,
+                          vad_threshold: float,
+                          vad_min_silence_duration_ms: int,
+                          word_timestamps: bool,
+                          progress: ProgressCallback,
+                          transcription_info: Optional[dict] = None
+                          ) -> Iterator[dict]:
+        """
+        Same as `transcribe`, but yields every segment as soon as it is decoded
+        instead of returning the whole list at the end.
+        `transcription_info` is filled with the audio and speech durations, the detected language and
+        the preparation time once the audio is loaded, and with the inference time and tokens as segments are decoded.
+
+        Yields
+        ----------
+        segment: dict
+            dict that includes start, end timestamps and transcribed text
+        """
         if lang == "Automatic Detection":
             lang = None
         else:
             language_code_dict = {value: key for key, value in whisper.tokenizer.LANGUAGES.items()}
             lang = language_code_dict[lang]
+        progress(0, desc="Loading audio.." if lang else "Loading audio and detecting language..")
+        prepare_start = time.time()
         segments, info = self.model.transcribe(
             audio=audio,
             language=lang,
@@ -358,42 +649,392 @@ class FasterWhisperInference(BaseInterface):
             beam_size=beam_size,
             log_prob_threshold=log_prob_threshold,
             no_speech_threshold=no_speech_threshold,
+            vad_filter=vad_filter,
+            vad_parameters=get_vad_options(threshold=vad_threshold,
+                                           min_silence_duration_ms=vad_min_silence_duration_ms),
+            word_timestamps=word_timestamps,
         )
-        progress(0, desc="Loading audio..")
+        # The audio is decoded, filtered, turned into features and its language detected before this returns
+        prepare_time = time.time() - prepare_start
+        if transcription_info is not None:
+            transcription_info.update(vad_filter=vad_filter,
+                                      duration=info.duration,
+                                      duration_after_vad=info.duration_after_vad,
+                                      language=info.language,
+                                      prepare_time=prepare_time)
 
-        segments_result = []
-        for segment in segments:
-            progress(segment.start / info.duration, desc="Transcribing..")
-            segments_result.append({
+        inference_time = 0.0
+        tokens = 0
+        segments = iter(segments)
+        while True:
+            # Only the time spent in the decoder counts, not the time the consumer takes between segments
+            inference_start = time.time()
+            segment = next(segments, None)
+            inference_time += time.time() - inference_start
+            if segment is None:
+                break
+            tokens += len(segment.tokens)
+            if transcription_info is not None:
+                transcription_info.update(inference_time=inference_time, tokens=tokens)
+
+            progress(min(segment.end / max(info.duration, 1e-6), 1.0),
+                     desc=f"Transcribing.. {self.format_timestamp(segment.end)} / {self.format_timestamp(info.duration)}")
+            segment_dict = {
                 "start": segment.start,
                 "end": segment.end,
                 "text": segment.text
-            })
+            }
+            if word_timestamps:
+                segment_dict["words"] = WordTimestamps.from_words(segment.words)
+            yield segment_dict
 
-        elapsed_time = time.time() - start_time
-        return segments_result, elapsed_time
+    def transcribe_batch(self,
+                         audios: List[Union[str, BinaryIO, np.ndarray]],
+                         model_size: str,
+                         compute_type: str,
+                         lang: str,
+                         istranslate: bool,
+                         beam_size: int,
+                         log_prob_threshold: float,
+                         no_speech_threshold: float,
+                         vad_filter: bool,
+                         vad_threshold: float,
+                         vad_min_silence_duration_ms: int,
+                         word_timestamps: bool,
+                         progress: ProgressCallback,
+                         on_result: Optional[Callable[[int, Tuple[List[dict], float, dict]], None]] = None,
+                         timings: Optional[JobTimings] = None
+                         ) -> List[Tuple[List[dict], float, dict]]:
+        """
+        Transcribe several audios at once.
+
+        Audios transcribed before with the same parameters are read from `self.transcription_cache`.
+        The other audios are decoded up to `self.prefetch_depth` audios ahead of the one being transcribed.
+        Audios longer than `self.parallel_chunk_length` are split into chunks at their silences,
+        and the chunks are scheduled like separate audios and stitched back together afterwards.
+        With a worker pool, every other audio is queued to the worker processes, each of which owns its own model.
+        Otherwise every audio is decoded and segmented in its own thread, and CTranslate2 runs the 30-second
+        windows of up to `self.num_workers` audios in parallel on its model replicas.
+        faster-whisper releases the GIL while decoding, so this scales with the number of workers on CPU.
+
+        Parameters
+        ----------
+        audios: List[Union[str, BinaryIO, np.ndarray]]
+            Audio paths or file binaries or Audio numpy arrays
+        model_size: str
+            Whisper model size from gr.Dropdown()
+        compute_type: str
+            compute type from gr.Dropdown().
+        lang: str
+            Source language of the files to transcribe from gr.Dropdown()
+        istranslate: bool
+            Boolean value from gr.Checkbox() that determines whether to translate to English.
+        beam_size: int
+            Int value from gr.Number() that is used for decoding option.
+        log_prob_threshold: float
+            float value from gr.Number(). Same as in `transcribe`.
+        no_speech_threshold: float
+            float value from gr.Number(). Same as in `transcribe`.
+        vad_filter: bool
+            Boolean value from gr.Checkbox() that determines whether to remove the non-speech regions
+            of the audio with the Silero VAD before decoding. Timestamps stay on the original timeline.
+        vad_threshold: float
+            float value from gr.Number(). Audio windows with a speech probability above this value are speech.
+        vad_min_silence_duration_ms: int
+            int value from gr.Number(). Silences shorter than this are kept as part of the speech.
+        word_timestamps: bool
+            Boolean value from gr.Checkbox() that determines whether to extract the timestamps of every word.
+            The words are kept in the "words" of the segments, and the cues are timed to their first and last word.
+        progress: gr.Progress
+            Indicator to show progress directly in gradio.
+        on_result: Optional[Callable[[int, Tuple[List[dict], float, dict]], None]]
+            Called with the index and the result of every audio as soon as it is ready,
+            e.g. to write its subtitle while the other audios are still transcribed.
+        timings: Optional[JobTimings]
+            Timings of the job, which the model load time is added to.
+
+        Returns
+        ----------
+        A list of (segments_result, elapsed_time, transcription_info) in the same order as `audios`.
+        The transcription_info of a cached result is empty.
+        """
+        decode_params = dict(
+            lang=lang,
+            istranslate=istranslate,
+            beam_size=beam_size,
+            log_prob_threshold=log_prob_threshold,
+            no_speech_threshold=no_speech_threshold,
+            vad_filter=vad_filter,
+            vad_threshold=vad_threshold,
+            vad_min_silence_duration_ms=vad_min_silence_duration_ms,
+            word_timestamps=word_timestamps,
+        )
+
+        results = [None] * len(audios)
+        cache_keys = [self.get_cache_key(audio, model_size=model_size, compute_type=compute_type, **decode_params)
+                      for audio in audios]
+        for index, cache_key in enumerate(cache_keys):
+            if cache_key is not None:
+                cached_segments = self.transcription_cache.get(cache_key)
+                if cached_segments is not None:
+                    results[index] = (cached_segments, 0.0, {})
+
+        if on_result is not None:
+            for index, result in enumerate(results):
+                if result is not None:
+                    on_result(index, result)
+
+        pending = [index for index, result in enumerate(results) if result is None]
+        if pending:
+            ingest_infos = {index: {} for index in pending}
+            # Audios sent to the worker processes as a PCMRef stay pinned in the audio cache until they are
+            # transcribed, so the cache doesn't remove their file before a worker maps it
+            pin = self.worker_pool is not None
+            pinned_paths = {}
+            pin_lock = threading.Lock()
+            released = False
+
+            def load(index):
+                audio = self.load_audio(audios[index], ingest_infos[index], pin=pin)
+                if pin and isinstance(audio, np.memmap):
+                    with pin_lock:
+                        if not released:
+                            pinned_paths[index] = audio.filename
+                            return index, audio
+                    # Loaded in the background after the batch stopped
+                    self.audio_cache.unpin(audio.filename)
+                return index, audio
+
+            def unpin(index):
+                with pin_lock:
+                    path = pinned_paths.pop(index, None)
+                if path is not None:
+                    self.audio_cache.unpin(path)
+
+            # The next audios are decoded in the background while the current ones are transcribed
+            loaded_audios = prefetch(pending, load, depth=self.prefetch_depth)
+            transcribed = self._transcribe_uncached(audios=loaded_audios,
+                                                    total=len(pending),
+                                                    model_size=model_size,
+                                                    compute_type=compute_type,
+                                                    decode_params=decode_params,
+                                                    progress=progress,
+                                                    timings=timings)
+            try:
+                for index, result in transcribed:
+                    unpin(index)
+                    result[2].update(ingest_infos[index])
+                    results[index] = result
+                    if on_result is not None:
+                        on_result(index, result)
+                    if cache_keys[index] is not None:
+                        self.transcription_cache.put(cache_keys[index], result[0])
+            finally:
+                # Releases `self.model_lock` right away if the results stop being consumed
+                transcribed.close()
+                loaded_audios.close()
+                with pin_lock:
+                    released = True
+                    remaining_indexes = list(pinned_paths)
+                for index in remaining_indexes:
+                    unpin(index)
+
+        if self.transcription_cache is not None:
+            print(self.transcription_cache.format_stats())
+        return results
+
+    def _transcribe_uncached(self,
+                             audios: Iterable[Tuple[int, Union[str, BinaryIO, np.ndarray]]],
+                             total: int,
+                             model_size: str,
+                             compute_type: str,
+                             decode_params: dict,
+                             progress: ProgressCallback,
+                             timings: Optional[JobTimings] = None
+                             ) -> Iterator[Tuple[int, Tuple[List[dict], float, dict]]]:
+        """
+        Transcribe (index, audio) pairs as they arrive from `audios`, and yield (index, result) as soon as
+        every chunk of an audio is transcribed. Results may come out of order when they run in parallel.
+        """
+        start_time = time.time()
+        sequential = self.worker_pool is None and self.num_workers <= 1
+        if self.worker_pool is None:
+            # Released in the finally below, once the last audio is transcribed on `self.model`
+            self.model_lock.acquire()
+            try:
+                with timings.stage("model_load") if timings is not None else nullcontext():
+                    self.update_model_if_needed(model_size=model_size, compute_type=compute_type, progress=progress)
+            except BaseException:
+                self.model_lock.release()
+                raise
+            executor = None if sequential else ThreadPoolExecutor(max_workers=self.num_workers)
+        else:
+            progress(0, desc="Waiting for a worker..")
+
+        futures = {}
+        # index -> number of chunks of the audio, and the (offset, result) of the ones transcribed so far
+        chunk_counts = {}
+        chunk_results = {}
+        done_audios = 0
+
+        def finish(index):
+            nonlocal done_audios
+            done_audios += 1
+            if not sequential:
+                progress(done_audios / total, desc=f"Transcribed {done_audios}/{total}..")
+            return index, self._merge_chunks(sorted(chunk_results.pop(index), key=lambda chunk: chunk[0]),
+                                             start_time)
+
+        def collect(wait_for_one: bool):
+            if wait_for_one:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            else:
+                done = [future for future in futures if future.done()]
+            for future in done:
+                index, offset = futures.pop(future)
+                chunk_results[index].append((offset, future.result()))
+                if len(chunk_results[index]) == chunk_counts[index]:
+                    yield finish(index)
+
+        try:
+            for index, audio in audios:
+                chunks = self.split_long_audio(audio, decode_params["vad_threshold"])
+                chunk_counts[index] = len(chunks)
+                chunk_results[index] = []
+                for offset, chunk in chunks:
+                    if sequential:
+                        chunk_results[index].append((offset, self.transcribe(audio=chunk, progress=progress,
+                                                                             **decode_params)))
+                    elif self.worker_pool is not None:
+                        future = self.worker_pool.submit(audio=self.to_worker_audio(offset, chunk),
+                                                         model_size=model_size, compute_type=compute_type,
+                                                         **decode_params)
+                        futures[future] = (index, offset)
+                    else:
+                        future = executor.submit(self.transcribe, audio=chunk, progress=self.no_progress,
+                                                 **decode_params)
+                        futures[future] = (index, offset)
+                if sequential:
+                    yield finish(index)
+                else:
+                    yield from collect(wait_for_one=False)
+
+            while futures:
+                yield from collect(wait_for_one=True)
+        finally:
+            if self.worker_pool is None:
+                if executor is not None:
+                    executor.shutdown(wait=True, cancel_futures=True)
+                self.model_lock.release()
+
+    @staticmethod
+    def _merge_chunks(chunks: List[Tuple[float, Tuple[List[dict], float, dict]]],
+                      start_time: float) -> Tuple[List[dict], float, dict]:
+        """Stitches the (offset, result) of the chunks of an audio into the result of the whole audio"""
+        if len(chunks) == 1:
+            return chunks[0][1]
+        segments_result = stitch_segments([(offset, segments) for offset, (segments, _, _) in chunks])
+        infos = [info for _, (_, _, info) in chunks]
+        transcription_info = dict(vad_filter=infos[0]["vad_filter"],
+                                  language=infos[0].get("language"),
+                                  chunks=len(chunks))
+        for key in ("duration", "duration_after_vad", "prepare_time", "inference_time", "tokens"):
+            transcription_info[key] = sum(info.get(key, 0) for info in infos)
+        # The chunks ran in parallel, so the wall time is the time since the batch started
+        return segments_result, time.time() - start_time, transcription_info
+
+    def split_long_audio(self,
+                         audio: Union[str, BinaryIO, np.ndarray],
+                         vad_threshold: float) -> List[Tuple[float, Union[str, BinaryIO, np.ndarray]]]:
+        """
+        Splits an audio longer than `self.parallel_chunk_length` seconds into chunks at its silences,
+        so that the chunks can be decoded in parallel. Returns a list of (offset, chunk).
+        The audio is returned as a single chunk if chunking is disabled or there is nothing to run it in parallel on.
+        """
+        if self.parallel_chunk_length <= 0 or (self.worker_pool is None and self.num_workers <= 1):
+            return [(0.0, audio)]
+        if not isinstance(audio, np.ndarray):
+            audio = faster_whisper.decode_audio(audio, sampling_rate=SAMPLING_RATE)
+        chunks = split_audio(audio, chunk_length=self.parallel_chunk_length, vad_threshold=vad_threshold)
+        if len(chunks) > 1:
+            print(f"Split {len(audio) / SAMPLING_RATE:.1f}s of audio into {len(chunks)} chunks")
+        return chunks
+
+    @staticmethod
+    def to_worker_audio(offset: float,
+                        chunk: Union[str, BinaryIO, np.ndarray]) -> Union[str, BinaryIO, np.ndarray, PCMRef]:
+        """
+        Samples from the audio cache are sent to the worker processes as a PCMRef to the cache file,
+        which the worker maps itself instead of receiving a pickled copy of the samples.
+        """
+        if isinstance(chunk, np.memmap):
+            return PCMRef(path=chunk.filename, start=round(offset * SAMPLING_RATE), length=len(chunk))
+        return chunk
+
+    def set_ct2_threads(self,
+                        cpu_threads: int,
+                        num_workers: int):
+        """
+        Set the CTranslate2 threads of the models used from now on: `cpu_threads` per model replica (intra_threads)
+        and `num_workers` replicas (inter_threads). Values below 1 keep the current setting.
+        They are shared by every request, so they are only set at startup and by `ct2_tuning.autotune`.
+        """
+        if cpu_threads and cpu_threads >= 1:
+            self.cpu_threads = int(cpu_threads)
+        if num_workers and num_workers >= 1:
+            self.num_workers = int(num_workers)
 
     def update_model_if_needed(self,
                                model_size: str,
                                compute_type: str,
-                               progress: gr.Progress
+                               progress: ProgressCallback
                                ):
         """
-        Initialize model if it doesn't match with current model setting
+        Initialize model if it doesn't match with current model setting.
+        Loaded models are kept in `self.model_pool`, so switching back to a model doesn't reload it from disk.
+        The threads are fixed when a model is loaded, so models loaded with other threads are kept apart.
+        The compute type defaults to the current one, e.g. before the UI has loaded the choices.
         """
-        if model_size != self.current_model_size or self.model is None or self.current_compute_type != compute_type:
+        compute_type = compute_type or self.current_compute_type
+        key = (model_size, compute_type, self.device, self.cpu_threads, self.num_workers)
+        if key not in self.model_pool:
             progress(0, desc="Initializing Model..")
-            self.current_model_size = model_size
-            self.current_compute_type = compute_type
-            self.model = faster_whisper.WhisperModel(
+        self.current_model_size = model_size
+        self.current_compute_type = compute_type
+        evictions = self.model_pool.evictions
+        self.model = self.model_pool.get(
+            key=key,
+            loader=lambda: faster_whisper.WhisperModel(
                 device=self.device,
                 model_size_or_path=model_size,
                 download_root=os.path.join("models", "Whisper", "faster-whisper"),
-                compute_type=self.current_compute_type
-            )
+                compute_type=compute_type,
+                cpu_threads=self.cpu_threads,
+                num_workers=self.num_workers
+            ),
+            size_gb=estimate_model_memory(model_size, compute_type)
+        )
+        if self.model_pool.evictions != evictions:
+            # The evicted models were still referenced by `self.model` until it was replaced above
+            self.release_cuda_memory()
 
-    @staticmethod
-    def generate_and_write_file(file_name: str,
+    def preload_model(self,
+                      model_size: str,
+                      compute_type: Optional[str] = None) -> float:
+        """
+        Load a model into `self.model_pool` and decode a short clip with it, so the first request
+        doesn't pay for loading the model and setting up the first inference.
+        `compute_type` defaults to the one of the device. Returns the time it took in seconds.
+        """
+        start_time = time.time()
+        self.update_model_if_needed(model_size=model_size,
+                                    compute_type=compute_type or self.current_compute_type,
+                                    progress=self.no_progress)
+        self.transcribe(audio=make_warmup_audio(), progress=self.no_progress, **WARMUP_DECODE_PARAMS)
+        return time.time() - start_time
+
+    def generate_and_write_file(self,
+                                file_name: str,
                                 transcribed_segments: list,
                                 add_timestamp: bool,
                                 file_format: str,
@@ -401,28 +1042,35 @@ class FasterWhisperInference(BaseInterface):
         """
         This method writes subtitle file and returns str to gr.Textbox
         """
-        timestamp = datetime.now().strftime("%m%d%H%M%S")
-        if add_timestamp:
-            output_path = os.path.join("outputs", f"{file_name}-{timestamp}")
-        else:
-            output_path = os.path.join("outputs", f"{file_name}")
-
+        output_path = self.get_output_path(file_name=file_name,
+                                           add_timestamp=add_timestamp,
+                                           file_format=file_format)
         if file_format == "SRT":
             content = get_srt(transcribed_segments)
-            output_path += '.srt'
-            write_file(content, output_path)
-
         elif file_format == "WebVTT":
             content = get_vtt(transcribed_segments)
-            output_path += '.vtt'
-            write_file(content, output_path)
-
         elif file_format == "txt":
             content = get_txt(transcribed_segments)
-            output_path += '.txt'
-            write_file(content, output_path)
+        write_file(content, output_path)
         return content, output_path
 
+    def get_output_path(self,
+                        file_name: str,
+                        add_timestamp: bool,
+                        file_format: str) -> str:
+        timestamp = datetime.now().strftime("%m%d%H%M%S")
+        if add_timestamp:
+            output_path = os.path.join(self.output_config.output_dir, f"{file_name}-{timestamp}")
+        else:
+            output_path = os.path.join(self.output_config.output_dir, f"{file_name}")
+        return output_path + SUBTITLE_EXTENSIONS[file_format]
+
+    @staticmethod
+    def format_timestamp(seconds: float) -> str:
+        minutes, seconds = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
     @staticmethod
     def format_time(elapsed_time: float) -> str:
         hours, rem = divmod(elapsed_time, 3600)
@@ -0,0 +1,54 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Optional
+
+from modules.transcription_cache import hash_file
+
+DEFAULT_LEDGER_PATH = os.path.join("outputs", "cli", "ledger.jsonl")
+
+
+class JobLedger:
+    """
+    Append-only JSON Lines record of the files processed by batch jobs, so an interrupted job can be
+    run again and only process the files it didn't finish.
+    Entries are keyed by the content hash of the input and the job parameters, so an edited input
+    or a change of parameters is processed again. The last entry of a key wins.
+    """
+    def __init__(self, path: str = DEFAULT_LEDGER_PATH):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # The last line is cut off if the job was killed while writing it
+                        continue
+                    self.entries[entry["key"]] = entry
+
+    @staticmethod
+    def make_key(file_path: str, **params) -> str:
+        key_data = json.dumps({"file": hash_file(file_path), **params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+    def get_done(self, key: str) -> Optional[dict]:
+        """Returns the entry of a finished file, or None if it has to be processed, e.g. when its outputs were removed"""
+        entry = self.entries.get(key)
+        if entry is None or entry["status"] != "done":
+            return None
+        if not all(os.path.exists(output_path) for output_path in entry["outputs"]):
+            return None
+        return entry
+
+    def record(self, entry: dict):
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.entries[entry["key"]] = entry
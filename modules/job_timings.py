@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import itertools
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Optional
+
+from modules.audio_cache import get_rss_mb, get_peak_rss_mb
+
+# Stage name -> key of the per-file transcription_info that holds its duration
+FILE_STAGES = {
+    "audio_decode": "decode_time",
+    "prepare": "prepare_time",
+    "inference": "inference_time",
+}
+
+
+class JobTimings:
+    """
+    Collects the time a transcription job spends in each stage.
+    Job-wide stages (model loading, subtitle writing) are measured with `stage()`. Per-file stages
+    (audio decoding, preparation i.e. VAD, feature extraction and language detection, and inference)
+    come from the transcription_info of every file. Per-file stages are summed over the files,
+    so their total can exceed the wall time when files are transcribed in parallel.
+    """
+    def __init__(self,
+                 engine: str,
+                 model_size: str,
+                 compute_type: str):
+        self.engine = engine
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.started_at = datetime.now()
+        self.start_time = time.time()
+        self.stages = {"model_load": 0.0, "write": 0.0}
+        # Resident memory of the process when the job started, to tell what the job itself added
+        self.rss_start_mb = get_rss_mb()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + time.time() - start_time
+
+    def summarize(self, transcription_infos: List[dict]) -> dict:
+        infos = [info for info in transcription_infos if info]
+        stages = {"model_load": self.stages["model_load"]}
+        for stage, key in FILE_STAGES.items():
+            stages[stage] = sum(info.get(key) or 0.0 for info in infos)
+        stages.update((stage, seconds) for stage, seconds in self.stages.items() if stage not in stages)
+
+        wall_time = time.time() - self.start_time
+        audio_duration = sum(info.get("duration") or 0.0 for info in infos)
+        tokens = sum(info.get("tokens") or 0 for info in infos)
+        return {
+            "engine": self.engine,
+            "model_size": self.model_size,
+            "compute_type": self.compute_type,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "wall_time": wall_time,
+            "audio_duration": audio_duration,
+            "stages": stages,
+            "real_time_factor": wall_time / audio_duration if audio_duration else None,
+            "tokens": tokens,
+            "tokens_per_second": tokens / stages["inference"] if stages["inference"] else None,
+            "cached_files": len(transcription_infos) - len(infos),
+            "rss_start_mb": self.rss_start_mb,
+            "rss_end_mb": get_rss_mb(),
+            "files": infos,
+        }
+
+    def write_sidecar(self,
+                      summary: dict,
+                      timings_dir: str) -> str:
+        """
+        Writes the summary as JSON to <timings_dir>/<start time>-<model>-<compute type>.json, where timings_dir
+        is the OutputConfig.timings_dir of the engine.
+        Jobs started in the same second with the same model get a numbered suffix instead of overwriting each other.
+        """
+        os.makedirs(timings_dir, exist_ok=True)
+        file_name = f"{self.started_at.strftime('%m%d%H%M%S')}-{self.model_size}-{self.compute_type}"
+        base_path = os.path.join(timings_dir, file_name.replace("/", "_"))
+        for attempt in itertools.count():
+            output_path = f"{base_path}.json" if attempt == 0 else f"{base_path}-{attempt}.json"
+            try:
+                f = open(output_path, "x", encoding="utf-8")
+            except FileExistsError:
+                continue
+            with f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+            return output_path
+
+
+def format_timings(summary: dict) -> str:
+    stages = ", ".join(f"{stage.replace('_', ' ')} {seconds:.1f}s" for stage, seconds in summary["stages"].items())
+    line = f"Stages: {stages}."
+    if summary["real_time_factor"] is not None:
+        line += f" RTF {summary['real_time_factor']:.3f}"
+    if summary["tokens_per_second"] is not None:
+        line += f", {summary['tokens_per_second']:.1f} tokens/s"
+    return line
+
+
+def format_memory_stats(summary: Optional[dict] = None) -> str:
+    """
+    Formats the resident memory of the process at the start and end of the job of `summary`, and its peak.
+    The peak is over the whole life of the process, which runs other jobs too, so it isn't the peak of the job.
+    """
+    parts = []
+    if summary is not None and summary["rss_start_mb"] is not None and summary["rss_end_mb"] is not None:
+        rss_change_mb = summary["rss_end_mb"] - summary["rss_start_mb"]
+        parts.append(f"RSS {summary['rss_start_mb']:.0f} MB at the start of the job, "
+                     f"{summary['rss_end_mb']:.0f} MB at the end ({rss_change_mb:+.0f} MB)")
+    peak_rss_mb = get_peak_rss_mb()
+    if peak_rss_mb is not None:
+        parts.append(f"process peak RSS {peak_rss_mb:.0f} MB")
+    if not parts:
+        return ""
+    line = ", ".join(parts)
+    return f"{line[0].upper()}{line[1:]}."
@@ -0,0 +1,81 @@
+import sys
+import time
+import types
+import inspect
+import functools
+import threading
+import importlib
+from typing import Any, Callable
+
+
+class LazyModule(types.ModuleType):
+    """Stands in for a module that is only imported when one of its attributes is first accessed"""
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> types.ModuleType:
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self.__name__)
+        return self._module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """
+    Returns the module `name` if it's already imported, or a stand-in that imports it on first use.
+    Used for the heavy libraries that only some tabs need, so that the app starts without them.
+    Annotations that refer to a lazily imported module must be strings, or they import it right away.
+    """
+    return sys.modules.get(name) or LazyModule(name)
+
+
+class LazyEngine:
+    """
+    Constructs an engine with `factory` the first time one of its handlers is called, so the app
+    doesn't load the libraries and models of the tabs nobody has used yet.
+    """
+    def __init__(self,
+                 engine_class: type,
+                 factory: Callable[[], Any]):
+        self.engine_class = engine_class
+        self.factory = factory
+        self._engine = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._engine is not None
+
+    def get(self) -> Any:
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    start_time = time.time()
+                    self._engine = self.factory()
+                    print(f"Initialized {self.engine_class.__name__} in {time.time() - start_time:.1f}s")
+        return self._engine
+
+    def method(self, name: str) -> Callable:
+        """
+        Returns a function that calls the method `name` of the engine, constructing the engine first.
+        It has the signature of the method without `self`, which Gradio inspects to inject gr.Progress,
+        and it is a generator function if the method is one.
+        """
+        unbound = getattr(self.engine_class, name)
+        signature = inspect.signature(unbound)
+
+        if inspect.isgeneratorfunction(unbound):
+            @functools.wraps(unbound)
+            def handler(*args, **kwargs):
+                yield from getattr(self.get(), name)(*args, **kwargs)
+        else:
+            @functools.wraps(unbound)
+            def handler(*args, **kwargs):
+                return getattr(self.get(), name)(*args, **kwargs)
+        handler.__signature__ = signature.replace(parameters=list(signature.parameters.values())[1:])
+        return handler
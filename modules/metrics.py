@@ -0,0 +1,250 @@
+import time
+import bisect
+import inspect
+import threading
+import functools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+from modules.audio_cache import get_rss_mb, get_peak_rss_mb
+
+DEFAULT_METRICS_HOST = "127.0.0.1"
+METRICS_PREFIX = "whisper_webui"
+# Jobs range from a short mic recording to hours of audio
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+# Keys of the `stats()` dicts that only ever grow, exported as counters. Every other number is a gauge.
+COUNTER_STATS = ("hits", "misses", "evictions")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    if extra is not None:
+        labels = labels + (extra,)
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+    return f"{{{pairs}}}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            lines += [f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+                      for labels, value in self.values.items()]
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self.values[key] = value
+
+    def expose(self) -> List[str]:
+        lines = super().expose()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # labels -> (count per bucket, sum)
+        self.values: Dict[Labels, Tuple[List[int], float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value)
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total) in self.values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    bucket_labels = _format_labels(labels, ("le", _format_value(bound)))
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Metrics of the WebUI in the Prometheus text format.
+    Gradio handlers are wrapped with `track()`, finished transcription jobs are recorded with `observe_job()`,
+    and objects with a `stats()` dict such as the caches and the model pool are read at every scrape.
+    """
+    def __init__(self, prefix: str = METRICS_PREFIX):
+        self.prefix = prefix
+        self.requests = Counter(f"{prefix}_requests_total", "Handled requests by handler and status")
+        self.requests_queued = Gauge(f"{prefix}_requests_queued", "Requests waiting for a free slot of their handler")
+        self.requests_in_progress = Gauge(f"{prefix}_requests_in_progress", "Requests being processed")
+        self.queue_wait = Histogram(f"{prefix}_queue_wait_seconds", "Time requests waited before their handler started")
+        self.request_duration = Histogram(f"{prefix}_request_duration_seconds", "Time spent in the handler")
+        self.stage_duration = Histogram(f"{prefix}_stage_duration_seconds", "Time a transcription job spent in each stage")
+        self.audio_seconds = Counter(f"{prefix}_audio_seconds_total", "Seconds of audio transcribed, without cache hits")
+        self.tokens = Counter(f"{prefix}_tokens_total", "Tokens decoded by the Whisper models")
+        self.files = Counter(f"{prefix}_files_total", "Files processed by transcription jobs, by whether they were cached")
+        self.metrics = [self.requests, self.requests_queued, self.requests_in_progress, self.queue_wait,
+                        self.request_duration, self.stage_duration, self.audio_seconds, self.tokens, self.files]
+        self.stats_sources: Dict[str, Callable[[], Optional[object]]] = {}
+
+    def track(self,
+              handler: str,
+              fn: Callable,
+              concurrency_limit: Optional[int] = 1) -> Callable:
+        """
+        Wraps a Gradio handler to count its requests and measure their queue wait and duration.
+        The handler is limited to `concurrency_limit` concurrent requests by a semaphore, whose wait is
+        the queue wait, so Gradio's own limit should be lifted for the event. None means no limit.
+        Generator handlers stay generators, and the signature is kept for Gradio's progress injection.
+        """
+        semaphore = threading.Semaphore(concurrency_limit) if concurrency_limit else None
+
+        def start() -> float:
+            self.requests_queued.inc(1, handler=handler)
+            queued_time = time.time()
+            if semaphore is not None:
+                semaphore.acquire()
+            self.requests_queued.inc(-1, handler=handler)
+            self.requests_in_progress.inc(1, handler=handler)
+            start_time = time.time()
+            self.queue_wait.observe(start_time - queued_time, handler=handler)
+            return start_time
+
+        def finish(start_time: float, status: str):
+            if semaphore is not None:
+                semaphore.release()
+            self.requests_in_progress.inc(-1, handler=handler)
+            self.request_duration.observe(time.time() - start_time, handler=handler)
+            self.requests.inc(handler=handler, status=status)
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start_time = start()
+                status = "error"
+                try:
+                    yield from fn(*args, **kwargs)
+                    status = "success"
+                finally:
+                    finish(start_time, status)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start_time = start()
+                status = "error"
+                try:
+                    result = fn(*args, **kwargs)
+                    status = "success"
+                    return result
+                finally:
+                    finish(start_time, status)
+        return wrapper
+
+    def observe_job(self, summary: dict):
+        """Records the summary of a transcription job, see JobTimings.summarize()"""
+        engine = summary["engine"]
+        for stage, seconds in summary["stages"].items():
+            self.stage_duration.observe(seconds, engine=engine, stage=stage)
+        self.audio_seconds.inc(summary["audio_duration"], engine=engine)
+        self.tokens.inc(summary["tokens"], engine=engine, model_size=summary["model_size"])
+        self.files.inc(len(summary["files"]), engine=engine, cached="false")
+        self.files.inc(summary["cached_files"], engine=engine, cached="true")
+
+    def register_stats(self, name: str, source: Callable[[], Optional[object]]):
+        """
+        Exports the `stats()` of the object returned by `source` as `<prefix>_<name>_<key>` at every scrape.
+        `source` is called each time because engines replace or disable their caches, in which case it returns None.
+        """
+        self.stats_sources[name] = source
+
+    def expose(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines += metric.expose()
+
+        for name, source in self.stats_sources.items():
+            obj = source()
+            if obj is None:
+                continue
+            for key, value in obj.stats().items():
+                if not isinstance(value, (int, float)):
+                    continue
+                if key in COUNTER_STATS:
+                    metric_name, metric_type = f"{self.prefix}_{name}_{key}_total", "counter"
+                else:
+                    metric_name, metric_type = f"{self.prefix}_{name}_{key}", "gauge"
+                lines += [f"# TYPE {metric_name} {metric_type}", f"{metric_name} {_format_value(value)}"]
+
+        for metric_name, value in ((f"{self.prefix}_resident_memory_mb", get_rss_mb()),
+                                   (f"{self.prefix}_peak_resident_memory_mb", get_peak_rss_mb())):
+            if value is not None:
+                lines += [f"# TYPE {metric_name} gauge", f"{metric_name} {_format_value(value)}"]
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.expose().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the console
+        pass
+
+
+def start_metrics_server(port: int,
+                         host: str = DEFAULT_METRICS_HOST,
+                         registry: Optional[MetricsRegistry] = None) -> ThreadingHTTPServer:
+    """Serves the metrics at http://<host>:<port>/metrics from a daemon thread"""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry or REGISTRY})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving metrics at http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+# Registry shared by the engines and the metrics server
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,136 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable
+
+DEFAULT_MEMORY_BUDGET_GB = 8.0
+
+# Approximate size of the Whisper weights in GB when they are held as float32
+WHISPER_MODEL_SIZES_GB = {
+    "tiny": 0.16,
+    "base": 0.3,
+    "small": 1.0,
+    "medium": 3.1,
+    "large": 6.2,
+}
+
+COMPUTE_TYPE_FACTORS = {
+    "float32": 1.0,
+    "float16": 0.5,
+    "bfloat16": 0.5,
+    "int8_float32": 0.25,
+    "int8_float16": 0.25,
+    "int8_bfloat16": 0.25,
+    "int8": 0.25,
+    "int16": 0.5,
+}
+
+
+def estimate_model_memory(model_size: str, compute_type: str = "float32") -> float:
+    """Returns the rough memory usage in GB of a Whisper model, e.g. "large-v3" or "base.en" """
+    base_size = model_size.split(".")[0].split("-")[0]
+    size_gb = WHISPER_MODEL_SIZES_GB.get(base_size, WHISPER_MODEL_SIZES_GB["large"])
+    return size_gb * COMPUTE_TYPE_FACTORS.get(compute_type, 1.0)
+
+
+class ModelPool:
+    """
+    Keeps several loaded models in memory and evicts the least recently used ones
+    when their estimated size exceeds the memory budget.
+    The most recently requested model is always kept, even if it alone exceeds the budget.
+    Models are loaded outside the lock, so a request for a loaded model doesn't wait for another one to load,
+    and concurrent requests for a model that is loading wait for that load instead of loading it again.
+    """
+    def __init__(self, memory_budget_gb: float = DEFAULT_MEMORY_BUDGET_GB):
+        self.memory_budget_gb = memory_budget_gb
+        self.models = OrderedDict()
+        # Key -> (Future of the model, size_gb) of the models being loaded
+        self.loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.models
+
+    def get(self,
+            key: Hashable,
+            loader: Callable[[], Any],
+            size_gb: float) -> Any:
+        """
+        Returns the model cached for `key`, loading it with `loader` on a miss.
+        The models evicted to make room are dropped from the pool, and are freed once nothing else refers to them.
+
+        Parameters
+        ----------
+        key: Hashable
+            Cache key of the model, e.g. (model_size, compute_type, device)
+        loader: Callable[[], Any]
+            Function that loads the model. Called at most once per miss.
+        size_gb: float
+            Estimated memory usage of the model, used for the budget.
+        """
+        with self._lock:
+            if key in self.models:
+                self.hits += 1
+                self.models.move_to_end(key)
+                return self.models[key][0]
+
+            if key in self.loading:
+                # Another request is loading the model already
+                self.hits += 1
+                future, _ = self.loading[key]
+                is_loader = False
+            else:
+                self.misses += 1
+                # The models being loaded are counted too, so two loads don't both fill the budget
+                loading_gb = sum(loading_size_gb for _, loading_size_gb in self.loading.values())
+                while self.models and self.used_memory_gb() + loading_gb + size_gb > self.memory_budget_gb:
+                    evicted_key, _ = self.models.popitem(last=False)
+                    self.evictions += 1
+                    print(f"Evicted model {evicted_key} from the model pool")
+                future = Future()
+                self.loading[key] = (future, size_gb)
+                is_loader = True
+
+        if not is_loader:
+            return future.result()
+
+        try:
+            model = loader()
+        except BaseException as e:
+            with self._lock:
+                del self.loading[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self.loading[key]
+            self.models[key] = (model, size_gb)
+            print(f"Loaded model {key} into the model pool. {self.format_stats()}")
+        future.set_result(model)
+        return model
+
+    def used_memory_gb(self) -> float:
+        return sum(size_gb for _, size_gb in self.models.values())
+
+    def clear(self):
+        with self._lock:
+            self.models.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+            "models": len(self.models),
+            "used_memory_gb": self.used_memory_gb(),
+            "memory_budget_gb": self.memory_budget_gb,
+        }
+
+    def format_stats(self) -> str:
+        stats = self.stats()
+        return (f"hits: {stats['hits']}, misses: {stats['misses']}, evictions: {stats['evictions']}, "
+                f"memory: {stats['used_memory_gb']:.1f}/{stats['memory_budget_gb']:.1f} GB")
@@ -1,40 +1,121 @@
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
-import gradio as gr
-import torch
 import os
+import time
 from datetime import datetime
+from typing import List, Optional
+from collections import OrderedDict
 
 from .base_interface import BaseInterface
 from modules.subtitle_manager import *
+from modules.translation_memory import TranslationMemory
+from modules.progress import ProgressCallback, default_progress
+from modules.lazy import lazy_import
+
+transformers = lazy_import("transformers")
+huggingface_hub = lazy_import("huggingface_hub")
+ctranslate2 = lazy_import("ctranslate2")
+torch = lazy_import("torch")
 
 DEFAULT_MODEL_SIZE = "facebook/nllb-200-1.3B"
+DEFAULT_BATCH_SIZE = 16
+MAX_CACHED_PIPELINES = 8
+TRANSFORMERS_BACKEND = "transformers"
+CTRANSLATE2_BACKEND = "ctranslate2"
+NLLB_BACKENDS = [TRANSFORMERS_BACKEND, CTRANSLATE2_BACKEND]
+DEFAULT_CT2_COMPUTE_TYPE = "int8"
 NLLB_MODELS = ["facebook/nllb-200-3.3B", "facebook/nllb-200-1.3B", "facebook/nllb-200-distilled-600M"]
 
 
+def get_ct2_device() -> str:
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def get_available_compute_types() -> List[str]:
+    """Returns the compute types the ctranslate2 backend supports on this device"""
+    return sorted(ctranslate2.get_supported_compute_types(get_ct2_device()))
+
+
 class NLLBInference(BaseInterface):
-    def __init__(self):
-        super().__init__()
+    def __init__(self,
+                 translation_memory: Optional[TranslationMemory] = None,
+                 output_config: Optional[OutputConfig] = None):
+        super().__init__(output_config=output_config)
         self.default_model_size = DEFAULT_MODEL_SIZE
         self.current_model_size = None
         self.model = None
+        self.translator = None
         self.tokenizer = None
+        self.current_model_key = None
         self.available_models = NLLB_MODELS
+        self.available_backends = NLLB_BACKENDS
+        self.default_backend = TRANSFORMERS_BACKEND
         self.available_source_langs = list(NLLB_AVAILABLE_LANGS.keys())
         self.available_target_langs = list(NLLB_AVAILABLE_LANGS.keys())
         self.device = 0 if torch.cuda.is_available() else -1
+        self.ct2_device = get_ct2_device()
+        self.available_compute_types = get_available_compute_types()
+        self.default_compute_type = DEFAULT_CT2_COMPUTE_TYPE
         self.pipeline = None
+        self.pipelines = OrderedDict()
+        self.max_cached_pipelines = MAX_CACHED_PIPELINES
+        self.default_batch_size = DEFAULT_BATCH_SIZE
+        self.translation_memory = translation_memory
 
     def translate_text(self, text):
         result = self.pipeline(text)
         return result[0]['translation_text']
 
+    def translate_texts(self,
+                        texts: List[str],
+                        batch_size: int,
+                        progress: ProgressCallback) -> List[str]:
+        """
+        Translate texts in batches of `batch_size`.
+        The texts are sorted by length so that each batch pads to similar lengths,
+        and the translations are returned in the original order.
+        """
+        batch_size = max(1, int(batch_size))
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        translations = [None] * len(texts)
+        for batch_start in range(0, len(order), batch_size):
+            batch = order[batch_start:batch_start + batch_size]
+            results = self.pipeline([texts[i] for i in batch], batch_size=len(batch))
+            for i, result in zip(batch, results):
+                translations[i] = result[0]['translation_text'] if isinstance(result, list) else result['translation_text']
+            progress((batch_start + len(batch)) / len(order), desc="Translating..")
+        return translations
+
+    def translate_with_memory(self,
+                              texts: List[str],
+                              batch_size: int,
+                              src_lang: str,
+                              tgt_lang: str,
+                              progress: ProgressCallback):
+        """
+        Translate texts with `translate_texts`, skipping the ones already in `self.translation_memory`.
+        Returns the translations and the number of translation memory hits.
+        """
+        if self.translation_memory is None:
+            return self.translate_texts(texts, batch_size=batch_size, progress=progress), 0
+        return self.translation_memory.translate(
+            texts,
+            translate_fn=lambda missing: self.translate_texts(missing, batch_size=batch_size, progress=progress),
+            engine="nllb",
+            # The backend and compute type change the translations, so each keeps its own entries
+            model=":".join(part for part in self.current_model_key if part is not None),
+            src_lang=src_lang,
+            tgt_lang=tgt_lang
+        )
+
     def translate_file(self,
                        fileobjs: list,
                        model_size: str,
                        src_lang: str,
                        tgt_lang: str,
                        add_timestamp: bool,
-                       progress=gr.Progress()) -> list:
+                       batch_size: int = DEFAULT_BATCH_SIZE,
+                       backend: str = TRANSFORMERS_BACKEND,
+                       compute_type: str = DEFAULT_CT2_COMPUTE_TYPE,
+                       progress=default_progress()) -> list:
         """
         Translate subtitle file from source language to target language
 
@@ -50,6 +131,13 @@ class NLLBInference(BaseInterface):
             Target language of the file to translate from gr.Dropdown()
         add_timestamp: bool
             Boolean value from gr.Checkbox() that determines whether to add a timestamp at the end of the filename.
+        batch_size: int
+            Number of subtitle lines translated in one generate call from gr.Number().
+        backend: str
+            Translation engine from gr.Dropdown(). Supported backend: [transformers, ctranslate2]
+        compute_type: str
+            compute type of the ctranslate2 backend from gr.Dropdown(), e.g. int8, int8_float32 or float32.
+            see more info : https://opennmt.net/CTranslate2/quantization.html
         progress: gr.Progress
             Indicator to show progress directly in gradio.
             I use a forked version of whisper for this. To see more info : https://github.com/jhj0517/jhj0517-whisper/tree/add-progress-callback
@@ -61,61 +149,58 @@ class NLLBInference(BaseInterface):
         Files to return to gr.Files()
         """
         try:
-            if model_size != self.current_model_size or self.model is None:
-                print("\nInitializing NLLB Model..\n")
-                progress(0, desc="Initializing NLLB Model..")
-                self.current_model_size = model_size
-                self.model = AutoModelForSeq2SeqLM.from_pretrained(pretrained_model_name_or_path=model_size,
-                                                                   cache_dir=os.path.join("models", "NLLB"))
-                self.tokenizer = AutoTokenizer.from_pretrained(pretrained_model_name_or_path=model_size,
-                                                               cache_dir=os.path.join("models", "NLLB", "tokenizers"))
-
-            src_lang = NLLB_AVAILABLE_LANGS[src_lang]
-            tgt_lang = NLLB_AVAILABLE_LANGS[tgt_lang]
-
-            self.pipeline = pipeline("translation",
-                                     model=self.model,
-                                     tokenizer=self.tokenizer,
-                                     src_lang=src_lang,
-                                     tgt_lang=tgt_lang,
-                                     device=self.device)
+            self.update_model_if_needed(model_size=model_size, backend=backend, compute_type=compute_type,
+                                        progress=progress)
+            self.pipeline = self.get_pipeline(src_lang=NLLB_AVAILABLE_LANGS[src_lang],
+                                              tgt_lang=NLLB_AVAILABLE_LANGS[tgt_lang])
 
+            start_time = time.time()
+            total_cues = 0
+            memory_hits = 0
             files_info = {}
             for fileobj in fileobjs:
                 file_path = fileobj.name
                 file_name, file_ext = os.path.splitext(os.path.basename(fileobj.name))
                 if file_ext == ".srt":
                     parsed_dicts = parse_srt(file_path=file_path)
-                    total_progress = len(parsed_dicts)
-                    for index, dic in enumerate(parsed_dicts):
-                        progress(index / total_progress, desc="Translating..")
-                        translated_text = self.translate_text(dic["sentence"])
+                    translated_texts, hits = self.translate_with_memory([dic["sentence"] for dic in parsed_dicts],
+                                                                        batch_size=batch_size,
+                                                                        src_lang=src_lang,
+                                                                        tgt_lang=tgt_lang,
+                                                                        progress=progress)
+                    memory_hits += hits
+                    for dic, translated_text in zip(parsed_dicts, translated_texts):
                         dic["sentence"] = translated_text
+                    total_cues += len(parsed_dicts)
                     subtitle = get_serialized_srt(parsed_dicts)
 
                     timestamp = datetime.now().strftime("%m%d%H%M%S")
                     if add_timestamp:
-                        output_path = os.path.join("outputs", "translations", f"{file_name}-{timestamp}")
+                        output_path = os.path.join(self.output_config.translations_dir, f"{file_name}-{timestamp}")
                     else:
-                        output_path = os.path.join("outputs", "translations", f"{file_name}")
+                        output_path = os.path.join(self.output_config.translations_dir, f"{file_name}")
                     output_path += '.srt'
 
                     write_file(subtitle, output_path)
 
                 elif file_ext == ".vtt":
                     parsed_dicts = parse_vtt(file_path=file_path)
-                    total_progress = len(parsed_dicts)
-                    for index, dic in enumerate(parsed_dicts):
-                        progress(index / total_progress, desc="Translating..")
-                        translated_text = self.translate_text(dic["sentence"])
+                    translated_texts, hits = self.translate_with_memory([dic["sentence"] for dic in parsed_dicts],
+                                                                        batch_size=batch_size,
+                                                                        src_lang=src_lang,
+                                                                        tgt_lang=tgt_lang,
+                                                                        progress=progress)
+                    memory_hits += hits
+                    for dic, translated_text in zip(parsed_dicts, translated_texts):
                         dic["sentence"] = translated_text
+                    total_cues += len(parsed_dicts)
                     subtitle = get_serialized_vtt(parsed_dicts)
 
                     timestamp = datetime.now().strftime("%m%d%H%M%S")
                     if add_timestamp:
-                        output_path = os.path.join("outputs", "translations", f"{file_name}-{timestamp}")
+                        output_path = os.path.join(self.output_config.translations_dir, f"{file_name}-{timestamp}")
                     else:
-                        output_path = os.path.join("outputs", "translations", f"{file_name}")
+                        output_path = os.path.join(self.output_config.translations_dir, f"{file_name}")
                     output_path += '.vtt'
 
                     write_file(subtitle, output_path)
@@ -128,7 +213,14 @@ class NLLBInference(BaseInterface):
                 total_result += f'{file_name}\n\n'
                 total_result += f'{subtitle}'
 
-            gr_str = f"Done! Subtitle is in the outputs/translation folder.\n\n{total_result}"
+            elapsed_time = time.time() - start_time
+            print(f"Translated {total_cues} cues in {elapsed_time:.1f} seconds "
+                  f"({total_cues / max(elapsed_time, 1e-6):.1f} cues/s, backend {backend}, batch size {batch_size})")
+            gr_str = f"Done! {total_cues / max(elapsed_time, 1e-6):.1f} cues/s. " \
+                     f"Subtitle is in the outputs/translation folder.\n\n{total_result}"
+            if self.translation_memory is not None:
+                print(self.translation_memory.format_stats())
+                gr_str = f"{memory_hits} lines were found in the translation memory. {gr_str}"
             return [gr_str, output_path]
         except Exception as e:
             print(f"Error: {str(e)}")
@@ -137,6 +229,109 @@ class NLLBInference(BaseInterface):
             self.remove_input_files([fileobj.name for fileobj in fileobjs])
 
 
+    def update_model_if_needed(self,
+                               model_size: str,
+                               progress: ProgressCallback,
+                               backend: str = TRANSFORMERS_BACKEND,
+                               compute_type: str = DEFAULT_CT2_COMPUTE_TYPE):
+        """
+        Initialize model if it doesn't match with current model setting
+        """
+        model_key = (model_size, backend, compute_type if backend == CTRANSLATE2_BACKEND else None)
+        if model_key == self.current_model_key:
+            return
+
+        print("\nInitializing NLLB Model..\n")
+        progress(0, desc="Initializing NLLB Model..")
+        if model_size != self.current_model_size or self.tokenizer is None:
+            self.tokenizer = transformers.AutoTokenizer.from_pretrained(pretrained_model_name_or_path=model_size,
+                                                           cache_dir=os.path.join("models", "NLLB", "tokenizers"))
+        self.current_model_size = model_size
+        # The cached pipelines hold the previous model
+        self.pipelines.clear()
+        self.model = None
+        self.translator = None
+        if backend == CTRANSLATE2_BACKEND:
+            self.translator = self.load_ct2_translator(model_size=model_size, compute_type=compute_type,
+                                                       progress=progress)
+        else:
+            self.model = transformers.AutoModelForSeq2SeqLM.from_pretrained(pretrained_model_name_or_path=model_size,
+                                                               cache_dir=os.path.join("models", "NLLB"))
+        self.current_model_key = model_key
+
+    def load_ct2_translator(self,
+                            model_size: str,
+                            compute_type: str,
+                            progress: ProgressCallback) -> "ctranslate2.Translator":
+        """
+        Load the NLLB model as a CTranslate2 translator, converting the checkpoint on first use.
+        The converted model is stored once as float16 and quantized to `compute_type` when it's loaded.
+        """
+        model_dir = os.path.join("models", "NLLB", "ctranslate2", model_size.split("/")[-1])
+        if not os.path.exists(os.path.join(model_dir, "model.bin")):
+            print(f"\nConverting {model_size} to CTranslate2..\n")
+            progress(0, desc="Converting NLLB Model to CTranslate2..")
+            model_path = huggingface_hub.snapshot_download(repo_id=model_size, cache_dir=os.path.join("models", "NLLB"))
+            converter = ctranslate2.converters.TransformersConverter(model_path)
+            converter.convert(model_dir, quantization="float16", force=True)
+        return ctranslate2.Translator(model_dir, device=self.ct2_device, compute_type=compute_type)
+
+    def get_pipeline(self,
+                     src_lang: str,
+                     tgt_lang: str):
+        """
+        Returns the translation pipeline of the current model for the language pair.
+        Pipelines are cached per (model, src_lang, tgt_lang) and the least recently used one is
+        dropped when there are more than `self.max_cached_pipelines`.
+        """
+        key = (self.current_model_key, src_lang, tgt_lang)
+        if key in self.pipelines:
+            self.pipelines.move_to_end(key)
+            return self.pipelines[key]
+
+        if self.translator is not None:
+            self.pipelines[key] = CTranslate2TranslationPipeline(translator=self.translator,
+                                                                 tokenizer=self.tokenizer,
+                                                                 src_lang=src_lang,
+                                                                 tgt_lang=tgt_lang)
+        else:
+            self.pipelines[key] = transformers.pipeline("translation",
+                                                        model=self.model,
+                                                        tokenizer=self.tokenizer,
+                                                        src_lang=src_lang,
+                                                        tgt_lang=tgt_lang,
+                                                        device=self.device)
+        while len(self.pipelines) > self.max_cached_pipelines:
+            self.pipelines.popitem(last=False)
+        return self.pipelines[key]
+
+
+class CTranslate2TranslationPipeline:
+    """Callable like a transformers translation pipeline, but translates with a CTranslate2 translator"""
+    def __init__(self,
+                 translator: "ctranslate2.Translator",
+                 tokenizer,
+                 src_lang: str,
+                 tgt_lang: str):
+        self.translator = translator
+        self.tokenizer = tokenizer
+        self.src_lang = src_lang
+        self.tgt_lang = tgt_lang
+
+    def __call__(self, texts, batch_size: int = 1):
+        if isinstance(texts, str):
+            texts = [texts]
+        # The tokenizer is shared between the pipelines of every language pair
+        self.tokenizer.src_lang = self.src_lang
+        sources = [self.tokenizer.convert_ids_to_tokens(self.tokenizer.encode(text)) for text in texts]
+        results = self.translator.translate_batch(sources,
+                                                  target_prefix=[[self.tgt_lang]] * len(sources),
+                                                  max_batch_size=batch_size)
+        # The first token of every hypothesis is the target language prefix
+        return [{'translation_text': self.tokenizer.decode(self.tokenizer.convert_tokens_to_ids(result.hypotheses[0][1:]))}
+                for result in results]
+
+
 NLLB_AVAILABLE_LANGS = {
     "Acehnese (Arabic script)": "ace_Arab",
     "Acehnese (Latin script)": "ace_Latn",
@@ -0,0 +1,55 @@
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator
+
+DEFAULT_PREFETCH_DEPTH = 2
+
+_DONE = object()
+
+
+def prefetch(items: Iterable,
+             load_fn: Callable[[Any], Any],
+             depth: int = DEFAULT_PREFETCH_DEPTH) -> Iterator:
+    """
+    Yields `load_fn(item)` for every item in order, while a background thread already runs `load_fn`
+    on up to `depth` upcoming items. Used to decode the next audio while the model transcribes the current one.
+    An exception raised by `load_fn` is raised here when its item is reached.
+    """
+    loaded = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def put(value) -> bool:
+        # Give up when the consumer stopped iterating, instead of blocking on a full queue forever
+        while not stop.is_set():
+            try:
+                loaded.put(value, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                try:
+                    value = (True, load_fn(item))
+                except Exception as e:
+                    value = (False, e)
+                if not put(value):
+                    return
+        finally:
+            put(_DONE)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            value = loaded.get()
+            if value is _DONE:
+                break
+            succeeded, result = value
+            if not succeeded:
+                raise result
+            yield result
+    finally:
+        stop.set()
@@ -0,0 +1,20 @@
+import sys
+from typing import Callable
+
+# Called as progress(fraction, desc=...), like gr.Progress
+ProgressCallback = Callable[..., None]
+
+
+def no_progress(*args, **kwargs):
+    pass
+
+
+def default_progress() -> ProgressCallback:
+    """
+    Default `progress` of the handlers. It is gr.Progress() when the UI has imported gradio, so that Gradio
+    injects its progress tracker, and a no-op otherwise so the CLI and worker processes never import gradio.
+    """
+    gradio = sys.modules.get("gradio")
+    if gradio is None:
+        return no_progress
+    return gradio.Progress()
@@ -1,135 +1,383 @@
+import os
 import re
+from array import array
+from typing import NamedTuple, Optional
+
+
+def split_time(time):
+    """Splits seconds into (hours, minutes, seconds, milliseconds), truncating each part"""
+    whole_seconds = int(time)
+    milliseconds = int((time - whole_seconds) * 1000)
+    minutes, seconds = divmod(whole_seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return hours, minutes, seconds, milliseconds
 
 
 def timeformat_srt(time):
-    hours = time // 3600
-    minutes = (time - hours * 3600) // 60
-    seconds = time - hours * 3600 - minutes * 60
-    milliseconds = (time - int(time)) * 1000
-    return f"{int(hours):02d}:{int(minutes):02d}:{int(seconds):02d},{int(milliseconds):03d}"
+    hours, minutes, seconds, milliseconds = split_time(time)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
 
 
 def timeformat_vtt(time):
-    hours = time // 3600
-    minutes = (time - hours * 3600) // 60
-    seconds = time - hours * 3600 - minutes * 60
-    milliseconds = (time - int(time)) * 1000
-    return f"{int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}.{int(milliseconds):03d}"
+    hours, minutes, seconds, milliseconds = split_time(time)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
 
 
 def write_file(subtitle, output_file):
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
     with open(output_file, 'w', encoding='utf-8') as f:
         f.write(subtitle)
 
 
-def get_srt(segments):
-    output = ""
-    for i, segment in enumerate(segments):
-        output += f"{i + 1}\n"
-        output += f"{timeformat_srt(segment['start'])} --> {timeformat_srt(segment['end'])}\n"
-        if segment['text'].startswith(' '):
-            segment['text'] = segment['text'][1:]
-        output += f"{segment['text']}\n\n"
-    return output
+SUBTITLE_EXTENSIONS = {
+    "SRT": ".srt",
+    "WebVTT": ".vtt",
+    "txt": ".txt",
+}
 
 
-def get_vtt(segments):
-    output = "WebVTT\n\n"
-    for i, segment in enumerate(segments):
-        output += f"{i + 1}\n"
-        output += f"{timeformat_vtt(segment['start'])} --> {timeformat_vtt(segment['end'])}\n"
-        if segment['text'].startswith(' '):
-            segment['text'] = segment['text'][1:]
-        output += f"{segment['text']}\n\n"
-    return output
+def get_cue_times(segment):
+    """
+    Returns the start and end of the cue of a segment.
+    Segments with word timestamps are timed to their first and last word, which is tighter than the
+    segment timestamps when the segment spans leading or trailing silence.
+    """
+    words = segment.get('words')
+    if words is not None and len(words):
+        return float(words.starts[0]), float(words.ends[-1])
+    return segment['start'], segment['end']
 
 
-def get_txt(segments):
-    output = ""
-    for i, segment in enumerate(segments):
-        if segment['text'].startswith(' '):
-            segment['text'] = segment['text'][1:]
-        output += f"{segment['text']}\n"
-    return output
+def format_srt_cue(index, segment):
+    text = segment['text'][1:] if segment['text'].startswith(' ') else segment['text']
+    start, end = get_cue_times(segment)
+    return f"{index}\n{timeformat_srt(start)} --> {timeformat_srt(end)}\n{text}\n\n"
 
 
-def parse_srt(file_path):
-    """Reads SRT file and returns as dict"""
-    with open(file_path, 'r', encoding='utf-8') as file:
-        srt_data = file.read()
+def format_vtt_cue(index, segment):
+    text = segment['text'][1:] if segment['text'].startswith(' ') else segment['text']
+    start, end = get_cue_times(segment)
+    return f"{index}\n{timeformat_vtt(start)} --> {timeformat_vtt(end)}\n{text}\n\n"
+
+
+def format_txt_cue(index, segment):
+    text = segment['text'][1:] if segment['text'].startswith(' ') else segment['text']
+    return f"{text}\n"
+
+
+class SubtitleStreamWriter:
+    """
+    Writes subtitle cues to a file one at a time, as soon as they are transcribed.
+    Every cue is flushed to disk, so a crash keeps everything written so far.
+    """
+    CUE_FORMATTERS = {
+        "SRT": format_srt_cue,
+        "WebVTT": format_vtt_cue,
+        "txt": format_txt_cue,
+    }
+
+    def __init__(self, output_path, file_format):
+        self.output_path = output_path
+        self.format_cue = self.CUE_FORMATTERS[file_format]
+        self.cue_count = 0
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        self.file = open(output_path, 'w', encoding='utf-8')
+        if file_format == "WebVTT":
+            self.file.write("WebVTT\n\n")
+
+    def write(self, segment):
+        """Appends a segment as the next cue and returns the written text"""
+        self.cue_count += 1
+        cue = self.format_cue(self.cue_count, segment)
+        self.file.write(cue)
+        self.file.flush()
+        return cue
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class Cue(NamedTuple):
+    """A parsed subtitle cue. Times are held as integer milliseconds so they round-trip exactly."""
+    index: str
+    start_ms: int
+    end_ms: int
+    text: str
+    settings: str = ""
+
+    @property
+    def start(self):
+        return self.start_ms / 1000
+
+    @property
+    def end(self):
+        return self.end_ms / 1000
+
+
+VTT_METADATA_BLOCKS = (b"NOTE", b"STYLE", b"REGION")
+
+
+def parse_timestamp(timestamp):
+    """Parses "HH:MM:SS,mmm", "HH:MM:SS.mmm" or "MM:SS.mmm" into milliseconds"""
+    whole, _, fraction = timestamp.strip().replace(',', '.').partition('.')
+    seconds = 0
+    for part in whole.split(':'):
+        seconds = seconds * 60 + int(part)
+    return seconds * 1000 + int(fraction.ljust(3, '0')[:3] or 0)
+
+
+def format_timestamp(milliseconds, separator):
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{milliseconds:03d}"
+
+
+TIMING_LINE_PATTERN = re.compile(
+    r'\s*((?:\d+:)?\d+:\d+[,.]\d+)\s*-->\s*((?:\d+:)?\d+:\d+[,.]\d+)\s*(.*)'
+)
+
+
+def parse_timing_line(line):
+    """Parses a "start --> end [settings]" line into (start_ms, end_ms, settings)"""
+    match = TIMING_LINE_PATTERN.match(line)
+    if match is None:
+        raise ValueError(f"Invalid timing line: {line}")
+    start, end, settings = match.groups()
+    return parse_timestamp(start), parse_timestamp(end), settings.strip()
+
+
+def _make_cue(identifier, start_ms, end_ms, settings, text_lines):
+    while text_lines and not text_lines[-1]:
+        text_lines.pop()
+    text = b'\n'.join(text_lines).decode('utf-8', errors='replace')
+    return Cue(identifier.decode('utf-8', errors='replace'), start_ms, end_ms, text, settings)
+
+
+def iter_cues_with_offsets(f):
+    """
+    Yields (offset, Cue) for every cue of an SRT or WebVTT binary file handle, starting at its current position.
+    `offset` is the byte position where the cue starts, so the cue can be read again with `read_cue`.
+
+    Handles BOMs, CRLF line endings, WebVTT headers and NOTE/STYLE/REGION blocks, cue settings,
+    and blank lines inside cue text: a block only starts a new cue if it begins with a timing line
+    or an identifier followed by a timing line.
+    Lines are handled as bytes and only the text of each cue is decoded.
+    """
+    offset = f.tell()
+    at_file_start = offset == 0
+    skipping_block = False
+    after_blank = True
+    # Line right after a blank line, which is the identifier of the next cue if a timing line follows it
+    candidate = None
+    cue = None
+    text_lines = []
+
+    for raw_line in f:
+        line_offset = offset
+        offset += len(raw_line)
+        line = raw_line.rstrip(b'\r\n')
+
+        if at_file_start:
+            at_file_start = False
+            if line.startswith(b'\xef\xbb\xbf'):
+                line = line[3:]
+            if line[:6].upper() == b"WEBVTT":
+                skipping_block = True
+                continue
+
+        if not line or line.isspace():
+            after_blank = True
+            skipping_block = False
+            candidate = None
+            if cue is not None:
+                text_lines.append(b'')
+            continue
+
+        if skipping_block:
+            continue
+
+        if b'-->' in line:
+            try:
+                start_ms, end_ms, settings = parse_timing_line(line.decode('utf-8', errors='replace'))
+            except ValueError:
+                start_ms = None
+            if start_ms is not None:
+                cue_offset, identifier = line_offset, b''
+                if candidate is not None:
+                    cue_offset, identifier = candidate
+                    if cue is not None:
+                        text_lines.pop()
+                if cue is not None:
+                    yield cue[0], _make_cue(*cue[1:], text_lines)
+                cue = (cue_offset, identifier, start_ms, end_ms, settings)
+                text_lines = []
+                candidate = None
+                after_blank = False
+                continue
+
+        if after_blank:
+            if line.split(b' ', 1)[0] in VTT_METADATA_BLOCKS:
+                skipping_block = True
+                continue
+            candidate = (line_offset, line.strip())
+        else:
+            candidate = None
+        after_blank = False
+        if cue is not None:
+            text_lines.append(line)
 
-    data = []
-    blocks = srt_data.split('\n\n')
+    if cue is not None:
+        yield cue[0], _make_cue(*cue[1:], text_lines)
 
-    for block in blocks:
-        if block.strip() != '':
-            lines = block.strip().split('\n')
-            index = lines[0]
-            timestamp = lines[1]
-            sentence = ' '.join(lines[2:])
 
-            data.append({
-                "index": index,
-                "timestamp": timestamp,
-                "sentence": sentence
-            })
-    return data
+def iter_cues(f):
+    """Yields every Cue of an SRT or WebVTT binary file handle without reading the whole file into memory"""
+    for _, cue in iter_cues_with_offsets(f):
+        yield cue
+
+
+def build_cue_index(file_path):
+    """Returns the byte offsets of every cue in the file, to seek to a cue with `read_cue` without re-parsing"""
+    with open(file_path, 'rb') as f:
+        return array('q', (offset for offset, _ in iter_cues_with_offsets(f)))
+
+
+def read_cue(f, cue_index, n):
+    """Reads the n-th cue of a binary file handle using the offsets from `build_cue_index`"""
+    f.seek(cue_index[n])
+    for _, cue in iter_cues_with_offsets(f):
+        return cue
+    raise IndexError(n)
+
+
+def cue_to_dict(cue, number, separator):
+    return {
+        "index": cue.index or str(number),
+        "timestamp": f"{format_timestamp(cue.start_ms, separator)} --> {format_timestamp(cue.end_ms, separator)}"
+                     + (f" {cue.settings}" if cue.settings else ""),
+        "sentence": ' '.join(line for line in cue.text.split('\n') if line)
+    }
+
+
+def parse_srt(file_path):
+    """Reads SRT file and returns as dict"""
+    with open(file_path, 'rb') as f:
+        return [cue_to_dict(cue, number, ',') for number, cue in enumerate(iter_cues(f), start=1)]
 
 
 def parse_vtt(file_path):
     """Reads WebVTT file and returns as dict"""
-    with open(file_path, 'r', encoding='utf-8') as file:
-        webvtt_data = file.read()
+    with open(file_path, 'rb') as f:
+        return [cue_to_dict(cue, number, '.') for number, cue in enumerate(iter_cues(f), start=1)]
 
-    data = []
-    blocks = webvtt_data.split('\n\n')
 
-    for block in blocks:
-        if block.strip() != '' and not block.strip().startswith("WebVTT"):
-            lines = block.strip().split('\n')
-            index = lines[0]
-            timestamp = lines[1]
-            sentence = ' '.join(lines[2:])
+def iter_srt(segments):
+    for index, segment in enumerate(segments, start=1):
+        yield format_srt_cue(index, segment)
 
-            data.append({
-                "index": index,
-                "timestamp": timestamp,
-                "sentence": sentence
-            })
 
-    return data
+def iter_vtt(segments):
+    yield "WebVTT\n\n"
+    for index, segment in enumerate(segments, start=1):
+        yield format_vtt_cue(index, segment)
 
 
-def get_serialized_srt(dicts):
-    output = ""
+def iter_txt(segments):
+    for index, segment in enumerate(segments, start=1):
+        yield format_txt_cue(index, segment)
+
+
+def get_srt(segments):
+    return "".join(iter_srt(segments))
+
+
+def get_vtt(segments):
+    return "".join(iter_vtt(segments))
+
+
+def get_txt(segments):
+    return "".join(iter_txt(segments))
+
+
+def write_srt(segments, f):
+    """Writes segments as SRT to an open text file handle without building the whole string"""
+    f.writelines(iter_srt(segments))
+
+
+def write_vtt(segments, f):
+    """Writes segments as WebVTT to an open text file handle without building the whole string"""
+    f.writelines(iter_vtt(segments))
+
+
+def write_txt(segments, f):
+    """Writes the text of segments to an open text file handle without building the whole string"""
+    f.writelines(iter_txt(segments))
+
+
+def iter_serialized_srt(dicts):
     for dic in dicts:
-        output += f'{dic["index"]}\n'
-        output += f'{dic["timestamp"]}\n'
-        output += f'{dic["sentence"]}\n\n'
-    return output
+        yield f'{dic["index"]}\n{dic["timestamp"]}\n{dic["sentence"]}\n\n'
 
 
-def get_serialized_vtt(dicts):
-    output = "WebVTT\n\n"
+def iter_serialized_vtt(dicts):
+    yield "WebVTT\n\n"
     for dic in dicts:
-        output += f'{dic["index"]}\n'
-        output += f'{dic["timestamp"]}\n'
-        output += f'{dic["sentence"]}\n\n'
-    return output
+        yield f'{dic["index"]}\n{dic["timestamp"]}\n{dic["sentence"]}\n\n'
+
+
+def get_serialized_srt(dicts):
+    return "".join(iter_serialized_srt(dicts))
 
 
-def safe_filename(name):
-    from app import _args
-    INVALID_FILENAME_CHARS = r'[<>:"/\\|?*\x00-\x1f]'
-    safe_name = re.sub(INVALID_FILENAME_CHARS, '_', name)
-    if not _args.colab:
+def get_serialized_vtt(dicts):
+    return "".join(iter_serialized_vtt(dicts))
+
+
+# Colab can't download files with long names
+COLAB_MAX_FILENAME_LENGTH = 20
+INVALID_FILENAME_CHARS = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+
+def safe_filename(name, max_length=None):
+    """Replaces the characters that aren't allowed in file names, and truncates the name to `max_length` if given"""
+    safe_name = INVALID_FILENAME_CHARS.sub('_', name)
+    if max_length is None:
         return safe_name
-    # Truncate the filename if it exceeds the max_length (20)
-    if len(safe_name) > 20:
+    # Truncate the filename if it exceeds the max_length
+    if len(safe_name) > max_length:
         file_extension = safe_name.split('.')[-1]
-        if len(file_extension) + 1 < 20:
-            truncated_name = safe_name[:20 - len(file_extension) - 1]
+        if len(file_extension) + 1 < max_length:
+            truncated_name = safe_name[:max_length - len(file_extension) - 1]
             safe_name = truncated_name + '.' + file_extension
         else:
-            safe_name = safe_name[:20]
+            safe_name = safe_name[:max_length]
     return safe_name
+
+
+class OutputConfig(NamedTuple):
+    """
+    Where and how the engines write their output files.
+    The entry point (app.py or cli.py) creates it from its arguments and passes it to the engines,
+    so nothing that writes files has to import the entry point.
+    """
+    output_dir: str = "outputs"
+    # Output file names are truncated to this length, e.g. on Colab. None keeps them whole.
+    max_filename_length: Optional[int] = None
+
+    @property
+    def translations_dir(self) -> str:
+        return os.path.join(self.output_dir, "translations")
+
+    @property
+    def timings_dir(self) -> str:
+        return os.path.join(self.output_dir, "timings")
+
+    def safe_filename(self, name) -> str:
+        return safe_filename(name, max_length=self.max_filename_length)
@@ -0,0 +1,140 @@
+import os
+import json
+import hashlib
+import functools
+import threading
+import numpy as np
+from typing import List, Optional, Union, BinaryIO
+
+from modules.word_timestamps import WordTimestamps
+
+DEFAULT_CACHE_DIR = os.path.join("outputs", "cache", "transcriptions")
+DEFAULT_MAX_CACHE_SIZE_MB = 512
+
+
+def hash_file(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Returns the sha256 of the file content without loading the whole file into memory.
+    The hash is remembered until the file is modified, since the transcription and audio caches both hash every input.
+    """
+    stat = os.stat(file_path)
+    return _hash_file(os.path.realpath(file_path), stat.st_mtime_ns, stat.st_size, chunk_size)
+
+
+@functools.lru_cache(maxsize=256)
+def _hash_file(file_path: str, mtime_ns: int, size: int, chunk_size: int) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def hash_audio(audio: Union[str, BinaryIO, np.ndarray]) -> Optional[str]:
+    """Returns the content hash of an audio path or numpy array, or None if it can't be hashed without consuming it"""
+    if isinstance(audio, str) and os.path.isfile(audio):
+        return hash_file(audio)
+    if isinstance(audio, np.ndarray):
+        return hashlib.sha256(np.ascontiguousarray(audio).data).hexdigest()
+    return None
+
+
+def to_json(obj):
+    """`default` of json.dump for the segments: word timestamps are stored as dicts, anything else isn't serializable"""
+    if isinstance(obj, WordTimestamps):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class TranscriptionCache:
+    """
+    On-disk cache of transcribed segments, keyed by the audio content hash and the decoding parameters.
+    Any subtitle format can be regenerated from a cached segment list without running Whisper again.
+    The least recently used entries are removed when the cache exceeds `max_size_mb`.
+    """
+    def __init__(self,
+                 cache_dir: str = DEFAULT_CACHE_DIR,
+                 max_size_mb: float = DEFAULT_MAX_CACHE_SIZE_MB):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(audio_hash: str, **decode_params) -> str:
+        """
+        Builds the cache key of an audio from its content hash and the parameters that change the result,
+        e.g. engine, model_size, compute_type, lang, istranslate, beam_size and the thresholds.
+        """
+        params = json.dumps(decode_params, sort_keys=True, default=str)
+        return hashlib.sha256(f"{audio_hash}:{params}".encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[List[dict]]:
+        path = self._get_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                segments = json.load(f)
+            for segment in segments:
+                if "words" in segment:
+                    segment["words"] = WordTimestamps.from_dict(segment["words"])
+            # Mark the entry as recently used for the eviction
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return segments
+
+    def put(self, key: str, segments: List[dict]):
+        path = self._get_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(segments, f, ensure_ascii=False, default=to_json)
+        except TypeError:
+            os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total_size = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total_size <= self.max_size_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total_size -= size
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def format_stats(self) -> str:
+        stats = self.stats()
+        return (f"Transcription cache hits: {stats['hits']}, misses: {stats['misses']}, "
+                f"evictions: {stats['evictions']}, hit rate: {stats['hit_rate']:.0%}")
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
@@ -0,0 +1,125 @@
+import os
+import sqlite3
+import threading
+import unicodedata
+from typing import Callable, List, Tuple
+
+DEFAULT_TRANSLATION_MEMORY_PATH = os.path.join("outputs", "translations", "translation_memory.db")
+# SQLite allows 999 host parameters per query in old versions
+LOOKUP_CHUNK_SIZE = 500
+
+
+def normalize_text(text: str) -> str:
+    """Normalizes unicode and whitespace so that the same line formatted differently is found in the memory"""
+    return unicodedata.normalize("NFC", " ".join(text.split()))
+
+
+class TranslationMemory:
+    """
+    Persistent store of translated lines, keyed by (engine, model, src_lang, tgt_lang, normalized text).
+    Translation engines look lines up here before translating them, so recurring lines are only translated once.
+    """
+    def __init__(self, db_path: str = DEFAULT_TRANSLATION_MEMORY_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS translations (
+                engine TEXT NOT NULL,
+                model TEXT NOT NULL,
+                src_lang TEXT NOT NULL,
+                tgt_lang TEXT NOT NULL,
+                source_text TEXT NOT NULL,
+                translated_text TEXT NOT NULL,
+                PRIMARY KEY (engine, model, src_lang, tgt_lang, source_text)
+            ) WITHOUT ROWID
+        """)
+        self.connection.commit()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def lookup(self,
+               texts: List[str],
+               engine: str,
+               model: str,
+               src_lang: str,
+               tgt_lang: str) -> dict:
+        """Returns {normalized text: translation} for the texts found in the memory"""
+        normalized_texts = list({normalize_text(text) for text in texts})
+        found = {}
+        with self._lock:
+            for chunk_start in range(0, len(normalized_texts), LOOKUP_CHUNK_SIZE):
+                chunk = normalized_texts[chunk_start:chunk_start + LOOKUP_CHUNK_SIZE]
+                rows = self.connection.execute(
+                    f"SELECT source_text, translated_text FROM translations "
+                    f"WHERE engine = ? AND model = ? AND src_lang = ? AND tgt_lang = ? "
+                    f"AND source_text IN ({', '.join('?' * len(chunk))})",
+                    [engine, model, src_lang, tgt_lang, *chunk]
+                )
+                found.update(rows)
+        return found
+
+    def store(self,
+              texts: List[str],
+              translations: List[str],
+              engine: str,
+              model: str,
+              src_lang: str,
+              tgt_lang: str):
+        with self._lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?)",
+                [(engine, model, src_lang, tgt_lang, normalize_text(text), translation)
+                 for text, translation in zip(texts, translations)]
+            )
+            self.connection.commit()
+
+    def translate(self,
+                  texts: List[str],
+                  translate_fn: Callable[[List[str]], List[str]],
+                  engine: str,
+                  model: str,
+                  src_lang: str,
+                  tgt_lang: str) -> Tuple[List[str], int]:
+        """
+        Translate texts, calling `translate_fn` only for the lines that aren't in the memory yet.
+        Every distinct missing line is translated once, even if it repeats in `texts`.
+
+        Returns
+        ----------
+        translations: List[str]
+            Translations in the same order as `texts`
+        hits: int
+            Number of texts that were found in the memory
+        """
+        key = dict(engine=engine, model=model, src_lang=src_lang, tgt_lang=tgt_lang)
+        found = self.lookup(texts, **key)
+        normalized_texts = [normalize_text(text) for text in texts]
+
+        hits = sum(1 for normalized_text in normalized_texts if normalized_text in found)
+        # dict keeps the first-seen order of the missing lines
+        missing = list(dict.fromkeys(normalized_text for normalized_text in normalized_texts
+                                     if normalized_text and normalized_text not in found))
+        if missing:
+            translated = translate_fn(missing)
+            self.store(missing, translated, **key)
+            found.update(zip(missing, translated))
+
+        with self._lock:
+            self.hits += hits
+            self.misses += len(missing)
+        return [found.get(normalized_text, '') for normalized_text in normalized_texts], hits
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def format_stats(self) -> str:
+        stats = self.stats()
+        return (f"Translation memory hits: {stats['hits']}, misses: {stats['misses']}, "
+                f"hit rate: {stats['hit_rate']:.0%}")
@@ -0,0 +1,77 @@
+import numpy as np
+from typing import List, Optional, Tuple
+
+from modules.lazy import lazy_import
+
+# faster_whisper.vad is reached through the package, which is only imported once the VAD runs
+faster_whisper = lazy_import("faster_whisper")
+
+SAMPLING_RATE = 16000
+DEFAULT_VAD_THRESHOLD = 0.5
+DEFAULT_MIN_SILENCE_DURATION_MS = 2000
+
+
+def get_vad_options(threshold: float = DEFAULT_VAD_THRESHOLD,
+                    min_silence_duration_ms: int = DEFAULT_MIN_SILENCE_DURATION_MS
+                    ) -> "faster_whisper.vad.VadOptions":
+    return faster_whisper.vad.VadOptions(threshold=threshold, min_silence_duration_ms=int(min_silence_duration_ms))
+
+
+def remove_silence(audio: np.ndarray,
+                   vad_options: "faster_whisper.vad.VadOptions"
+                   ) -> Tuple[np.ndarray, Optional["faster_whisper.vad.SpeechTimestampsMap"]]:
+    """
+    Drops the non-speech regions of a 16kHz audio with the Silero VAD model bundled with faster-whisper.
+
+    Returns
+    ----------
+    speech_audio: np.ndarray
+        The speech regions of `audio`, concatenated
+    timestamps_map: Optional[SpeechTimestampsMap]
+        Map from the timeline of `speech_audio` back to the timeline of `audio`. None if there is no speech.
+    """
+    speech_chunks = faster_whisper.vad.get_speech_timestamps(audio, vad_options)
+    if not speech_chunks:
+        return np.array([], dtype=np.float32), None
+    return (faster_whisper.vad.collect_chunks(audio, speech_chunks),
+            faster_whisper.vad.SpeechTimestampsMap(speech_chunks, SAMPLING_RATE))
+
+
+def restore_timestamps(segments: List[dict],
+                       timestamps_map: "faster_whisper.vad.SpeechTimestampsMap") -> List[dict]:
+    """Moves the start and end of the segments decoded from the speech audio back to the original timeline"""
+    for segment in segments:
+        segment["start"] = timestamps_map.get_original_time(segment["start"])
+        segment["end"] = timestamps_map.get_original_time(segment["end"])
+        if "words" in segment:
+            segment["words"] = segment["words"].map_times(timestamps_map.get_original_time)
+    return segments
+
+
+def format_vad_stats(transcription_infos: List[dict]) -> str:
+    """
+    Summarizes how much silence the VAD removed from the jobs and the inference time that saved.
+    The saving is estimated from the inference time per second of speech of the same jobs, since the
+    skipped silence was never decoded. If the jobs measured the VAD itself ("vad_time"), its cost is
+    subtracted too. Returns an empty string if no job was filtered, e.g. when VAD is disabled or the
+    results were cached.
+    """
+    infos = [info for info in transcription_infos if info and info.get("vad_filter")]
+    if not infos:
+        return ""
+    duration = sum(info["duration"] for info in infos)
+    speech_duration = sum(info["duration_after_vad"] for info in infos)
+    skipped_duration = duration - speech_duration
+    skipped_ratio = skipped_duration / duration if duration else 0.0
+    vad_stats = f"VAD: skipped {skipped_duration:.1f}s of silence ({skipped_ratio:.0%} of {duration:.1f}s of audio)"
+
+    inference_time = sum(info.get("inference_time", 0.0) for info in infos)
+    if speech_duration and inference_time:
+        inference_time_per_second = inference_time / speech_duration
+        saved_time = inference_time_per_second * skipped_duration
+        vad_stats += (f", saving an estimated {saved_time:.1f}s of inference "
+                      f"at {inference_time_per_second:.2f}s per second of speech")
+        if any("vad_time" in info for info in infos):
+            vad_time = sum(info.get("vad_time", 0.0) for info in infos)
+            vad_stats += f", {saved_time - vad_time:.1f}s after the {vad_time:.1f}s the VAD took"
+    return vad_stats + "."
@@ -1,22 +1,38 @@
-import whisper
-import gradio as gr
 import time
 import os
-from typing import BinaryIO, Union, Tuple, List
+import threading
+from typing import BinaryIO, Union, Tuple, List, Optional
 import numpy as np
 from datetime import datetime
-import torch
-
-from .base_interface import BaseInterface
-from modules.subtitle_manager import get_srt, get_vtt, get_txt, write_file, safe_filename
+from concurrent.futures import ThreadPoolExecutor
+
+from .base_interface import BaseInterface, make_warmup_audio, WARMUP_DECODE_PARAMS
+from modules.model_pool import ModelPool, estimate_model_memory, DEFAULT_MEMORY_BUDGET_GB
+from modules.transcription_cache import TranscriptionCache, DEFAULT_MAX_CACHE_SIZE_MB
+from modules.audio_cache import AudioCache, DEFAULT_MAX_AUDIO_CACHE_SIZE_MB
+from modules.word_timestamps import WordTimestamps
+from modules.vad import SAMPLING_RATE, get_vad_options, remove_silence, restore_timestamps
+from modules.subtitle_manager import get_srt, get_vtt, get_txt, write_file, OutputConfig
 from modules.youtube_manager import get_ytdata, get_ytaudio
+from modules.pipeline import prefetch, DEFAULT_PREFETCH_DEPTH
+from modules.job_timings import JobTimings
+from modules.progress import ProgressCallback, default_progress
+from modules.lazy import lazy_import
+
+# Only needed once the engine is constructed, so the app starts without them
+whisper = lazy_import("whisper")
+torch = lazy_import("torch")
 
 DEFAULT_MODEL_SIZE = "large-v3"
 
 
 class WhisperInference(BaseInterface):
-    def __init__(self):
-        super().__init__()
+    def __init__(self,
+                 model_memory_budget_gb: float = DEFAULT_MEMORY_BUDGET_GB,
+                 transcription_cache_size_mb: float = DEFAULT_MAX_CACHE_SIZE_MB,
+                 audio_cache_size_mb: float = DEFAULT_MAX_AUDIO_CACHE_SIZE_MB,
+                 output_config: Optional[OutputConfig] = None):
+        super().__init__(output_config=output_config)
         self.current_model_size = None
         self.model = None
         self.available_models = whisper.available_models()
@@ -25,6 +41,13 @@ class WhisperInference(BaseInterface):
         self.available_compute_types = ["float16", "float32"]
         self.current_compute_type = "float16" if self.device == "cuda" else "float32"
         self.default_beam_size = 1
+        self.model_pool = ModelPool(memory_budget_gb=model_memory_budget_gb)
+        # Number of files decoded ahead of the one being transcribed
+        self.prefetch_depth = DEFAULT_PREFETCH_DEPTH
+        if transcription_cache_size_mb > 0:
+            self.transcription_cache = TranscriptionCache(max_size_mb=transcription_cache_size_mb)
+        if audio_cache_size_mb > 0:
+            self.audio_cache = AudioCache(max_size_mb=audio_cache_size_mb)
 
     def transcribe_file(self,
                         fileobjs: list,
@@ -37,7 +60,11 @@ class WhisperInference(BaseInterface):
                         log_prob_threshold: float,
                         no_speech_threshold: float,
                         compute_type: str,
-                        progress=gr.Progress()) -> list:
+                        vad_filter: bool,
+                        vad_threshold: float,
+                        vad_min_silence_duration_ms: int,
+                        word_timestamps: bool,
+                        progress=default_progress()) -> list:
         """
         Write subtitle file from Files
 
@@ -67,6 +94,16 @@ class WhisperInference(BaseInterface):
             consider the segment as silent.
         compute_type: str
             compute type from gr.Dropdown().
+        vad_filter: bool
+            Boolean value from gr.Checkbox() that determines whether to remove the non-speech regions
+            of the audio with the Silero VAD before decoding. Timestamps stay on the original timeline.
+        vad_threshold: float
+            float value from gr.Number(). Audio windows with a speech probability above this value are speech.
+        vad_min_silence_duration_ms: int
+            int value from gr.Number(). Silences shorter than this are kept as part of the speech.
+        word_timestamps: bool
+            Boolean value from gr.Checkbox() that determines whether to extract the timestamps of every word.
+            The words are kept in the "words" of the segments, and the cues are timed to their first and last word.
         progress: gr.Progress
             Indicator to show progress directly in gradio.
             I use a forked version of whisper for this. To see more info : https://github.com/jhj0517/jhj0517-whisper/tree/add-progress-callback
@@ -78,33 +115,88 @@ class WhisperInference(BaseInterface):
         Files to return to gr.Files()
         """
         try:
-            self.update_model_if_needed(model_size=model_size, compute_type=compute_type, progress=progress)
+            timings = JobTimings(engine=type(self).__name__, model_size=model_size, compute_type=compute_type)
+            with timings.stage("model_load"):
+                self.update_model_if_needed(model_size=model_size, compute_type=compute_type, progress=progress)
+
+            # The prefetched files stay pinned in the audio cache until they are transcribed, so the cache
+            # doesn't remove their file before `transcribe` maps it from there, instead of decoding it again
+            pinned_paths = {}
+            pin_lock = threading.Lock()
+            released = False
+
+            def load(item):
+                index, fileobj = item
+                ingest_info = {}
+                audio = self.load_audio(fileobj.name, ingest_info, pin=True)
+                if isinstance(audio, np.memmap):
+                    with pin_lock:
+                        if not released:
+                            pinned_paths[index] = audio.filename
+                            return index, fileobj, ingest_info
+                    # Loaded in the background after the job stopped
+                    self.audio_cache.unpin(audio.filename)
+                return index, fileobj, ingest_info
+
+            def unpin(index):
+                with pin_lock:
+                    path = pinned_paths.pop(index, None)
+                if path is not None:
+                    self.audio_cache.unpin(path)
+
+            # The next files are decoded into the audio cache while the current one is transcribed,
+            # and the subtitles are written in the background.
+            writer = ThreadPoolExecutor(max_workers=1)
+
+            def write_file_timed(**kwargs):
+                with timings.stage("write"):
+                    return self.generate_and_write_file(**kwargs)
+
+            files = []
+            progress(0, desc="正在加载音频……")
+            loaded_files = prefetch(enumerate(fileobjs), load, depth=self.prefetch_depth)
+            try:
+                for index, fileobj, ingest_info in loaded_files:
+                    result, elapsed_time, transcription_info = self.transcribe(audio=fileobj.name,
+                                                                               lang=lang,
+                                                                               istranslate=istranslate,
+                                                                               beam_size=beam_size,
+                                                                               log_prob_threshold=log_prob_threshold,
+                                                                               no_speech_threshold=no_speech_threshold,
+                                                                               vad_filter=vad_filter,
+                                                                               vad_threshold=vad_threshold,
+                                                                               vad_min_silence_duration_ms=vad_min_silence_duration_ms,
+                                                                               word_timestamps=word_timestamps,
+                                                                               compute_type=compute_type,
+                                                                               progress=progress
+                                                                               )
+                    unpin(index)
+                    if transcription_info:
+                        transcription_info.update(ingest_info)
+                    progress(1, desc="完成！")
+
+                    file_name, file_ext = os.path.splitext(os.path.basename(fileobj.name))
+                    file_name = self.output_config.safe_filename(file_name)
+                    write_future = writer.submit(write_file_timed,
+                                                 file_name=file_name,
+                                                 transcribed_segments=result,
+                                                 add_timestamp=add_timestamp,
+                                                 file_format=file_format)
+                    files.append((file_name, write_future, elapsed_time, transcription_info))
+            finally:
+                loaded_files.close()
+                with pin_lock:
+                    released = True
+                    remaining_indexes = list(pinned_paths)
+                for index in remaining_indexes:
+                    unpin(index)
+            writer.shutdown(wait=True)
 
             files_info = {}
-            for fileobj in fileobjs:
-                progress(0, desc="正在加载音频……")
-                audio = whisper.load_audio(fileobj.name)
-
-                result, elapsed_time = self.transcribe(audio=audio,
-                                                       lang=lang,
-                                                       istranslate=istranslate,
-                                                       beam_size=beam_size,
-                                                       log_prob_threshold=log_prob_threshold,
-                                                       no_speech_threshold=no_speech_threshold,
-                                                       compute_type=compute_type,
-                                                       progress=progress
-                                                       )
-                progress(1, desc="完成！")
-
-                file_name, file_ext = os.path.splitext(os.path.basename(fileobj.name))
-                file_name = safe_filename(file_name)
-                subtitle, file_path = self.generate_and_write_file(
-                    file_name=file_name,
-                    transcribed_segments=result,
-                    add_timestamp=add_timestamp,
-                    file_format=file_format
-                )
-                files_info[file_name] = {"subtitle": subtitle, "elapsed_time": elapsed_time, "path":  file_path}
+            for file_name, write_future, elapsed_time, transcription_info in files:
+                subtitle, file_path = write_future.result()
+                files_info[file_name] = {"subtitle": subtitle, "elapsed_time": elapsed_time, "path":  file_path,
+                                         "transcription_info": transcription_info}
 
             total_result = ''
             total_time = 0
@@ -114,7 +206,10 @@ class WhisperInference(BaseInterface):
                 total_result += f"{info['subtitle']}"
                 total_time += info["elapsed_time"]
 
-            gr_str = f"Done in {self.format_time(total_time)}! Subtitle is in the outputs folder.\n\n{total_result}"
+            job_stats = self.format_job_stats([info["transcription_info"] for info in files_info.values()],
+                                              timings=timings)
+
+            gr_str = f"Done in {self.format_time(total_time)}! {job_stats}Subtitle is in the outputs folder.\n\n{total_result}"
             gr_file_path = [info['path'] for info in files_info.values()]
 
             return [gr_str, gr_file_path]
@@ -135,7 +230,11 @@ class WhisperInference(BaseInterface):
                            log_prob_threshold: float,
                            no_speech_threshold: float,
                            compute_type: str,
-                           progress=gr.Progress()) -> list:
+                           vad_filter: bool,
+                           vad_threshold: float,
+                           vad_min_silence_duration_ms: int,
+                           word_timestamps: bool,
+                           progress=default_progress()) -> list:
         """
         Write subtitle file from Youtube
 
@@ -165,6 +264,16 @@ class WhisperInference(BaseInterface):
             consider the segment as silent.
         compute_type: str
             compute type from gr.Dropdown().
+        vad_filter: bool
+            Boolean value from gr.Checkbox() that determines whether to remove the non-speech regions
+            of the audio with the Silero VAD before decoding. Timestamps stay on the original timeline.
+        vad_threshold: float
+            float value from gr.Number(). Audio windows with a speech probability above this value are speech.
+        vad_min_silence_duration_ms: int
+            int value from gr.Number(). Silences shorter than this are kept as part of the speech.
+        word_timestamps: bool
+            Boolean value from gr.Checkbox() that determines whether to extract the timestamps of every word.
+            The words are kept in the "words" of the segments, and the cues are timed to their first and last word.
         progress: gr.Progress
             Indicator to show progress directly in gradio.
             I use a forked version of whisper for this. To see more info : https://github.com/jhj0517/jhj0517-whisper/tree/add-progress-callback
@@ -176,31 +285,39 @@ class WhisperInference(BaseInterface):
         Files to return to gr.Files()
         """
         try:
-            self.update_model_if_needed(model_size=model_size, compute_type=compute_type, progress=progress)
+            timings = JobTimings(engine=type(self).__name__, model_size=model_size, compute_type=compute_type)
+            with timings.stage("model_load"):
+                self.update_model_if_needed(model_size=model_size, compute_type=compute_type, progress=progress)
 
             progress(0, desc="正在从Youtube加载音频……")
             yt = get_ytdata(youtubelink)
-            audio = whisper.load_audio(get_ytaudio(yt))
-
-            result, elapsed_time = self.transcribe(audio=audio,
-                                                   lang=lang,
-                                                   istranslate=istranslate,
-                                                   beam_size=beam_size,
-                                                   log_prob_threshold=log_prob_threshold,
-                                                   no_speech_threshold=no_speech_threshold,
-                                                   compute_type=compute_type,
-                                                   progress=progress)
+            audio = get_ytaudio(yt)
+
+            result, elapsed_time, transcription_info = self.transcribe(audio=audio,
+                                                                       lang=lang,
+                                                                       istranslate=istranslate,
+                                                                       beam_size=beam_size,
+                                                                       log_prob_threshold=log_prob_threshold,
+                                                                       no_speech_threshold=no_speech_threshold,
+                                                                       vad_filter=vad_filter,
+                                                                       vad_threshold=vad_threshold,
+                                                                       vad_min_silence_duration_ms=vad_min_silence_duration_ms,
+                                                                       word_timestamps=word_timestamps,
+                                                                       compute_type=compute_type,
+                                                                       progress=progress)
             progress(1, desc="完成！")
 
-            file_name = safe_filename(yt.title)
-            subtitle, file_path = self.generate_and_write_file(
-                file_name=file_name,
-                transcribed_segments=result,
-                add_timestamp=add_timestamp,
-                file_format=file_format
-            )
+            file_name = self.output_config.safe_filename(yt.title)
+            with timings.stage("write"):
+                subtitle, file_path = self.generate_and_write_file(
+                    file_name=file_name,
+                    transcribed_segments=result,
+                    add_timestamp=add_timestamp,
+                    file_format=file_format
+                )
 
-            gr_str = f"Done in {self.format_time(elapsed_time)}! Subtitle file is in the outputs folder.\n\n{subtitle}"
+            job_stats = self.format_job_stats([transcription_info], timings=timings)
+            gr_str = f"Done in {self.format_time(elapsed_time)}! {job_stats}Subtitle file is in the outputs folder.\n\n{subtitle}"
             return [gr_str, file_path]
         except Exception as e:
             print(f"转录Youtube视频出错: {str(e)}")
@@ -227,7 +344,11 @@ class WhisperInference(BaseInterface):
                        log_prob_threshold: float,
                        no_speech_threshold: float,
                        compute_type: str,
-                       progress=gr.Progress()) -> list:
+                       vad_filter: bool,
+                       vad_threshold: float,
+                       vad_min_silence_duration_ms: int,
+                       word_timestamps: bool,
+                       progress=default_progress()) -> list:
         """
         Write subtitle file from microphone
 
@@ -255,6 +376,16 @@ class WhisperInference(BaseInterface):
             consider the segment as silent.
         compute_type: str
             compute type from gr.Dropdown().
+        vad_filter: bool
+            Boolean value from gr.Checkbox() that determines whether to remove the non-speech regions
+            of the audio with the Silero VAD before decoding. Timestamps stay on the original timeline.
+        vad_threshold: float
+            float value from gr.Number(). Audio windows with a speech probability above this value are speech.
+        vad_min_silence_duration_ms: int
+            int value from gr.Number(). Silences shorter than this are kept as part of the speech.
+        word_timestamps: bool
+            Boolean value from gr.Checkbox() that determines whether to extract the timestamps of every word.
+            The words are kept in the "words" of the segments, and the cues are timed to their first and last word.
         progress: gr.Progress
             Indicator to show progress directly in gradio.
             I use a forked version of whisper for this. To see more info : https://github.com/jhj0517/jhj0517-whisper/tree/add-progress-callback
@@ -266,26 +397,34 @@ class WhisperInference(BaseInterface):
         Files to return to gr.Files()
         """
         try:
-            self.update_model_if_needed(model_size=model_size, compute_type=compute_type, progress=progress)
-
-            result, elapsed_time = self.transcribe(audio=micaudio,
-                                                   lang=lang,
-                                                   istranslate=istranslate,
-                                                   beam_size=beam_size,
-                                                   log_prob_threshold=log_prob_threshold,
-                                                   no_speech_threshold=no_speech_threshold,
-                                                   compute_type=compute_type,
-                                                   progress=progress)
+            timings = JobTimings(engine=type(self).__name__, model_size=model_size, compute_type=compute_type)
+            with timings.stage("model_load"):
+                self.update_model_if_needed(model_size=model_size, compute_type=compute_type, progress=progress)
+
+            result, elapsed_time, transcription_info = self.transcribe(audio=micaudio,
+                                                                       lang=lang,
+                                                                       istranslate=istranslate,
+                                                                       beam_size=beam_size,
+                                                                       log_prob_threshold=log_prob_threshold,
+                                                                       no_speech_threshold=no_speech_threshold,
+                                                                       vad_filter=vad_filter,
+                                                                       vad_threshold=vad_threshold,
+                                                                       vad_min_silence_duration_ms=vad_min_silence_duration_ms,
+                                                                       word_timestamps=word_timestamps,
+                                                                       compute_type=compute_type,
+                                                                       progress=progress)
             progress(1, desc="完成！")
 
-            subtitle, file_path = self.generate_and_write_file(
-                file_name="Mic",
-                transcribed_segments=result,
-                add_timestamp=True,
-                file_format=file_format
-            )
+            with timings.stage("write"):
+                subtitle, file_path = self.generate_and_write_file(
+                    file_name="Mic",
+                    transcribed_segments=result,
+                    add_timestamp=True,
+                    file_format=file_format
+                )
 
-            gr_str = f"Done in {self.format_time(elapsed_time)}! Subtitle file is in the outputs folder.\n\n{subtitle}"
+            job_stats = self.format_job_stats([transcription_info], timings=timings)
+            gr_str = f"Done in {self.format_time(elapsed_time)}! {job_stats}Subtitle file is in the outputs folder.\n\n{subtitle}"
             return [gr_str, file_path]
         except Exception as e:
             print(f"转录麦克风出错: {str(e)}")
@@ -294,17 +433,22 @@ class WhisperInference(BaseInterface):
             self.remove_input_files([micaudio])
 
     def transcribe(self,
-                   audio: Union[str, np.ndarray, torch.Tensor],
+                   audio: Union[str, np.ndarray, "torch.Tensor"],
                    lang: str,
                    istranslate: bool,
                    beam_size: int,
                    log_prob_threshold: float,
                    no_speech_threshold: float,
+                   vad_filter: bool,
+                   vad_threshold: float,
+                   vad_min_silence_duration_ms: int,
+                   word_timestamps: bool,
                    compute_type: str,
-                   progress: gr.Progress
-                   ) -> Tuple[List[dict], float]:
+                   progress: ProgressCallback
+                   ) -> Tuple[List[dict], float, dict]:
         """
         transcribe method for OpenAI's Whisper implementation.
+        Results are read from `self.transcription_cache` if the same audio was transcribed with the same parameters.
 
         Parameters
         ----------
@@ -326,6 +470,16 @@ class WhisperInference(BaseInterface):
             consider the segment as silent.
         compute_type: str
             compute type from gr.Dropdown().
+        vad_filter: bool
+            Boolean value from gr.Checkbox() that determines whether to remove the non-speech regions
+            of the audio with the Silero VAD before decoding. Timestamps stay on the original timeline.
+        vad_threshold: float
+            float value from gr.Number(). Audio windows with a speech probability above this value are speech.
+        vad_min_silence_duration_ms: int
+            int value from gr.Number(). Silences shorter than this are kept as part of the speech.
+        word_timestamps: bool
+            Boolean value from gr.Checkbox() that determines whether to extract the timestamps of every word.
+            The words are kept in the "words" of the segments, and the cues are timed to their first and last word.
         progress: gr.Progress
             Indicator to show progress directly in gradio.
 
@@ -335,9 +489,52 @@ class WhisperInference(BaseInterface):
             list of dicts that includes start, end timestamps and transcribed text
         elapsed_time: float
             elapsed time for transcription
+        transcription_info: dict
+            vad_filter, duration and duration_after_vad of the audio, vad_time, language, prepare_time and
+            inference_time in seconds, and the number of decoded tokens. Empty if the result was read from the cache.
         """
         start_time = time.time()
 
+        cache_key = self.get_cache_key(audio,
+                                       model_size=self.current_model_size,
+                                       compute_type=compute_type,
+                                       lang=lang,
+                                       istranslate=istranslate,
+                                       beam_size=beam_size,
+                                       log_prob_threshold=log_prob_threshold,
+                                       no_speech_threshold=no_speech_threshold,
+                                       vad_filter=vad_filter,
+                                       vad_threshold=vad_threshold,
+                                       vad_min_silence_duration_ms=vad_min_silence_duration_ms,
+                                       word_timestamps=word_timestamps)
+        if cache_key is not None:
+            cached_segments = self.transcription_cache.get(cache_key)
+            print(self.transcription_cache.format_stats())
+            if cached_segments is not None:
+                return cached_segments, time.time() - start_time, {}
+
+        timestamps_map = None
+        transcription_info = {"vad_filter": vad_filter}
+        audio = self.load_audio(audio, transcription_info)
+        if isinstance(audio, (np.ndarray, torch.Tensor)):
+            transcription_info["duration"] = len(audio) / SAMPLING_RATE
+        if vad_filter:
+            prepare_start = time.time()
+            progress(0, desc="正在检测语音……")
+            if isinstance(audio, str):
+                audio = whisper.load_audio(audio)
+            elif isinstance(audio, torch.Tensor):
+                audio = audio.cpu().numpy()
+            transcription_info["duration"] = len(audio) / SAMPLING_RATE
+            vad_start = time.time()
+            vad_options = get_vad_options(threshold=vad_threshold, min_silence_duration_ms=vad_min_silence_duration_ms)
+            audio, timestamps_map = remove_silence(audio, vad_options)
+            transcription_info["vad_time"] = time.time() - vad_start
+            transcription_info["duration_after_vad"] = len(audio) / SAMPLING_RATE
+            transcription_info["prepare_time"] = time.time() - prepare_start
+            if timestamps_map is None:
+                return [], time.time() - start_time, transcription_info
+
         def progress_callback(progress_value):
             progress(progress_value, desc="正在转录……")
 
@@ -345,40 +542,87 @@ class WhisperInference(BaseInterface):
             lang = None
 
         translatable_model = ["large", "large-v1", "large-v2", "large-v3"]
-        segments_result = self.model.transcribe(audio=audio,
-                                                language=lang,
-                                                verbose=False,
-                                                beam_size=beam_size,
-                                                logprob_threshold=log_prob_threshold,
-                                                no_speech_threshold=no_speech_threshold,
-                                                task="translate" if istranslate and self.current_model_size in translatable_model else "transcribe",
-                                                fp16=True if compute_type == "float16" else False,
-                                                progress_callback=progress_callback)["segments"]
+        # Language detection happens inside whisper's transcribe(), so it is part of the inference time
+        inference_start = time.time()
+        result = self.model.transcribe(audio=audio,
+                                       language=lang,
+                                       verbose=False,
+                                       beam_size=beam_size,
+                                       logprob_threshold=log_prob_threshold,
+                                       no_speech_threshold=no_speech_threshold,
+                                       word_timestamps=word_timestamps,
+                                       task="translate" if istranslate and self.current_model_size in translatable_model else "transcribe",
+                                       fp16=(compute_type or self.current_compute_type) == "float16",
+                                       progress_callback=progress_callback)
+        segments_result = result["segments"]
+        transcription_info.update(inference_time=time.time() - inference_start,
+                                  tokens=sum(len(segment["tokens"]) for segment in segments_result),
+                                  language=result["language"])
+        for segment in segments_result:
+            if "words" in segment:
+                segment["words"] = WordTimestamps.from_words(segment["words"])
+        if timestamps_map is not None:
+            segments_result = restore_timestamps(segments_result, timestamps_map)
         elapsed_time = time.time() - start_time
 
-        return segments_result, elapsed_time
+        if cache_key is not None:
+            self.transcription_cache.put(cache_key, segments_result)
+        return segments_result, elapsed_time, transcription_info
 
     def update_model_if_needed(self,
                                model_size: str,
                                compute_type: str,
-                               progress: gr.Progress,
+                               progress: ProgressCallback,
                                ):
         """
-        Initialize model if it doesn't match with current model setting
+        Initialize model if it doesn't match with current model setting.
+        Loaded models are kept in `self.model_pool`, so switching back to a model doesn't reload it from disk.
+        The compute type defaults to the current one, e.g. before the UI has loaded the choices.
         """
+        compute_type = compute_type or self.current_compute_type
         if compute_type != self.current_compute_type:
             self.current_compute_type = compute_type
-        if model_size != self.current_model_size or self.model is None:
+        # The weights are loaded the same way for every compute type, it only decides fp16 decoding.
+        key = (model_size, "float32", self.device)
+        if key not in self.model_pool:
             progress(0, desc="正在初始化模型……")
-            self.current_model_size = model_size
-            self.model = whisper.load_model(
+        self.current_model_size = model_size
+        evictions = self.model_pool.evictions
+        self.model = self.model_pool.get(
+            key=key,
+            loader=lambda: whisper.load_model(
                 name=model_size,
                 device=self.device,
                 download_root=os.path.join("models", "Whisper")
-            )
+            ),
+            size_gb=estimate_model_memory(model_size, "float32")
+        )
+        if self.model_pool.evictions != evictions:
+            # The evicted models were still referenced by `self.model` until it was replaced above
+            self.release_cuda_memory()
 
-    @staticmethod
-    def generate_and_write_file(file_name: str,
+    def preload_model(self,
+                      model_size: str,
+                      compute_type: Optional[str] = None) -> float:
+        """
+        Load a model into `self.model_pool` and decode a short clip with it, so the first request
+        doesn't pay for loading the model and setting up the first inference.
+        `compute_type` defaults to the one of the device. Returns the time it took in seconds.
+        """
+        start_time = time.time()
+        compute_type = compute_type or self.current_compute_type
+        self.update_model_if_needed(model_size=model_size, compute_type=compute_type, progress=self.no_progress)
+        # The transcription of the warm-up clip is of no use, so it isn't cached
+        transcription_cache, self.transcription_cache = self.transcription_cache, None
+        try:
+            self.transcribe(audio=make_warmup_audio(), compute_type=compute_type, progress=self.no_progress,
+                            **WARMUP_DECODE_PARAMS)
+        finally:
+            self.transcription_cache = transcription_cache
+        return time.time() - start_time
+
+    def generate_and_write_file(self,
+                                file_name: str,
                                 transcribed_segments: list,
                                 add_timestamp: bool,
                                 file_format: str,
@@ -388,9 +632,9 @@ class WhisperInference(BaseInterface):
         """
         timestamp = datetime.now().strftime("%m%d%H%M%S")
         if add_timestamp:
-            output_path = os.path.join("outputs", f"{file_name}-{timestamp}")
+            output_path = os.path.join(self.output_config.output_dir, f"{file_name}-{timestamp}")
         else:
-            output_path = os.path.join("outputs", f"{file_name}")
+            output_path = os.path.join(self.output_config.output_dir, f"{file_name}")
 
         if file_format == "SRT":
             content = get_srt(transcribed_segments)
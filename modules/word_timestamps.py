@@ -0,0 +1,88 @@
+import numpy as np
+from typing import Callable, Iterable, Iterator, Tuple
+
+
+class WordTimestamps:
+    """
+    Words of a segment stored column-wise: start, end and probability arrays, and the text of all words
+    in one string with `offsets` into it. A segment keeps a handful of arrays instead of one dict
+    per word, so long transcriptions with word timestamps don't grow by millions of small objects.
+    """
+    __slots__ = ("starts", "ends", "probabilities", "text", "offsets")
+
+    def __init__(self,
+                 starts: np.ndarray,
+                 ends: np.ndarray,
+                 probabilities: np.ndarray,
+                 text: str,
+                 offsets: np.ndarray):
+        self.starts = starts
+        self.ends = ends
+        self.probabilities = probabilities
+        self.text = text
+        self.offsets = offsets
+
+    @classmethod
+    def from_words(cls, words: Iterable) -> "WordTimestamps":
+        """
+        Builds the columns from faster-whisper `Word` tuples or whisper word dicts,
+        both of which have word, start, end and probability.
+        """
+        starts, ends, probabilities, texts = [], [], [], []
+        for word in words:
+            if isinstance(word, dict):
+                word, start, end, probability = word["word"], word["start"], word["end"], word["probability"]
+            else:
+                word, start, end, probability = word.word, word.start, word.end, word.probability
+            texts.append(word)
+            starts.append(start)
+            ends.append(end)
+            probabilities.append(probability)
+
+        offsets = np.zeros(len(texts) + 1, dtype=np.int32)
+        np.cumsum([len(text) for text in texts], out=offsets[1:])
+        return cls(starts=np.array(starts, dtype=np.float32),
+                   ends=np.array(ends, dtype=np.float32),
+                   probabilities=np.array(probabilities, dtype=np.float32),
+                   text="".join(texts),
+                   offsets=offsets)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, index: int) -> Tuple[str, float, float, float]:
+        """Returns (word, start, end, probability) of a word"""
+        return (self.text[self.offsets[index]:self.offsets[index + 1]], float(self.starts[index]),
+                float(self.ends[index]), float(self.probabilities[index]))
+
+    def __iter__(self) -> Iterator[Tuple[str, float, float, float]]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def shift(self, offset: float) -> "WordTimestamps":
+        """Returns the words moved `offset` seconds later"""
+        return WordTimestamps(self.starts + offset, self.ends + offset, self.probabilities, self.text, self.offsets)
+
+    def map_times(self, fn: Callable[[float], float]) -> "WordTimestamps":
+        """Returns the words with `fn` applied to every start and end time"""
+        starts = np.fromiter((fn(float(start)) for start in self.starts), dtype=np.float32, count=len(self))
+        ends = np.fromiter((fn(float(end)) for end in self.ends), dtype=np.float32, count=len(self))
+        return WordTimestamps(starts, ends, self.probabilities, self.text, self.offsets)
+
+    def to_dict(self) -> dict:
+        """JSON serializable form, used by the transcription cache"""
+        return {
+            "starts": self.starts.tolist(),
+            "ends": self.ends.tolist(),
+            "probabilities": self.probabilities.tolist(),
+            "text": self.text,
+            "offsets": self.offsets.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "WordTimestamps":
+        return cls(starts=np.array(data["starts"], dtype=np.float32),
+                   ends=np.array(data["ends"], dtype=np.float32),
+                   probabilities=np.array(data["probabilities"], dtype=np.float32),
+                   text=data["text"],
+                   offsets=np.array(data["offsets"], dtype=np.int32))
@@ -0,0 +1,295 @@
+import os
+import atexit
+import itertools
+import threading
+import multiprocessing as mp
+from multiprocessing.connection import Connection, wait
+from collections import deque
+from concurrent.futures import Future
+from typing import List, Optional, Sequence, Tuple
+
+from modules.model_pool import DEFAULT_MEMORY_BUDGET_GB
+
+# Seconds the collector thread waits for results or dead workers before checking if the pool is shut down
+WORKER_POLL_INTERVAL = 1.0
+# A worker that dies this many times in a row before it is ready, e.g. on an import error, isn't restarted again
+MAX_FAILED_STARTS = 3
+
+
+def get_available_cores() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def get_worker_ct2_settings(core_count: int,
+                            ct2_settings: Optional[Tuple[int, int]] = None) -> Tuple[int, int]:
+    """
+    Returns the (cpu_threads, num_workers) a worker with `core_count` cores runs CTranslate2 with.
+    By default it's a single replica on all of its cores. The configured ones are capped at its cores,
+    values below 1 are left to the default.
+    """
+    core_count = max(1, core_count)
+    cpu_threads, num_workers = ct2_settings or (0, 0)
+    num_workers = min(num_workers, core_count) if num_workers >= 1 else 1
+    max_cpu_threads = max(1, core_count // num_workers)
+    cpu_threads = min(cpu_threads, max_cpu_threads) if cpu_threads >= 1 else max_cpu_threads
+    return cpu_threads, num_workers
+
+
+def _worker_main(worker_index: int,
+                 cores: List[int],
+                 model_memory_budget_gb: float,
+                 preload_models: List[Tuple[str, Optional[str]]],
+                 ct2_settings: Optional[Tuple[int, int]],
+                 task_queue: mp.Queue,
+                 result_conn: Connection):
+    """
+    Entry point of a worker process. Owns its own FasterWhisperInference and the models it loads.
+    It reports itself ready once the models of `preload_models` are loaded and warmed up.
+    """
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    from modules.faster_whisper_inference import FasterWhisperInference
+    from modules.audio_cache import PCMRef
+    # Results and decoded audio are cached by the dispatching process
+    engine = FasterWhisperInference(model_memory_budget_gb=model_memory_budget_gb, transcription_cache_size_mb=0,
+                                    audio_cache_size_mb=0)
+    engine.cpu_threads, engine.num_workers = get_worker_ct2_settings(len(cores), ct2_settings)
+    for model_size, compute_type in preload_models:
+        try:
+            preload_time = engine.preload_model(model_size=model_size, compute_type=compute_type)
+            print(f"Worker {worker_index} preloaded {model_size} in {preload_time:.1f}s")
+        except Exception as e:
+            # The model is loaded by the first job that needs it instead
+            print(f"Worker {worker_index} failed to preload {model_size}: {e}")
+    result_conn.send((None, True, None))
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        job_id, params = task
+        try:
+            if isinstance(params["audio"], PCMRef):
+                params["audio"] = params["audio"].load()
+            engine.update_model_if_needed(model_size=params.pop("model_size"),
+                                          compute_type=params.pop("compute_type"),
+                                          progress=engine.no_progress)
+            result = engine.transcribe(progress=engine.no_progress, **params)
+            result_conn.send((job_id, True, result))
+        except Exception as e:
+            result_conn.send((job_id, False, f"{type(e).__name__}: {e}"))
+
+
+class TranscriptionWorkerPool:
+    """
+    Pool of worker processes that run FasterWhisperInference.transcribe() in parallel.
+    Each worker owns its own loaded models and a fixed share of the CPU cores, so concurrent
+    Gradio requests don't race on a shared model.
+    Jobs are handed to idle workers one at a time, so the job of a worker that dies (e.g. killed when out of memory)
+    is known. It fails with a RuntimeError and the worker is replaced.
+    """
+    def __init__(self,
+                 num_workers: int,
+                 model_memory_budget_gb: float = DEFAULT_MEMORY_BUDGET_GB,
+                 preload_models: Sequence[Tuple[str, Optional[str]]] = (),
+                 cpu_threads: int = 0,
+                 ct2_num_workers: int = 0):
+        self.num_workers = num_workers
+        # CTranslate2 threads of every worker, e.g. from --cpu_threads and --num_workers, capped at its cores
+        self.ct2_settings = (cpu_threads, ct2_num_workers)
+        self.model_memory_budget_gb = model_memory_budget_gb
+        self.cores = get_available_cores()
+        cores_per_worker = max(1, len(self.cores) // num_workers)
+        self.worker_cores = [self.cores[worker_index * cores_per_worker:(worker_index + 1) * cores_per_worker]
+                             for worker_index in range(num_workers)]
+
+        self._ctx = mp.get_context("spawn")
+        self.workers = [None] * num_workers
+        self.task_queues = [None] * num_workers
+        self.result_conns = [None] * num_workers
+        self.futures = {}
+        # Jobs waiting for an idle worker, the idle workers, and the job each busy worker runs
+        self.pending_jobs = deque()
+        self.idle_workers = deque()
+        self.running_jobs = {}
+        self.ready_indexes = set()
+        self.failed_starts = [0] * num_workers
+        self.ready_workers = 0
+        self._ready = threading.Event()
+        self._closed = False
+        self._job_ids = itertools.count()
+        self._lock = threading.Lock()
+        for worker_index in range(num_workers):
+            self._start_worker(worker_index, preload_models)
+        self._collector = threading.Thread(target=self._collect_results, daemon=True)
+        self._collector.start()
+        atexit.register(self.shutdown)
+
+    def _start_worker(self,
+                      worker_index: int,
+                      preload_models: Sequence[Tuple[str, Optional[str]]] = ()):
+        # Every worker gets its own queue and pipe, so a killed worker can't lose the results of the others
+        # or leave a task behind for its replacement
+        self.task_queues[worker_index] = self._ctx.Queue()
+        result_conn, worker_conn = self._ctx.Pipe(duplex=False)
+        worker = self._ctx.Process(target=_worker_main,
+                                   args=(worker_index, self.worker_cores[worker_index], self.model_memory_budget_gb,
+                                         list(preload_models), self.ct2_settings, self.task_queues[worker_index],
+                                         worker_conn),
+                                   daemon=True)
+        worker.start()
+        worker_conn.close()
+        self.workers[worker_index] = worker
+        self.result_conns[worker_index] = result_conn
+
+    def submit(self,
+               audio,
+               model_size: str,
+               compute_type: str,
+               **transcribe_params) -> Future:
+        """
+        Queue a transcription job. The parameters are the same as FasterWhisperInference.transcribe()
+        without `progress`. Returns a Future of (segments_result, elapsed_time, transcription_info).
+        """
+        future = Future()
+        params = dict(audio=audio, model_size=model_size, compute_type=compute_type, **transcribe_params)
+        with self._lock:
+            job_id = next(self._job_ids)
+            self.futures[job_id] = future
+            self.pending_jobs.append((job_id, params))
+            self._dispatch()
+            self._fail_pending_jobs_without_workers()
+        return future
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until every worker has started and warmed up its preloaded models. Returns False on timeout."""
+        return self._ready.wait(timeout)
+
+    def not_ready_workers(self) -> List[int]:
+        """Returns the indexes of the workers that haven't reported themselves ready yet"""
+        with self._lock:
+            return [worker_index for worker_index in range(self.num_workers)
+                    if worker_index not in self.ready_indexes]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": sum(worker is not None for worker in self.workers),
+                "ready_workers": self.ready_workers,
+                "pending_jobs": len(self.futures),
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            workers = [worker for worker in self.workers if worker is not None]
+            for task_queue in self.task_queues:
+                if task_queue is not None:
+                    task_queue.put(None)
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        self.workers = []
+
+    def _dispatch(self):
+        """Hand the pending jobs to the idle workers. Called with `self._lock` held."""
+        while self.pending_jobs and self.idle_workers:
+            worker_index = self.idle_workers.popleft()
+            job_id, params = self.pending_jobs.popleft()
+            self.running_jobs[worker_index] = job_id
+            self.task_queues[worker_index].put((job_id, params))
+
+    def _replace_dead_workers(self):
+        with self._lock:
+            if self._closed:
+                return
+            for worker_index, worker in enumerate(self.workers):
+                if worker is None or worker.exitcode is None:
+                    continue
+                print(f"Transcription worker {worker_index} died with exit code {worker.exitcode}")
+                job_id = self.running_jobs.pop(worker_index, None)
+                future = self.futures.pop(job_id, None)
+                if future is not None:
+                    future.set_exception(RuntimeError(f"Transcription worker {worker_index} died with exit code "
+                                                      f"{worker.exitcode}"))
+                if worker_index in self.idle_workers:
+                    self.idle_workers.remove(worker_index)
+                if worker_index in self.ready_indexes:
+                    self.ready_indexes.discard(worker_index)
+                    self.ready_workers -= 1
+                else:
+                    self.failed_starts[worker_index] += 1
+                self.result_conns[worker_index].close()
+                self.result_conns[worker_index] = None
+                if self.failed_starts[worker_index] >= MAX_FAILED_STARTS:
+                    print(f"Transcription worker {worker_index} failed to start {MAX_FAILED_STARTS} times, "
+                          f"it isn't restarted again")
+                    self.workers[worker_index] = None
+                    continue
+                # The replacement doesn't preload, a model that killed the worker while loading would kill it again
+                self._start_worker(worker_index)
+            self._fail_pending_jobs_without_workers()
+
+    def _fail_pending_jobs_without_workers(self):
+        """Fail the jobs that no worker is left to run. Called with `self._lock` held."""
+        if any(worker is not None for worker in self.workers):
+            return
+        while self.pending_jobs:
+            job_id, _ = self.pending_jobs.popleft()
+            future = self.futures.pop(job_id, None)
+            if future is not None:
+                future.set_exception(RuntimeError("No transcription worker is running"))
+
+    def _collect_results(self):
+        while True:
+            with self._lock:
+                if self._closed:
+                    break
+                result_conns = {conn: worker_index for worker_index, conn in enumerate(self.result_conns)
+                                if conn is not None}
+                sentinels = [worker.sentinel for worker in self.workers if worker is not None]
+            ready = wait(list(result_conns) + sentinels, timeout=WORKER_POLL_INTERVAL)
+
+            # The results are handled before the deaths, so a worker that sent its result and then died doesn't fail it
+            for conn in ready:
+                if conn not in result_conns:
+                    continue
+                try:
+                    job_id, succeeded, result = conn.recv()
+                except (EOFError, OSError):
+                    # The worker died, its sentinel is ready too
+                    continue
+                self._handle_result(result_conns[conn], job_id, succeeded, result)
+            if ready:
+                self._replace_dead_workers()
+
+    def _handle_result(self,
+                       worker_index: int,
+                       job_id: Optional[int],
+                       succeeded: bool,
+                       result):
+        with self._lock:
+            if job_id is None:
+                self.ready_indexes.add(worker_index)
+                self.failed_starts[worker_index] = 0
+                self.ready_workers += 1
+                if self.ready_workers == self.num_workers:
+                    self._ready.set()
+                future = None
+            else:
+                self.running_jobs.pop(worker_index, None)
+                future = self.futures.pop(job_id, None)
+            self.idle_workers.append(worker_index)
+            self._dispatch()
+        if future is None:
+            return
+        if succeeded:
+            future.set_result(result)
+        else:
+            future.set_exception(RuntimeError(result))
@@ -1,15 +1,18 @@
-from pytube import YouTube
 import os
 
+from modules.lazy import lazy_import
+
+pytube = lazy_import("pytube")
+
 
 def get_ytdata(link):
-    return YouTube(link)
+    return pytube.YouTube(link)
 
 
 def get_ytmetas(link):
-    yt = YouTube(link)
+    yt = pytube.YouTube(link)
     return yt.thumbnail_url, yt.title, yt.description
 
 
-def get_ytaudio(ytdata: YouTube):
+def get_ytaudio(ytdata: "pytube.YouTube"):
     return ytdata.streams.get_audio_only().download(filename=os.path.join("modules", "yt_tmp.wav"))